@@ -0,0 +1,74 @@
+"""
+The analysis scripts the benchmarks time, run unchanged on synthetic inputs.
+
+Each pipeline is a script in `../scripts` with its command-line arguments. `run_pipeline`
+runs it as `__main__` under `profiling.profile_run`, with `snapshot_store` reading the
+generated inputs and the working directory set so the script's `../figures` and
+`../html` outputs land beside them; the stages are the script's own `profiling.mark`
+calls (load / transform / stats / render / save). Its printed output is discarded.
+
+The map and covariate scripts join on `country_id`, so only units that resolve to a
+country (the first ~240 synthetic countries) reach their maps and regressions; the rest
+are loaded, parsed and dropped by the joins, as unknown spellings are in the real
+exports. Those scripts declare `granularities` ('country' only), and a pipeline too slow
+for the large sizes declares `max_rows`; run_benchmarks.py skips the other cases.
+"""
+import contextlib
+import os
+import sys
+
+import matplotlib
+
+matplotlib.use('Agg')
+
+SCRIPTS_DIR = os.path.join(os.path.dirname(os.path.abspath(__file__)), '..', 'scripts')
+sys.path.insert(0, SCRIPTS_DIR)
+
+import snapshot_store
+from profiling import profile_run
+
+# name -> script (in ../scripts), its arguments, the granularities it makes sense for
+# (default: all) and the row count above which it is skipped (default: none)
+PIPELINES = {
+    'insecure_tests': {'script': 'fig6_cdf_protocol.py'},
+    'insecure_intervals': {'script': 'ratio_intervals.py', 'args': ['--method', 'bootstrap', '--draws', '1000']},
+    'wealth_regression': {'script': 'fig4_5_wealth_normalized_protocol.py', 'granularities': ('country',)},
+    'nonstandard_diff': {'script': 'fig9_non_IANA_prevalence_diff.py', 'granularities': ('country',)},
+    # One curve and legend entry per group (rows / 50 of them)
+    'open_ports_cdf': {'script': 'fig7_open_ports_cdfs.py', 'max_rows': 100_000},
+    'os_cve_binomial': {'script': 'NA_os_cve_binomial_comparison.py'},
+    'rurality_smoothing': {'script': 'fig3_rural_insecure_os.py', 'granularities': ('country',)},
+}
+
+
+def skip_reason(name, rows, granularity, ignore_max_rows=False):
+    """Why a pipeline is not run for this case (None if it is)."""
+    pipeline = PIPELINES[name]
+    if granularity not in pipeline.get('granularities', (granularity,)):
+        return f"{granularity} units do not resolve to countries"
+    if pipeline.get('max_rows') is not None and rows > pipeline['max_rows'] and not ignore_max_rows:
+        return f"max_rows {pipeline['max_rows']}"
+    return None
+
+
+def prepare(case_dir):
+    """Points snapshot_store at case_dir/raw and builds the snapshots, so every run starts from them."""
+    snapshot_store.use_raw_dir(os.path.join(case_dir, 'raw'))
+    snapshot_store.convert_all()
+
+
+def run_pipeline(name, case_dir):
+    """Runs one pipeline's script on the inputs under case_dir; returns its stage record."""
+    import matplotlib.pyplot as plt
+
+    pipeline = PIPELINES[name]
+    snapshot_store.use_raw_dir(os.path.join(case_dir, 'raw'))
+    for directory in ('scripts', 'figures', 'html'):
+        os.makedirs(os.path.join(case_dir, directory), exist_ok=True)
+    os.chdir(os.path.join(case_dir, 'scripts'))
+    sys.argv = [pipeline['script']] + pipeline.get('args', [])
+    try:
+        with open(os.devnull, 'w') as devnull, contextlib.redirect_stdout(devnull):
+            return profile_run(name, os.path.join(SCRIPTS_DIR, pipeline['script']))
+    finally:
+        plt.close('all')
@@ -0,0 +1,167 @@
+"""
+Times the analysis scripts on seeded synthetic inputs of increasing size.
+
+For each size (number of units per table) and granularity, the inputs are generated
+once under --data-dir and converted to snapshots, then every pipeline's script runs
+under `profiling.profile_run` in a fresh forked worker (as make_figures.py runs them,
+so no cache or memory high-water mark carries over between runs). Its per-stage wall
+time, CPU time and peak RSS are recorded, with throughput in rows/s. The best of
+--repeat runs is kept. Pipelines are skipped above their `max_rows` and at
+granularities they do not declare.
+
+Results are written to --out as JSON. With --baseline, each stage is compared with the
+stored run of the same pipeline/size/granularity and flagged when it is more than
+--threshold times slower (and at least --min-seconds slower, to ignore timer noise);
+--fail-on-regression then exits with status 1. --save-baseline stores the current run.
+
+Run from `benchmarks/`:
+
+    python run_benchmarks.py --sizes 1000 10000 100000 --granularity asn --baseline baseline.json
+    python run_benchmarks.py --sizes 1000 10000 --save-baseline baseline.json
+"""
+import argparse
+import importlib
+import json
+import multiprocessing
+import os
+import shutil
+import time
+
+from pipelines import PIPELINES, prepare, run_pipeline, skip_reason
+from make_figures import HEAVY_MODULES
+from profiling import write_json
+from synthetic import GRANULARITIES, generate_inputs
+
+BENCH_DIR = os.path.dirname(os.path.abspath(__file__))
+DEFAULT_DATA_DIR = os.path.join(BENCH_DIR, 'data')
+
+
+def run_isolated(name, case_dir):
+    """One run of a pipeline in a forked worker (in-process where fork is unavailable)."""
+    if 'fork' not in multiprocessing.get_all_start_methods():
+        return run_pipeline(name, case_dir)
+    with multiprocessing.get_context('fork').Pool(processes=1) as pool:
+        return pool.apply(run_pipeline, (name, case_dir))
+
+
+def run_case(name, case_dir, rows, repeat):
+    """Best-of-repeat stage record of one pipeline, with rows/s added to every stage."""
+    best = None
+    for _ in range(repeat):
+        record = run_isolated(name, case_dir)
+        if record['error']:
+            return record
+        if best is None or record['wall_seconds'] < best['wall_seconds']:
+            best = record
+    for stage in best['stages']:
+        stage['rows_per_second'] = round(rows / stage['wall_seconds'], 1) if stage['wall_seconds'] > 0 else None
+    best['rows_per_second'] = round(rows / best['wall_seconds'], 1) if best['wall_seconds'] > 0 else None
+    return best
+
+
+def case_key(result):
+    return f"{result['pipeline']}/{result['granularity']}/{result['rows']}"
+
+
+def compare(results, baseline, threshold, min_seconds):
+    """Stage-level regressions of results against a baseline run: list of dicts."""
+    previous = {case_key(result): result for result in baseline['results']}
+    regressions = list()
+    for result in results:
+        old = previous.get(case_key(result))
+        if old is None or any(run.get('error') or run.get('skipped') for run in (result, old)):
+            continue
+        for stage, seconds in result['stage_wall_seconds'].items():
+            old_seconds = old['stage_wall_seconds'].get(stage)
+            if old_seconds is None:
+                continue
+            if seconds > old_seconds * threshold and seconds - old_seconds > min_seconds:
+                regressions.append({'case': case_key(result), 'stage': stage, 'baseline_seconds': old_seconds,
+                                    'seconds': seconds, 'slowdown': round(seconds / max(old_seconds, 1e-9), 2)})
+    return regressions
+
+
+def format_result(result):
+    if result.get('skipped'):
+        return f"{case_key(result):<40} skipped ({result['skipped']})"
+    if result.get('error'):
+        return f"{case_key(result):<40} FAILED: {result['error'].strip().splitlines()[-1]}"
+    stages = '  '.join(f"{stage} {seconds:.3f}s" for stage, seconds in result['stage_wall_seconds'].items())
+    return (f"{case_key(result):<40} {result['wall_seconds']:8.3f}s {result['rows_per_second']:>12,.0f} rows/s "
+            f"{result['peak_rss_mb']:8.1f} MiB  [{stages}]")
+
+
+def main(args):
+    names = args.pipelines or list(PIPELINES)
+    unknown = set(names) - set(PIPELINES)
+    if unknown:
+        raise SystemExit(f"Unknown pipeline(s) {', '.join(sorted(unknown))}, expected: {', '.join(PIPELINES)}")
+
+    # Imported once here so forked workers do not pay for it in their first stage
+    for module in HEAVY_MODULES:
+        importlib.import_module(module)
+
+    results = list()
+    for granularity in args.granularity:
+        for rows in args.sizes:
+            data_dir = os.path.abspath(os.path.join(args.data_dir, f'{granularity}_{rows}_{args.seed}'))
+            start = time.perf_counter()
+            generate_inputs(os.path.join(data_dir, 'raw'), rows, granularity, args.seed)
+            generated = time.perf_counter()
+            prepare(data_dir)
+            print(f'Generated {rows:,} {granularity} rows in {generated - start:.1f}s, '
+                  f'built snapshots in {time.perf_counter() - generated:.1f}s')
+            for name in names:
+                reason = skip_reason(name, rows, granularity, ignore_max_rows=args.no_skip)
+                if reason:
+                    result = {'skipped': reason}
+                else:
+                    result = run_case(name, data_dir, rows, args.repeat)
+                result.update({'pipeline': name, 'granularity': granularity, 'rows': rows})
+                results.append(result)
+                print(format_result(result), flush=True)
+            if not args.keep_data:
+                shutil.rmtree(data_dir)
+
+    run = {'seed': args.seed, 'repeat': args.repeat, 'results': results}
+    regressions = list()
+    if args.baseline and os.path.exists(args.baseline):
+        with open(args.baseline, 'r') as file:
+            regressions = compare(results, json.load(file), args.threshold, args.min_seconds)
+        run['regressions'] = regressions
+        for regression in regressions:
+            print(f"REGRESSION {regression['case']} {regression['stage']}: {regression['baseline_seconds']:.3f}s -> "
+                  f"{regression['seconds']:.3f}s ({regression['slowdown']}x)")
+        if not regressions:
+            print(f'No regressions against {args.baseline}')
+    elif args.baseline:
+        print(f'No baseline at {args.baseline}, nothing to compare')
+
+    if args.out:
+        write_json(args.out, run)
+    if args.save_baseline:
+        write_json(args.save_baseline, run)
+    if regressions and args.fail_on_regression:
+        raise SystemExit(1)
+
+
+if __name__ == '__main__':
+    parser = argparse.ArgumentParser(description='Benchmark the analysis scripts on synthetic inputs.')
+    parser.add_argument('--sizes', nargs='+', type=lambda value: int(float(value)), default=[1000, 10000, 100000],
+                        help='Units per table (1e3 .. 1e7; scientific notation accepted)')
+    parser.add_argument('--granularity', nargs='+', choices=GRANULARITIES, default=['country'],
+                        help='What a row stands for')
+    parser.add_argument('--pipelines', nargs='+', default=None, help=f"Subset of: {', '.join(PIPELINES)}")
+    parser.add_argument('--seed', type=int, default=0)
+    parser.add_argument('--repeat', type=int, default=1, help='Runs per case; the fastest is kept')
+    parser.add_argument('--no-skip', action='store_true', help="Also run pipelines above their max_rows")
+    parser.add_argument('--data-dir', default=DEFAULT_DATA_DIR, help='Where synthetic inputs are generated')
+    parser.add_argument('--keep-data', action='store_true', help='Keep the generated inputs')
+    parser.add_argument('--out', default=None, help='Write the run (JSON) here')
+    parser.add_argument('--baseline', default=None, help='Stored run to compare against')
+    parser.add_argument('--save-baseline', default=None, help='Store this run as a baseline here')
+    parser.add_argument('--threshold', type=float, default=1.25, help='Slowdown factor flagged as a regression')
+    parser.add_argument('--min-seconds', type=float, default=0.05,
+                        help='Ignore slowdowns smaller than this many seconds')
+    parser.add_argument('--fail-on-regression', action='store_true', help='Exit 1 if any regression is flagged')
+    main(parser.parse_args())
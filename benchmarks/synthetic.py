@@ -0,0 +1,205 @@
+"""
+Seeded synthetic versions of every raw input, at any number of rows.
+
+`generate_inputs(out_dir, rows, granularity, seed)` writes a tree with the same layout,
+file names, columns and value encodings as `data/raw/` (CSV exports, BigQuery JSON
+exports with string-typed numbers, `affluent.csv` with quoted thousands separators), so
+`snapshot_store` parsers and the analysis code read it unchanged. The unit behind a row
+is a country, an ASN or a /24:
+
+* country:  the countries of `data/country_keys` (key and display name) first, so the
+            scripts' country_id joins match them, then codes 'C0242', ... with names
+            'Country 242', ... that resolve to no country, like unknown spellings
+* asn:      'AS64512', ... (names equal to the code)
+* slash24:  '10.0.0.0/24', '10.0.1.0/24', ...
+
+Counts follow the shape of the real exports: a long tail of tiny Starlink cells next to
+large baseline cells (a few of them empty), and insecure/CVE rates around a few percent.
+"""
+import json
+import os
+import sys
+
+import numpy as np
+import pandas as pd
+
+sys.path.insert(0, os.path.join(os.path.dirname(os.path.abspath(__file__)), '..', 'scripts'))
+
+from country_keys import load_country_table
+from snapshot_store import INPUTS
+
+GRANULARITIES = ('country', 'asn', 'slash24')
+SERVICES = ('http', 'https', 'ssh', 'ftp', 'telnet', 'smtp', 'imap', 'pop3', 'dns', 'mysql', 'rdp', 'mongodb',
+            'redis', 'postgresql', 'vnc')
+OS_NAMES = ('mikrotik routeros', 'fortinet fortios', 'linux linux', 'microsoft windows', 'cisco ios',
+            'ubiquiti edgeos', 'freebsd freebsd', 'juniper junos', 'huawei vrp', 'openbsd openbsd')
+CONTINENTS = ('Africa', 'Asia', 'Europe', 'North America', 'Oceania', 'South America')
+PORTS_PER_GROUP = 50
+
+# Same file names as data/raw
+PATHS = {name: entry[0] for name, entry in INPUTS.items()}
+
+
+def unit_labels(n, granularity):
+    """(code, name) arrays for n units of the given granularity."""
+    index = np.arange(n)
+    if granularity == 'country':
+        codes = pd.Series(index).map('C{:04d}'.format)
+        names = pd.Series(index).map('Country {}'.format)
+        countries = load_country_table()[['key', 'name']].head(n)
+        codes[:len(countries)] = countries['key'].to_numpy()
+        names[:len(countries)] = countries['name'].to_numpy()
+    elif granularity == 'asn':
+        codes = names = pd.Series(index + 64512).map('AS{}'.format)
+    elif granularity == 'slash24':
+        codes = names = ('10.' + pd.Series((index >> 8) & 0xFF).astype(str) + '.'
+                         + pd.Series(index & 0xFF).astype(str) + '.0/24')
+        if n > 1 << 16:
+            codes = names = (pd.Series(10 + (index >> 16)).astype(str) + codes.str[2:])
+    else:
+        raise ValueError(f"Unknown granularity '{granularity}', expected one of {', '.join(GRANULARITIES)}")
+    return codes.to_numpy(dtype=object), names.to_numpy(dtype=object)
+
+
+def _counts(rng, n, median, sigma):
+    """Lognormal host/service counts, at least 1."""
+    return np.maximum(1, rng.lognormal(np.log(median), sigma, n).astype(np.int64))
+
+
+def insecure_tables(rng, codes, names):
+    """insecure_hosts.csv and insecure_hosts_plus.csv (same counts, two insecure definitions)."""
+    n = len(codes)
+    all_total = _counts(rng, n, 5000, 1.5)
+    starlink_total = _counts(rng, n, 40, 2.0)
+    base_rate = rng.beta(2, 15, n)
+    ratio = rng.lognormal(0, 0.5, n)
+    all_insecure = rng.binomial(all_total, base_rate)
+    starlink_insecure = rng.binomial(starlink_total, np.clip(base_rate * ratio, 0, 1))
+    missing = rng.random(n) < 0.02  # countries with no Starlink hosts (NULL after the outer join)
+    # Units listed with zero Starlink services, as in per-ASN or per-/24 grids
+    empty = ~missing & (rng.random(n) < 0.02)
+    starlink_total[empty] = 0
+    starlink_insecure[empty] = 0
+
+    def frame(starlink_x, all_x):
+        with np.errstate(invalid='ignore'):
+            starlink_rate = starlink_x / starlink_total  # NaN for the empty units
+        df = pd.DataFrame({'country': codes, 'country_name': names,
+                           'starlink_total': starlink_total.astype(float), 'starlink_insecure': starlink_x.astype(float),
+                           'starlink_insecure_rate': starlink_rate,
+                           'all_total': all_total, 'all_insecure': all_x, 'all_insecure_rate': all_x / all_total})
+        df.loc[missing, ['starlink_total', 'starlink_insecure', 'starlink_insecure_rate']] = np.nan
+        return df.sort_values('starlink_insecure_rate', ascending=False, kind='stable')
+
+    plain = frame(starlink_insecure, all_insecure)
+    # insecure_hosts_plus counts more services as insecure, and leads with country_name
+    plus_x = np.minimum(starlink_total, starlink_insecure + rng.binomial(starlink_total, 0.05))
+    plus_all = np.minimum(all_total, all_insecure + rng.binomial(all_total, 0.05))
+    plus = frame(plus_x, plus_all)[['country_name', 'country', 'starlink_total', 'starlink_insecure',
+                                   'starlink_insecure_rate', 'all_total', 'all_insecure', 'all_insecure_rate']]
+    return plain, plus
+
+
+def nonstandard_table(rng, names):
+    """nonstandard_ports_*.csv: per-unit misplaced-service hosts and service shares (NULL where absent)."""
+    n = len(names)
+    total = _counts(rng, n, 300, 1.5)
+    mismatched = rng.binomial(total, rng.beta(8, 2, n))
+    keep = mismatched > 0
+    shares = rng.dirichlet(np.full(len(SERVICES), 0.3), n)
+    shares[shares < 0.01] = np.nan
+    df = pd.DataFrame({'country': names, 'hosts_with_nonstandard_ports': mismatched, 'total_hosts': total,
+                       'proportion_nonstandard': mismatched / total})
+    for j, service in enumerate(SERVICES):
+        df['pct_' + service] = shares[:, j]
+    return df[keep].sort_values('proportion_nonstandard', ascending=False, kind='stable')
+
+
+def cdf_table(rng, rows, groups):
+    """csv_*.csv: num_open_ports and its cumulative share, PORTS_PER_GROUP points per group."""
+    n_groups = len(groups)
+    per_group = max(1, min(PORTS_PER_GROUP, rows // max(n_groups, 1)))
+    ports = np.sort(rng.choice(np.arange(1, 4 * PORTS_PER_GROUP + 1), size=(n_groups, per_group)), axis=1)
+    ports = np.maximum.accumulate(ports + np.arange(per_group), axis=1)  # strictly increasing per group
+    mass = rng.pareto(1.2, (n_groups, per_group))[:, ::-1] + 1e-3
+    cdf = np.cumsum(mass, axis=1) / mass.sum(axis=1, keepdims=True)
+    return pd.DataFrame({'continent': np.repeat(groups, per_group), 'num_open_ports': ports.ravel(),
+                         'cdf': cdf.ravel()})
+
+
+def os_cve_rows(rng, codes, names):
+    """BigQuery JSON rows for os_cve_locations: string-typed counts, sorted by percentage."""
+    host_count = _counts(rng, len(codes), 200, 1.8)
+    with_cve = rng.binomial(host_count, rng.beta(1, 60, len(codes)))
+    percentage = np.round(with_cve * 100.0 / host_count, 2)
+    order = np.argsort(-percentage, kind='stable')
+    return [{'country': names[i], 'country_code': codes[i], 'hosts_with_cve': str(with_cve[i]),
+             'host_count': str(host_count[i]), 'percentage_with_cve': str(percentage[i])} for i in order]
+
+
+def os_share_rows(rng):
+    """BigQuery JSON rows for os_share_by_continent: top OSes per continent plus '<other>'."""
+    rows = list()
+    for continent in CONTINENTS:
+        counts = _counts(rng, len(OS_NAMES), 100, 1.0)
+        total = counts.sum()
+        for os_name, count in sorted(zip(OS_NAMES[:9] + ('<other>',), counts), key=lambda item: -item[1]):
+            rows.append({'continent': continent, 'os': os_name,
+                         'percentage_share': str(round(count * 100.0 / total, 2)), 'count': str(count)})
+    return rows
+
+
+def affluent_table(rng, names):
+    """affluent.csv with its quoted, comma-grouped figures and occasional '(est.)' markers."""
+    n = len(names)
+    median = np.round(rng.lognormal(np.log(20000), 1.0, n)).astype(np.int64)
+    mean = (median * rng.uniform(1.5, 4, n)).astype(np.int64)
+    adults = _counts(rng, n, 5_000_000, 1.5)
+    estimated = rng.random(n) < 0.1
+
+    def quoted(values):
+        text = pd.Series(values).map('{:,}'.format)
+        return np.where(estimated, text + ' (est.)', text)
+
+    return pd.DataFrame({'Location': names, 'Adults': quoted(adults), 'Median': quoted(median),
+                         'Mean': quoted(mean), 'Gini\xa0%': np.round(rng.uniform(50, 90, n), 1)})
+
+
+def generate_inputs(out_dir, rows, granularity='country', seed=0):
+    """Writes every raw input with `rows` units (CDF files get `rows` points) under out_dir; returns the paths.
+
+    out_dir stands in for data/raw (see snapshot_store.use_raw_dir).
+    """
+    rng = np.random.default_rng(seed)
+    codes, names = unit_labels(rows, granularity)
+    plain, plus = insecure_tables(rng, codes, names)
+    cdf_groups = unit_labels(max(1, rows // PORTS_PER_GROUP), granularity)[1]
+    # Baselines cover every Starlink unit plus more, as in the exports
+    baseline_codes, baseline_names = unit_labels(rows + rows // 4, granularity)
+
+    tables = {
+        'insecure_hosts': plain,
+        'insecure_hosts_plus': plus,
+        'nonstandard_ports_starlink': nonstandard_table(rng, names),
+        'nonstandard_ports_baseline': nonstandard_table(rng, baseline_names),
+        'cdf_open_ports_starlink': cdf_table(rng, rows, cdf_groups),
+        'cdf_open_ports_baseline': cdf_table(rng, rows, cdf_groups),
+        'affluent': affluent_table(rng, names),
+    }
+    documents = {
+        'os_cve_starlink': os_cve_rows(rng, codes, names),
+        'os_cve_baseline': os_cve_rows(rng, baseline_codes, baseline_names),
+        'os_share_starlink': os_share_rows(rng),
+        'os_share_baseline': os_share_rows(rng),
+    }
+
+    paths = dict()
+    for name, rel_path in PATHS.items():
+        path = paths[name] = os.path.join(out_dir, rel_path)
+        os.makedirs(os.path.dirname(path), exist_ok=True)
+        if name in tables:
+            tables[name].to_csv(path, index=False)
+        else:
+            with open(path, 'w') as file:
+                json.dump(documents[name], file)
+    return paths
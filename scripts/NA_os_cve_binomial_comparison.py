@@ -1,46 +1,14 @@
-import matplotlib.pyplot as plt
-import numpy as np
-import json
-from scipy.stats import binom
+from os_cve_exports import KeyedExport, binomial_comparison
+from profiling import mark
 
-starlink_data_file = '../data/raw/os_cve_locations/bquxjob_3c73f9c5_1965065a6b9.json'
-non_starlink_data_file = '../data/raw/os_cve_locations/bquxjob_5e7c6743_19650747b04.json'
+# Both exports indexed on country_code, so each Starlink country finds its baseline rate by hash lookup
+starlink_raw_data = KeyedExport.load('os_cve_starlink')
+non_starlink_raw_data = KeyedExport.load('os_cve_baseline')
 
-
-with open(starlink_data_file, 'r') as file:
-    starlink_raw_data = json.load(file)
-
-with open(non_starlink_data_file, 'r') as file:
-    non_starlink_raw_data = json.load(file)
-
-data = list()
-
-for entry in starlink_raw_data:
-    formatted = dict()
-    formatted['country'] = entry['country']
-
-    formatted['hosts_with_cve'] = int(entry['hosts_with_cve'])
-    formatted['host_count'] = int(entry['host_count'])
-
-    non_entry = next(r for r in non_starlink_raw_data if r['country_code'] == entry['country_code'])
-    formatted['non_percent'] = float(non_entry['percentage_with_cve'])
-
-    data.append(formatted)
-
-result = list()
-for entry in data:
-    if entry['host_count'] < 100:
-        continue
-
-    # 1-tailed test
-    p_value_upper = binom.sf(max(entry['hosts_with_cve'] - 1, 0),
-                             entry['host_count'],
-                             entry['non_percent']/100)
-
-    result.append((entry["country"], p_value_upper))
-
-result = sorted(result, key=lambda t: t[1])
+mark('stats')
+# 1-tailed test of every country with at least 100 Starlink hosts at once, sorted by p-value
+result = binomial_comparison(starlink_raw_data, non_starlink_raw_data, min_hosts=100)
 
 print("Country, P-Value")
-for t in result:
-    print(f'{t[0]}, {t[1]:.3f}')
+for country, p_value in zip(result['country'], result['p_value']):
+    print(f'{country}, {p_value:.3f}')
@@ -0,0 +1,288 @@
+"""
+Subnational (admin-1: states, provinces, regions) choropleths from high-resolution
+boundaries, at about the cost of the 110m country maps.
+
+The boundaries are Natural Earth's 10m admin-1 shapefile (download
+`ne_10m_admin_1_states_provinces.zip` from https://www.naturalearthdata.com/downloads/10m-cultural-vectors/
+and unzip it into `../data/raw/ne_10m_admin_1_states_provinces/`): some 4,600 regions
+and over a million vertices. Drawing that with `GeoDataFrame.plot` is slow and memory
+hungry, so the geometry goes through a level-of-detail pipeline first:
+
+* Preprojection: regions are keyed, reprojected to the map CRS once and cached as
+  GeoParquet in `../data/geometry/` (keyed by the shapefile hash, like `geometry_cache`).
+* Zoom-dependent simplification: the pixel size of the target axes (extent / width in
+  pixels) picks a level whose tolerance is at most half a pixel. Levels are powers of two
+  of `BASE_TOLERANCE`, so only a handful of simplified copies are ever built and cached.
+  Polygon parts smaller than a pixel are dropped, except each region's largest part.
+* Vertex budget: if the level still has more than `vertex_budget` vertices in view, the
+  tolerance is doubled until it fits.
+* Batched drawing: all regions in view become one PathCollection (holes kept via path
+  codes), built from the coordinate arrays in one pass, with country borders on top.
+
+Simplification is per region, so neighbouring borders can drift apart by up to the
+tolerance; at half a pixel that is invisible.
+
+Region-level aggregates are matched either on an ISO 3166-2 `region_code` column
+('US-CA', 'BR-SP') or on `country_code` plus a `region` name (Natural Earth names and
+alternate names, case- and accent-insensitive). Usage (from `scripts/`):
+
+    python admin1_maps.py --regions ../data/regions/insecure_ratio.csv --column insecure_ratio --center 1 \
+        --out ../figures/fig4_admin1.png
+    python admin1_maps.py --regions nonstandard_diff.csv --column proportion_nonstandard_diff --center 0 \
+        --extent -125 24 -66 50 --out ../figures/fig9_admin1_us.png
+"""
+import argparse
+import hashlib
+import os
+import unicodedata
+
+import geopandas as gpd
+import matplotlib.colors as mcolors
+import matplotlib.pyplot as plt
+import numpy as np
+import pandas as pd
+import shapely
+from matplotlib.collections import PathCollection
+from matplotlib.path import Path
+
+from geometry_cache import GEOMETRY_DIR, load_world, shapefile_sha256
+from snapshot_store import RAW_DIR
+
+DEFAULT_ADMIN1 = os.path.join(RAW_DIR, 'ne_10m_admin_1_states_provinces', 'ne_10m_admin_1_states_provinces.shp')
+# Bump whenever the processing below changes so existing cache files are ignored
+ADMIN1_VERSION = 1
+KEEP_COLUMNS = ['iso_3166_2', 'iso_a2', 'name', 'name_alt', 'admin', 'geometry']
+# Tolerance of level 0, in degrees (scaled by the CRS units per degree for projected maps)
+BASE_TOLERANCE = 1 / 512
+TOLERANCE_PX = 0.5
+VERTEX_BUDGET = 150_000
+MISSING_COLOR = 'lightgrey'
+
+
+# --- Level-of-detail geometry ---
+
+def _cache_path(path, crs, tolerance):
+    digest = hashlib.sha256()
+    for part in (shapefile_sha256(path), ADMIN1_VERSION, crs, tolerance):
+        digest.update(repr(part).encode())
+    return os.path.join(GEOMETRY_DIR, f'admin1-{digest.hexdigest()[:16]}.parquet')
+
+
+def _read_admin1(path, crs):
+    if not os.path.exists(path):
+        raise FileNotFoundError(f"{path} not found; download ne_10m_admin_1_states_provinces.zip from "
+                                "https://www.naturalearthdata.com/downloads/10m-cultural-vectors/")
+    regions = gpd.read_file(path)
+    regions = regions[[column for column in KEEP_COLUMNS if column in regions.columns]]
+    return regions.to_crs(crs) if crs is not None and regions.crs != crs else regions
+
+
+def units_per_degree(crs):
+    """Rough CRS units per degree at the equator (1 for geographic CRSs)."""
+    crs = gpd.GeoSeries([], crs=crs or 'EPSG:4326').crs
+    if crs.is_geographic:
+        return 1.0
+    x = gpd.GeoSeries(gpd.points_from_xy([0, 1], [0, 0]), crs='EPSG:4326').to_crs(crs).x
+    return abs(x.iloc[1] - x.iloc[0])
+
+
+def simplify_level(regions, tolerance):
+    """Simplifies every region and drops parts under a tolerance-sized square, keeping each region's largest part."""
+    geometry = shapely.simplify(regions.geometry.to_numpy(), tolerance, preserve_topology=True)
+    parts, owner = shapely.get_parts(geometry, return_index=True)
+    area = shapely.area(parts)
+    largest = pd.Series(area).groupby(owner).transform('max').to_numpy()
+    keep = (area >= tolerance ** 2) | (area == largest)
+    merged = shapely.multipolygons(parts[keep], indices=owner[keep])
+    # multipolygons only returns rows up to the last owner with parts left
+    geometry = np.full(len(regions), None, dtype=object)
+    geometry[:len(merged)] = merged
+    return regions.set_geometry(gpd.GeoSeries(geometry, index=regions.index, crs=regions.crs))
+
+
+class Admin1Levels:
+    """The admin-1 regions of one shapefile, preprojected to one CRS, at every level of detail used so far."""
+
+    def __init__(self, path=DEFAULT_ADMIN1, crs='EPSG:4326'):
+        self.path = path
+        self.crs = crs
+        self.unit = BASE_TOLERANCE * units_per_degree(crs)
+        self._levels = dict()
+
+    def tolerance(self, level):
+        return self.unit * 2.0 ** level
+
+    def level_for(self, pixel_size):
+        """Coarsest level whose tolerance is at most TOLERANCE_PX pixels (-1 means full resolution)."""
+        return max(-1, int(np.floor(np.log2(TOLERANCE_PX * pixel_size / self.unit))))
+
+    def get(self, level):
+        """Regions at a level (-1 for the unsimplified, preprojected geometry), cached in memory and on disk."""
+        if level not in self._levels:
+            tolerance = None if level < 0 else self.tolerance(level)
+            path = _cache_path(self.path, self.crs, tolerance)
+            if os.path.exists(path):
+                self._levels[level] = gpd.read_parquet(path)
+            else:
+                regions = self.get(-1) if tolerance is not None else _read_admin1(self.path, self.crs)
+                if tolerance is not None:
+                    regions = simplify_level(regions, tolerance)
+                os.makedirs(GEOMETRY_DIR, exist_ok=True)
+                regions.to_parquet(path, index=False)
+                self._levels[level] = regions
+        return self._levels[level]
+
+    def for_view(self, extent, width_px, vertex_budget=VERTEX_BUDGET):
+        """(level, regions in view) for a map extent (minx, miny, maxx, maxy) drawn width_px pixels wide."""
+        level = self.level_for((extent[2] - extent[0]) / width_px)
+        while True:
+            regions = self.get(level)
+            in_view = regions.iloc[regions.sindex.query(shapely.box(*extent), predicate='intersects')]
+            if level >= 20 or shapely.get_num_coordinates(in_view.geometry.to_numpy()).sum() <= vertex_budget:
+                return level, in_view.sort_index()
+            level = max(level, 0) + 1
+
+
+_levels = dict()
+
+
+def get_levels(path=DEFAULT_ADMIN1, crs='EPSG:4326'):
+    """Shared Admin1Levels per (shapefile, CRS)."""
+    key = (path, crs)
+    if key not in _levels:
+        _levels[key] = Admin1Levels(path, crs)
+    return _levels[key]
+
+
+# --- Matching region aggregates ---
+
+def normalize_name(names):
+    """Casefolded, accent-stripped, punctuation-free names."""
+    def normalize(name):
+        text = unicodedata.normalize('NFKD', str(name)).encode('ascii', 'ignore').decode()
+        return ' '.join(''.join(c if c.isalnum() else ' ' for c in text.casefold()).split())
+    return pd.Series(names, dtype=object).map(normalize)
+
+
+def _alias_table(regions):
+    """(iso_a2, normalized name) -> iso_3166_2 over names and pipe-separated alternate names."""
+    names = regions['name'].fillna('')
+    if 'name_alt' in regions.columns:
+        names = names + '|' + regions['name_alt'].fillna('')
+    aliases = pd.DataFrame({'iso_a2': regions['iso_a2'], 'iso_3166_2': regions['iso_3166_2'],
+                            'name': names.str.split('|')}).explode('name')
+    aliases['name'] = normalize_name(aliases['name']).to_numpy()
+    return aliases[aliases['name'] != ''].drop_duplicates(['iso_a2', 'name'])
+
+
+def match_regions(regions, aggregates):
+    """ISO 3166-2 code of every aggregate row (NaN where no region matches)."""
+    if 'region_code' in aggregates.columns:
+        codes = aggregates['region_code'].astype(str).str.upper()
+        return codes.where(codes.isin(regions['iso_3166_2']))
+    if not {'country_code', 'region'} <= set(aggregates.columns):
+        raise ValueError("Region aggregates need a 'region_code' column, or 'country_code' and 'region'")
+    keys = pd.DataFrame({'iso_a2': aggregates['country_code'].astype(str).str.upper().to_numpy(),
+                         'name': normalize_name(aggregates['region']).to_numpy()})
+    matched = keys.merge(_alias_table(regions), on=['iso_a2', 'name'], how='left')
+    return pd.Series(matched['iso_3166_2'].to_numpy(), index=aggregates.index)
+
+
+# --- Drawing ---
+
+def region_paths(geometries):
+    """One compound Path per polygon part (exterior and holes), and the index of its geometry."""
+    parts, owner = shapely.get_parts(geometries, return_index=True)
+    rings, ring_part = shapely.get_rings(parts, return_index=True)
+    coords, coord_ring = shapely.get_coordinates(rings, return_index=True)
+    codes = np.full(len(coords), Path.LINETO, dtype=Path.code_type)
+    ring_start = np.flatnonzero(np.diff(coord_ring, prepend=-1))
+    codes[ring_start] = Path.MOVETO
+    codes[np.append(ring_start[1:], len(coords)) - 1] = Path.CLOSEPOLY
+    coord_part = ring_part[coord_ring]
+    cuts = np.flatnonzero(np.diff(coord_part)) + 1
+    paths = [Path(vertices, part_codes) for vertices, part_codes in zip(np.split(coords, cuts), np.split(codes, cuts))]
+    return paths, owner[np.unique(coord_part)]
+
+
+def value_colors(values, cmap, norm, missing=MISSING_COLOR):
+    """RGBA per value, with the missing color where the value is NaN."""
+    values = np.asarray(values, dtype=float)
+    colors = np.asarray(plt.get_cmap(cmap)(norm(np.ma.masked_invalid(values))))
+    colors[np.isnan(values)] = mcolors.to_rgba(missing)
+    return colors
+
+
+def plot_regions(ax, geometries, colors, edgecolor='black', linewidth=0.1, rasterized=False):
+    """Draws polygons as one PathCollection (facecolors per geometry) and returns it."""
+    paths, owner = region_paths(geometries)
+    collection = PathCollection(paths, facecolors=np.asarray(colors)[owner], edgecolors=edgecolor,
+                                linewidths=linewidth, rasterized=rasterized)
+    ax.add_collection(collection, autolim=True)
+    return collection
+
+
+def admin1_choropleth(aggregates, column, ax=None, cmap='RdYlGn_r', norm=None, center=None, extent=None,
+                      crs='EPSG:4326', path=DEFAULT_ADMIN1, vertex_budget=VERTEX_BUDGET, borders=True,
+                      rasterized=False):
+    """Colors every admin-1 region by aggregates[column] and returns (ax, level, norm).
+
+    Regions without a value are drawn in MISSING_COLOR. With `center`, the colormap is
+    centred on that value (TwoSlopeNorm), as in the fig4/fig9 country maps.
+    """
+    levels = get_levels(path, crs)
+    if ax is None:
+        _, ax = plt.subplots(figsize=(12, 6))
+    countries = load_world('countries', crs=None if crs == 'EPSG:4326' else crs)
+    if extent is None:
+        extent = tuple(countries.total_bounds)
+    width_px = ax.get_window_extent().width
+    level, regions = levels.for_view(extent, width_px, vertex_budget)
+
+    values = pd.Series(aggregates[column].to_numpy(dtype=float), index=match_regions(regions, aggregates))
+    values = values[values.index.notna()].groupby(level=0).mean()
+    region_values = values.reindex(regions['iso_3166_2']).to_numpy()
+    if norm is None:
+        finite = region_values[np.isfinite(region_values)]
+        vmin, vmax = (finite.min(), finite.max()) if len(finite) else (0, 1)
+        norm = (mcolors.TwoSlopeNorm(vcenter=center, vmin=min(vmin, center - 1e-9), vmax=max(vmax, center + 1e-9))
+                if center is not None else mcolors.Normalize(vmin, vmax))
+    plot_regions(ax, regions.geometry.to_numpy(), value_colors(region_values, cmap, norm), rasterized=rasterized)
+    if borders:
+        plot_regions(ax, countries.geometry.to_numpy(), np.zeros((len(countries), 4)), linewidth=0.5,
+                     rasterized=rasterized)
+    ax.set_xlim(extent[0], extent[2])
+    ax.set_ylim(extent[1], extent[3])
+    ax.set_aspect('equal')
+    ax.axis('off')
+    return ax, level, norm
+
+
+if __name__ == '__main__':
+    parser = argparse.ArgumentParser(description='Admin-1 choropleth of region-level aggregates.')
+    parser.add_argument('--regions', required=True,
+                        help="CSV with 'region_code' (ISO 3166-2) or 'country_code' and 'region', plus the value column")
+    parser.add_argument('--column', required=True, help='Column to color by')
+    parser.add_argument('--out', required=True, help='Where to save the figure')
+    parser.add_argument('--center', type=float, default=None, help='Center a diverging colormap on this value')
+    parser.add_argument('--cmap', default='RdYlGn_r')
+    parser.add_argument('--extent', type=float, nargs=4, default=None, metavar=('MINX', 'MINY', 'MAXX', 'MAXY'),
+                        help='Map extent in CRS units (default: the whole world)')
+    parser.add_argument('--crs', default='EPSG:4326', help='Map projection, e.g. ESRI:54030 (Robinson)')
+    parser.add_argument('--shapefile', default=DEFAULT_ADMIN1, help='Natural Earth admin-1 shapefile')
+    parser.add_argument('--vertex-budget', type=int, default=VERTEX_BUDGET, help='Max vertices drawn')
+    parser.add_argument('--title', default=None)
+    parser.add_argument('--dpi', type=int, default=100)
+    args = parser.parse_args()
+
+    region_aggregates = pd.read_csv(args.regions, keep_default_na=False, na_values=[''])
+    fig, map_ax = plt.subplots(figsize=(12, 6), dpi=args.dpi)
+    _, lod, value_norm = admin1_choropleth(region_aggregates, args.column, ax=map_ax, cmap=args.cmap,
+                                           center=args.center, extent=args.extent, crs=args.crs,
+                                           path=args.shapefile, vertex_budget=args.vertex_budget)
+    fig.colorbar(plt.cm.ScalarMappable(norm=value_norm, cmap=args.cmap), ax=map_ax, orientation='horizontal',
+                 fraction=0.046, pad=0.04, label=args.column)
+    if args.title:
+        map_ax.set_title(args.title, fontsize=14)
+    fig.savefig(args.out)
+    print(f'Level {lod} ({get_levels(args.shapefile, args.crs).tolerance(max(lod, 0)):.4g} CRS units) -> {args.out}')
@@ -0,0 +1,172 @@
+"""
+Batched horizontal bars for the stacked-bar and small-multiple figures (fig1, fig8).
+
+`ax.barh` adds one Rectangle artist per bar, and a subplot per panel brings its own
+axes, ticks, spines and layout pass, so drawing every country costs minutes. Here:
+
+* `barh_collection` draws any number of bars as a single PolyCollection, with the
+  rectangle vertices built in one NumPy pass.
+* `stacked_barh` takes the segments of many stacked bars in long format (bar, value,
+  key), computes every segment's left edge with one grouped cumulative sum, draws all
+  of them as one collection and places the in-bar labels from the same arrays.
+* `small_multiples_barh` lays out one bar chart per panel (e.g. per country) inside a
+  single axes: bars, panel frames and grid lines are one collection each, tick marks
+  one marker line per axis, and only the titles and tick labels are separate text
+  artists. Figures with at most `SUBPLOTS_UP_TO` panels keep their subplot grid, so
+  the published small-panel figures are unchanged.
+
+Pass `rasterized=True` to embed the collections as images in vector outputs (PDF/SVG);
+`small_multiples_barh` does so by default above `RASTERIZE_ABOVE` panels.
+"""
+import matplotlib.pyplot as plt
+import numpy as np
+import pandas as pd
+from matplotlib import markers, rcParams
+from matplotlib.collections import LineCollection, PolyCollection
+from matplotlib.patches import Patch
+from matplotlib.transforms import offset_copy
+
+RASTERIZE_ABOVE = 24
+# Up to this many panels a subplot grid is cheap enough, and matches the published figures exactly
+SUBPLOTS_UP_TO = 24
+GRID_COLOR = '#b0b0b0'
+
+
+def bar_vertices(y, widths, lefts, height):
+    """(n, 4, 2) corner array of horizontal bars centred on y."""
+    y, widths, lefts = np.broadcast_arrays(*(np.asarray(a, dtype=float) for a in (y, widths, lefts)))
+    half = np.broadcast_to(np.asarray(height, dtype=float), y.shape) / 2
+    rights = lefts + widths
+    xs = np.stack([lefts, lefts, rights, rights], axis=-1)
+    ys = np.stack([y - half, y + half, y + half, y - half], axis=-1)
+    return np.stack([xs, ys], axis=-1)
+
+
+def barh_collection(ax, y, widths, lefts=0, height=0.8, colors=None, rasterized=False, **kwargs):
+    """Adds horizontal bars to ax as one PolyCollection (no edges, like barh) and returns it."""
+    collection = PolyCollection(bar_vertices(y, widths, lefts, height), closed=True, edgecolors='none',
+                                linewidths=0, facecolors=colors if colors is not None else 'C0', **kwargs)
+    collection.set_rasterized(rasterized)
+    ax.add_collection(collection, autolim=True)
+    ax.autoscale_view()
+    return collection
+
+
+def stack_lefts(bars, values):
+    """Left edge of every segment: the running total of the earlier segments of the same bar."""
+    values = pd.Series(np.asarray(values, dtype=float))
+    return (values.groupby(np.asarray(bars), sort=False).cumsum() - values).to_numpy()
+
+
+def segment_labels(ax, x, y, texts, widths, min_width, **kwargs):
+    """Writes texts centred at (x, y) for the segments wider than min_width; returns the Text artists."""
+    show = np.flatnonzero(np.asarray(widths) > min_width)
+    texts = np.asarray(texts, dtype=object)
+    return [ax.text(x[i], y[i], texts[i], ha='center', va='center', **kwargs) for i in show]
+
+
+def legend_handles(color_map, keys=None):
+    """Proxy patches for a legend, in the order of keys (default: color_map's order)."""
+    keys = list(color_map) if keys is None else keys
+    return [Patch(facecolor=color_map[key], label=key) for key in keys]
+
+
+def stacked_barh(ax, bar_y, bars, values, keys, color_map, height=0.8, labels=None, label_min=None,
+                 rasterized=False, label_kwargs=None):
+    """Stacked horizontal bars from long-format segments, drawn left to right in the given order.
+
+    bars indexes bar_y (one entry per segment); keys pick the colors. Returns the collection
+    and the label artists.
+    """
+    bar_y = np.asarray(bar_y, dtype=float)
+    bars = np.asarray(bars)
+    values = np.asarray(values, dtype=float)
+    lefts = stack_lefts(bars, values)
+    y = bar_y[bars]
+    collection = barh_collection(ax, y, values, lefts, height, [color_map.get(key) for key in keys],
+                                 rasterized=rasterized)
+    texts = list()
+    if labels is not None and label_min is not None:
+        texts = segment_labels(ax, lefts + values / 2, y, labels, values, label_min, **(label_kwargs or dict()))
+    return collection, texts
+
+
+def panel_grid(n_panels, n_cols):
+    """(row, col) of every panel in a row-major grid."""
+    index = np.arange(n_panels)
+    return index // n_cols, index % n_cols
+
+
+def small_multiples_barh(categories, values, titles, n_cols=4, xlim=(0, 1), xticks=None, tick_format='{:g}',
+                         panel_size=(3, 2.8), height=0.8, color='C0', title_size=13, label_size=10, rasterized=None,
+                         ax=None):
+    """One horizontal bar chart per row of values (n_panels x n_categories) in a grid, in a single axes.
+
+    Categories run top to bottom in every panel and are labelled on the leftmost column;
+    every panel gets x tick marks (as with sharex) and x tick labels go under each
+    column's bottom panel. Returns the axes.
+    """
+    values = np.nan_to_num(np.asarray(values, dtype=float))
+    n_panels, n_categories = values.shape
+    n_rows = int(np.ceil(n_panels / n_cols))
+    if rasterized is None:
+        rasterized = n_panels > RASTERIZE_ABOVE
+    if ax is None:
+        _, ax = plt.subplots(figsize=(panel_size[0] * n_cols, panel_size[1] * n_rows))
+    x_min, x_max = xlim
+    xticks = np.linspace(x_min, x_max, 6) if xticks is None else np.asarray(xticks, dtype=float)
+
+    # Panel (row, col) spans x in [col * pitch_x, col * pitch_x + 1] and y in
+    # [row * pitch_y - 0.5, row * pitch_y + n_categories - 0.5], y growing downwards
+    pitch_x, pitch_y = 1.25, n_categories + 3.5
+    rows, cols = panel_grid(n_panels, n_cols)
+    x0 = cols * pitch_x
+    y0 = rows * pitch_y
+
+    scale = 1 / (x_max - x_min)
+    category_y = (y0[:, None] + np.arange(n_categories)[None, :]).ravel()
+    bar_left = np.repeat(x0, n_categories) + (0 - x_min) * scale
+    bar_width = np.clip(values, x_min, x_max).ravel() * scale
+    barh_collection(ax, category_y, bar_width, bar_left, height, color, rasterized=rasterized)
+
+    # Grid lines (vertical at the x ticks, horizontal through every bar) above the bars, as with
+    # matplotlib's default axisbelow='line', and panel frames
+    tick_x = (xticks - x_min) * scale
+    top, bottom = y0 - 0.5, y0 + n_categories - 0.5
+    vertical = [((x + t, t_top), (x + t, t_bottom)) for x, t_top, t_bottom in zip(x0, top, bottom) for t in tick_x]
+    horizontal = [((x, cy), (x + 1, cy)) for x, row_y in zip(x0, y0) for cy in row_y + np.arange(n_categories)]
+    grid = LineCollection(vertical + horizontal, colors=GRID_COLOR, linewidths=0.8, zorder=1.5)
+    frames = PolyCollection(bar_vertices(y0 + (n_categories - 1) / 2, np.ones(n_panels), x0, n_categories),
+                            facecolors='none', edgecolors='black', linewidths=0.8, zorder=3)
+    for collection in (grid, frames):
+        collection.set_rasterized(rasterized)
+        ax.add_collection(collection)
+
+    # Tick marks are sized in points, as matplotlib's own: one marker line per axis
+    x_size, y_size = rcParams['xtick.major.size'], rcParams['ytick.major.size']
+    tick_style = dict(linestyle='none', color='black', zorder=3, clip_on=False)
+    ax.plot((x0[:, None] + tick_x[None, :]).ravel(), np.repeat(bottom, len(tick_x)), marker=markers.TICKDOWN,
+            markersize=x_size, markeredgewidth=rcParams['xtick.major.width'], **tick_style)
+    left_y = y0[cols == 0]
+    ax.plot(np.zeros(len(left_y) * n_categories), (left_y[:, None] + np.arange(n_categories)[None, :]).ravel(),
+            marker=markers.TICKLEFT, markersize=y_size, markeredgewidth=rcParams['ytick.major.width'], **tick_style)
+
+    for x, y, title in zip(x0, top, titles):
+        ax.text(x + 0.5, y - 0.3, title, ha='center', va='bottom', fontsize=title_size)
+    # Labels sit tick size + pad points away from the frame, as axis tick labels do
+    y_labels = offset_copy(ax.transData, fig=ax.figure, x=-(y_size + rcParams['ytick.major.pad']), units='points')
+    for y in left_y:
+        for k, category in enumerate(categories):
+            ax.text(0, y + k, category, ha='right', va='center', fontsize=label_size, transform=y_labels)
+    x_labels = offset_copy(ax.transData, fig=ax.figure, y=-(x_size + rcParams['xtick.major.pad']), units='points')
+    tick_labels = [tick_format.format(tick) for tick in xticks]
+    for col in range(min(n_cols, n_panels)):
+        last = np.flatnonzero(cols == col).max()
+        for t, label in zip(tick_x, tick_labels):
+            ax.text(x0[last] + t, bottom[last], label, ha='center', va='top', fontsize=label_size,
+                    transform=x_labels)
+
+    ax.set_xlim(-0.4, (min(n_cols, n_panels) - 1) * pitch_x + 1.05)
+    ax.set_ylim(bottom.max() + 1.5, -3)
+    ax.set_axis_off()
+    return ax
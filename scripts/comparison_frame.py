@@ -0,0 +1,117 @@
+"""
+Starlink-vs-baseline comparisons of whole tables at once.
+
+Every figure compares a Starlink metric with its baseline counterpart, either from two
+tables (`nonstandard_ports_starlink.csv` / `_baseline.csv`, the two `os_cve_locations`
+exports) or from paired columns of one table (`starlink_insecure_rate` /
+`all_insecure_rate` in `insecure_hosts.csv`). `ComparisonFrame` aligns the two sides
+on one index, with a single join for separate tables, and computes the difference,
+ratio and log-ratio of every metric column in one vectorized step:
+
+    comparison = ComparisonFrame.from_tables(df_starlink, df_baseline, on='country_id')
+    comparison.diff('proportion_nonstandard')    # Series indexed by country_id
+    comparison.to_frame()                         # <metric>_{starlink,baseline,diff,ratio,log_ratio}
+
+    data['insecure_ratio'] = ComparisonFrame.from_paired_columns(data).ratio('insecure_rate')
+
+Ratios are plain divisions: a zero baseline gives inf (or NaN for 0/0), as the figures'
+own `starlink / all` did. Log-ratios are natural logs.
+"""
+import numpy as np
+import pandas as pd
+
+STATS = ('starlink', 'baseline', 'diff', 'ratio', 'log_ratio')
+
+
+def numeric_columns(df, exclude=()):
+    """Numeric (non-categorical) columns of df, in order, minus exclude."""
+    return [column for column in df.columns
+            if column not in exclude and pd.api.types.is_numeric_dtype(df[column])
+            and not isinstance(df[column].dtype, pd.CategoricalDtype)]
+
+
+class ComparisonFrame:
+    """Starlink and baseline values of the same metrics, aligned row for row on one index."""
+
+    def __init__(self, starlink, baseline, labels=None):
+        if not starlink.index.equals(baseline.index) or list(starlink.columns) != list(baseline.columns):
+            raise ValueError('Starlink and baseline values must share their index and metric columns')
+        self.starlink = starlink
+        self.baseline = baseline
+        self.labels = labels if labels is not None else pd.DataFrame(index=starlink.index)
+
+    @property
+    def metrics(self):
+        return list(self.starlink.columns)
+
+    @classmethod
+    def from_tables(cls, starlink, baseline, on='country_id', metrics=None, how='left'):
+        """Aligns two tables on the key column(s) `on` with one join.
+
+        metrics defaults to every numeric column present in both tables (the key excluded).
+        Duplicate keys keep their first row, as the per-country lookups did. With how='left'
+        every Starlink row is kept (NaN where the baseline lacks the key); 'inner' keeps
+        only keys on both sides. Starlink's other columns are kept as labels.
+        """
+        keys = [on] if isinstance(on, str) else list(on)
+        if metrics is None:
+            metrics = [column for column in numeric_columns(starlink, keys) if column in baseline.columns]
+        starlink = starlink.drop_duplicates(keys).set_index(keys)
+        baseline = baseline.drop_duplicates(keys).set_index(keys)
+        if how == 'inner':
+            starlink = starlink[starlink.index.isin(baseline.index)]
+        elif how != 'left':
+            raise ValueError(f"Unknown join '{how}', expected 'left' or 'inner'")
+        return cls(starlink[metrics], baseline[metrics].reindex(starlink.index),
+                   starlink[[column for column in starlink.columns if column not in metrics]])
+
+    @classmethod
+    def from_paired_columns(cls, df, starlink_prefix='starlink_', baseline_prefix='all_', metrics=None):
+        """Compares the <starlink_prefix><metric> and <baseline_prefix><metric> columns of one table, keeping its index.
+
+        metrics defaults to every suffix present with both prefixes, e.g. total, insecure and
+        insecure_rate for insecure_hosts.csv.
+        """
+        if metrics is None:
+            metrics = [column[len(starlink_prefix):] for column in df.columns if column.startswith(starlink_prefix)
+                       and baseline_prefix + column[len(starlink_prefix):] in df.columns]
+        paired = {starlink_prefix + metric for metric in metrics} | {baseline_prefix + metric for metric in metrics}
+        return cls(df[[starlink_prefix + metric for metric in metrics]].set_axis(metrics, axis=1),
+                   df[[baseline_prefix + metric for metric in metrics]].set_axis(metrics, axis=1),
+                   df[[column for column in df.columns if column not in paired]])
+
+    # --- Statistics (a DataFrame over all metrics, or a Series for one) ---
+
+    def _values(self, metric):
+        if metric is None:
+            return self.starlink.astype(float), self.baseline.astype(float)
+        return self.starlink[metric].astype(float), self.baseline[metric].astype(float)
+
+    def diff(self, metric=None):
+        """Starlink minus baseline."""
+        starlink, baseline = self._values(metric)
+        return starlink - baseline
+
+    def ratio(self, metric=None):
+        """Starlink over baseline."""
+        starlink, baseline = self._values(metric)
+        with np.errstate(divide='ignore', invalid='ignore'):
+            return starlink / baseline
+
+    def log_ratio(self, metric=None):
+        """Natural log of the ratio (-inf where Starlink is 0, inf where the baseline is)."""
+        with np.errstate(divide='ignore', invalid='ignore'):
+            return np.log(self.ratio(metric))
+
+    def metric(self, name):
+        """One metric's starlink, baseline, diff, ratio and log_ratio columns."""
+        return pd.DataFrame({'starlink': self.starlink[name], 'baseline': self.baseline[name],
+                             'diff': self.diff(name), 'ratio': self.ratio(name), 'log_ratio': self.log_ratio(name)})
+
+    def to_frame(self, stats=STATS, labels=True):
+        """Wide frame with a <metric>_<stat> column per metric and stat, after the label columns."""
+        values = {'starlink': self.starlink, 'baseline': self.baseline, 'diff': self.diff(), 'ratio': self.ratio(),
+                  'log_ratio': self.log_ratio()}
+        columns = {f'{metric}_{stat}': values[stat][metric] for metric in self.metrics for stat in stats}
+        frame = pd.DataFrame(columns, index=self.starlink.index)
+        return pd.concat([self.labels, frame], axis=1) if labels else frame
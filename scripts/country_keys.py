@@ -0,0 +1,214 @@
+"""
+One integer ID per country, shared by every loader and join.
+
+The inputs name countries in different ways: ISO-A2 codes (insecure_hosts, the bquxjob
+exports), Censys country names (non-IANA ports), World Bank / wealth-report names
+(affluent.csv) and Natural Earth ADMIN names or ISO_A2_EH codes (the shapefiles).
+`data/country_keys/country_keys.csv` lists each country once, with its ISO codes, a
+display name and every alias seen in those sources. `CountryResolver` turns any of
+those spellings into the row number of that table, so joins become integer joins on a
+categorical `country_id` column instead of string matches.
+
+To regenerate the table after adding a source or alias, run from `scripts/`:
+
+    python country_keys.py
+"""
+import os
+import sqlite3
+import unicodedata
+
+import numpy as np
+import pandas as pd
+import pyogrio
+
+from snapshot_store import DATA_DIR
+
+KEYS_PATH = os.path.join(DATA_DIR, 'country_keys', 'country_keys.csv')
+ALIAS_SEP = '|'
+
+# Censys/report spellings that no Natural Earth or World Bank name column matches
+# (mostly the country_mapping dict fig8/fig9 used to carry)
+MANUAL_ALIASES = {
+    'CZ': ['Czech Republic'],
+    'CV': ['Cape Verde'],
+    'SZ': ['Swaziland'],
+    'MK': ['Macedonia'],
+    'CD': ['DR Congo'],
+    'TW': ['Taiwan'],
+}
+
+# Countries the QGIS join in wb_rurality.sqlite left without Natural Earth codes, by World Bank code
+WB_CODE_ALIASES = {'NOR': 'NO', 'ROU': 'RO'}
+
+NE_NAME_COLUMNS = ['ADMIN', 'NAME', 'NAME_LONG', 'FORMAL_EN', 'NAME_SORT', 'NAME_ALT', 'NAME_CIAWF',
+                   'BRK_NAME', 'GEOUNIT', 'SUBUNIT', 'NAME_EN']
+
+
+def normalize_name(value):
+    """Case-, accent- and whitespace-insensitive form of a country name or code."""
+    value = unicodedata.normalize('NFKD', str(value))
+    value = ''.join(ch for ch in value if not unicodedata.combining(ch))
+    return ' '.join(value.replace('’', "'").casefold().split())
+
+
+def _valid_code(code):
+    return isinstance(code, str) and code not in ('', '-99')
+
+
+def _valid_a2(code):
+    # Natural Earth uses -99 for "none" and e.g. CN-TW for Taiwan's ISO_A2
+    return _valid_code(code) and len(code) == 2
+
+
+# --- Building the key table ---
+
+def _natural_earth_rows(shapefile):
+    """(key, iso_a3, name, aliases) rows from a Natural Earth admin-0 shapefile's attributes."""
+    df = pyogrio.read_dataframe(shapefile, read_geometry=False)
+    rows = list()
+    for record in df.to_dict('records'):
+        iso_a2 = next((record[c] for c in ('ISO_A2', 'ISO_A2_EH') if _valid_a2(record.get(c))), None)
+        iso_a3 = next((record[c] for c in ('ISO_A3', 'ISO_A3_EH', 'ADM0_A3') if _valid_code(record.get(c))), None)
+        names = [record[c] for c in NE_NAME_COLUMNS if isinstance(record.get(c), str)]
+        rows.append((iso_a2 or record['ADM0_A3'], iso_a3, record['ADMIN'], names))
+    return rows
+
+
+def _world_bank_rows():
+    """Rows from the Natural Earth 10m attributes joined into wb_rurality.sqlite."""
+    from covariates import RURALITY_DB, RURALITY_TABLE
+
+    conn = sqlite3.connect(RURALITY_DB)
+    try:
+        df = pd.read_sql_query(f'SELECT * FROM {RURALITY_TABLE} ORDER BY ogc_fid', conn)
+    finally:
+        conn.close()
+    prefix = 'ne_10m_admin_0_countries_'
+    rows = list()
+    for record in df.to_dict('records'):
+        iso_a2 = next((record[prefix + c] for c in ('iso_a2', 'iso_a2_eh') if _valid_a2(record[prefix + c])),
+                      WB_CODE_ALIASES.get(record['country code']))
+        if iso_a2 is None:
+            continue  # regional aggregates ("Euro area", "IDA total", ...)
+        names = [record['country name']] + [record[prefix + c.lower()] for c in NE_NAME_COLUMNS
+                                            if isinstance(record.get(prefix + c.lower()), str)]
+        rows.append((iso_a2, record['country code'], record[prefix + 'admin'] or record['country name'], names))
+    return rows
+
+
+def _export_rows():
+    """(code, name) pairs from the committed Censys/BigQuery exports."""
+    from snapshot_store import INPUTS, source_path
+
+    rows = list()
+    for name, code_column, name_column in (('insecure_hosts', 'country', 'country_name'),
+                                           ('insecure_hosts_plus', 'country', 'country_name'),
+                                           ('os_cve_starlink', 'country_code', 'country'),
+                                           ('os_cve_baseline', 'country_code', 'country')):
+        # Parsed directly: the snapshot loader needs this table to add country_id
+        df = INPUTS[name][1](source_path(name))
+        for code, country in zip(df[code_column], df[name_column]):
+            if _valid_code(code):
+                rows.append((code, None, country, [country]))
+    return rows
+
+
+def build_country_table():
+    """Merges every source into one row per country; existing IDs keep their position."""
+    existing = load_country_table() if os.path.exists(KEYS_PATH) else None
+    entries = dict()  # key -> {'iso_a3', 'name', 'aliases'}
+    if existing is not None:
+        for record in existing.to_dict('records'):
+            entries[record['key']] = {'iso_a3': record['iso_a3'] or None, 'name': record['name'],
+                                      'aliases': record['aliases'].split(ALIAS_SEP) if record['aliases'] else []}
+
+    # The sovereignty shapefile is not a source: its ISO_A2_EH codes are unreliable (the
+    # United Kingdom is tagged GA, Gabon's code), but all of its ADMIN names resolve
+    sources = (_natural_earth_rows(os.path.join(DATA_DIR, 'mapfiles', 'ne_110m_admin_0_countries.shp'))
+               + _world_bank_rows()
+               + _export_rows()
+               + [(key, None, None, names) for key, names in MANUAL_ALIASES.items()])
+    for key, iso_a3, name, aliases in sources:
+        entry = entries.setdefault(key, {'iso_a3': None, 'name': None, 'aliases': []})
+        entry['iso_a3'] = entry['iso_a3'] or iso_a3
+        entry['name'] = entry['name'] or name
+        for alias in aliases:
+            if alias and alias not in entry['aliases'] and alias != entry['name']:
+                entry['aliases'].append(alias)
+
+    return pd.DataFrame([{'country_id': i, 'key': key, 'iso_a3': entry['iso_a3'] or '',
+                          'name': entry['name'] or key, 'aliases': ALIAS_SEP.join(entry['aliases'])}
+                         for i, (key, entry) in enumerate(entries.items())])
+
+
+def load_country_table():
+    return pd.read_csv(KEYS_PATH, dtype=str, keep_default_na=False)
+
+
+# --- Resolving ---
+
+class CountryResolver:
+    """Maps any known country name, alias or code to its integer country_id (-1 if unknown)."""
+
+    def __init__(self, table=None):
+        table = load_country_table() if table is None else table
+        self.keys = table['key'].to_numpy(dtype=object)      # ISO-A2 (or ADM0_A3 where there is none)
+        self.names = table['name'].to_numpy(dtype=object)
+        self.index = dict()
+        # Codes win over names, and a country's own names over other countries' aliases
+        for column in ('key', 'iso_a3', 'name', 'aliases'):
+            for country_id, value in enumerate(table[column]):
+                for spelling in (value.split(ALIAS_SEP) if column == 'aliases' else [value]):
+                    if spelling:
+                        self.index.setdefault(normalize_name(spelling), country_id)
+
+    def resolve(self, values):
+        """Vectorized lookup: each distinct spelling is normalized once, then ids are gathered."""
+        codes, uniques = pd.factorize(pd.Series(values, dtype=object))
+        lookup = np.array([self.index.get(normalize_name(u), -1) for u in uniques] + [-1], dtype=np.int16)
+        return lookup[codes]  # factorize marks missing values as -1, which picks the trailing -1
+
+    def resolve_first(self, *columns):
+        """Resolves several candidate columns, keeping the first that is known for each row."""
+        ids = self.resolve(columns[0])
+        for values in columns[1:]:
+            missing = ids < 0
+            if not missing.any():
+                break
+            ids[missing] = self.resolve(np.asarray(values, dtype=object)[missing])
+        return ids
+
+    def categorical(self, ids):
+        """Wraps ids as a pandas Categorical over the country keys (-1 becomes NaN)."""
+        return pd.Categorical.from_codes(ids, categories=self.keys)
+
+    def key_of(self, ids):
+        return np.where(ids >= 0, self.keys[ids], None)
+
+    def name_of(self, ids):
+        return np.where(ids >= 0, self.names[ids], None)
+
+
+_resolver = None
+
+
+def get_resolver():
+    """Returns the process-wide CountryResolver, loading it on first use."""
+    global _resolver
+    if _resolver is None:
+        _resolver = CountryResolver()
+    return _resolver
+
+
+def add_country_id(df, *columns):
+    """Adds a categorical `country_id` column resolved from the first known of the given columns."""
+    resolver = get_resolver()
+    df['country_id'] = resolver.categorical(resolver.resolve_first(*(df[c] for c in columns)))
+    return df
+
+
+if __name__ == '__main__':
+    country_table = build_country_table()
+    os.makedirs(os.path.dirname(KEYS_PATH), exist_ok=True)
+    country_table.to_csv(KEYS_PATH, index=False)
+    print(f"Wrote {len(country_table)} countries to {KEYS_PATH}")
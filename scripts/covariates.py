@@ -0,0 +1,85 @@
+"""
+Country-level covariates (World Bank rurality, household wealth), bulk-loaded once and
+keyed by ISO-A2 code.
+
+`wb_rurality.sqlite` is read in a single query with every year column, and both it and
+`affluent.csv` are keyed through `country_keys`, so every country spelling lands on the
+same ISO-A2 index. Lookups take a whole array of country codes and return aligned
+arrays (NaN where a covariate is missing), so there is no per-country query.
+"""
+import os
+import sqlite3
+
+import numpy as np
+import pandas as pd
+
+from country_keys import get_resolver
+from snapshot_store import DATA_DIR, load_frame
+
+RURALITY_DB = os.path.join(DATA_DIR, 'raw', 'world_bank_rurality', 'wb_rurality.sqlite')
+RURALITY_TABLE = 'api_sprurtotlzs_ds2_en_csv_v2_21017'
+A2_COLUMN = 'ne_10m_admin_0_countries_iso_a2'
+WEALTH_COLUMNS = ['Adults', 'Median', 'Mean', 'Gini %']
+
+
+def _load_rurality_frame():
+    """Reads the whole rurality table (all years) in one query."""
+    conn = sqlite3.connect(RURALITY_DB)
+    try:
+        df = pd.read_sql_query(f'SELECT * FROM {RURALITY_TABLE} ORDER BY ogc_fid', conn)
+    finally:
+        conn.close()
+    return df
+
+
+class CovariateStore:
+    """Covariate tables indexed by ISO-A2, with vectorized lookups aligned to a country array."""
+
+    def __init__(self):
+        resolver = get_resolver()
+        raw = _load_rurality_frame()
+        # iso_a2 first (as fig3 always used), then the World Bank ISO-A3 code for rows
+        # where Natural Earth has -99 (e.g. France) or the QGIS join found nothing
+        ids = resolver.resolve_first(raw[A2_COLUMN], raw['country code'])
+        raw = raw.assign(country=resolver.key_of(ids))[ids >= 0].drop_duplicates(subset='country', keep='first')
+
+        self.years = [c for c in raw.columns if c.isdigit()]
+        # Year columns are FLOAT except the latest one, which the export left as VARCHAR
+        self.rurality = raw.set_index('country')[self.years].apply(pd.to_numeric, errors='coerce')
+
+        affluent = load_frame('affluent')
+        affluent['country'] = resolver.key_of(affluent['country_id'].cat.codes.to_numpy())
+        self.wealth = (affluent.dropna(subset=['country'])
+                       .drop_duplicates(subset='country')
+                       .set_index('country')[['Location'] + WEALTH_COLUMNS])
+
+    def rurality_for(self, a2_codes, year='2023'):
+        """Rural population share (%) for each code in the given year."""
+        return self.rurality[str(year)].reindex(np.asarray(a2_codes, dtype=object)).to_numpy(dtype=float)
+
+    def rurality_matrix(self, a2_codes, years=None):
+        """Country x year matrix of rural population shares, for per-year sweeps."""
+        years = self.years if years is None else [str(y) for y in years]
+        return self.rurality[years].reindex(np.asarray(a2_codes, dtype=object)).to_numpy(dtype=float)
+
+    def wealth_for(self, a2_codes, column='Median'):
+        """A column of affluent.csv (e.g. median wealth per adult) for each code."""
+        return self.wealth[column].reindex(np.asarray(a2_codes, dtype=object)).to_numpy(dtype=float)
+
+    def frame_for(self, a2_codes, year='2023'):
+        """Every covariate for each code as one DataFrame, rows aligned with a2_codes."""
+        a2_codes = np.asarray(a2_codes, dtype=object)
+        df = self.wealth[WEALTH_COLUMNS].reindex(a2_codes)
+        df['rurality'] = self.rurality[str(year)].reindex(a2_codes).to_numpy()
+        return df.reset_index(drop=True)
+
+
+_store = None
+
+
+def load_covariates():
+    """Returns the process-wide CovariateStore, loading it on first use."""
+    global _store
+    if _store is None:
+        _store = CovariateStore()
+    return _store
@@ -0,0 +1,133 @@
+"""
+Local, indexed replacement for the `ON CompareCpe(c.cpe, h.os_uri)` join in
+`data/sql/join_censys_to_cve/create-*-cve-join.sql`.
+
+The SQL join compares every host against every NVD `cpe23Uri` pattern. Here the
+patterns are indexed once by (vendor, product), with separate buckets for patterns
+that wildcard either field, so each distinct host CPE is only compared against the
+few patterns that could possibly match. Hosts are deduplicated by OS CPE before
+matching and the matches are fanned back out to their IPs.
+
+Usage (from `scripts/`):
+
+    python cpe_match.py --nvd nvdcve.jsonl --hosts starlink-*.json.gz --out starlink_cve_map.csv
+"""
+import argparse
+import csv
+
+from local_aggregate import get_field, iter_host_records
+
+CPE_PARTS = 13
+# CompareCpe checks positions 3-12; positions 0-2 ('cpe', '2.3', part) are never compared
+FIRST_COMPARED, LAST_COMPARED = 3, 12
+MAX_WILDCARDS = 7
+VENDOR, PRODUCT = 3, 4
+
+
+def split_cpe(cpe):
+    """Splits a CPE 2.3 string, returning None where the ValidCpe UDF would reject it."""
+    if cpe is None:
+        return None
+    parts = cpe.split(':')
+    if len(parts) != CPE_PARTS:
+        return None
+    if sum(part == '*' for part in parts[FIRST_COMPARED:LAST_COMPARED + 1]) > MAX_WILDCARDS:
+        return None  # too general, same cut-off as the SQL
+    return parts
+
+
+class CpeIndex:
+    """NVD cpe23Uri patterns bucketed by (vendor, product), with wildcard buckets kept separately."""
+
+    def __init__(self):
+        # (vendor or '*', product or '*') -> list of (cve_id, cpe, parts[5:13])
+        self.buckets = dict()
+        self.patterns = 0
+
+    def add(self, cve_id, cpe):
+        """Indexes one (cve_id, cpe23Uri) pair, skipping patterns ValidCpe rejects."""
+        parts = split_cpe(cpe)
+        if parts is None:
+            return
+        key = (parts[VENDOR], parts[PRODUCT])
+        self.buckets.setdefault(key, list()).append((cve_id, cpe, parts[PRODUCT + 1:LAST_COMPARED + 1]))
+        self.patterns += 1
+
+    def match(self, candidate):
+        """Returns every (cve_id, cpe) whose pattern matches a host CPE, as CompareCpe would."""
+        parts = split_cpe(candidate)
+        if parts is None:
+            return []
+        vendor, product = parts[VENDOR], parts[PRODUCT]
+        rest = parts[PRODUCT + 1:LAST_COMPARED + 1]
+
+        matches = list()
+        for key in {(vendor, product), (vendor, '*'), ('*', product), ('*', '*')}:
+            for cve_id, cpe, pattern_rest in self.buckets.get(key, ()):
+                if all(p == '*' or p == c for p, c in zip(pattern_rest, rest)):
+                    matches.append((cve_id, cpe))
+        return matches
+
+
+def iter_nvd_cpes(path):
+    """Yields (cve_id, cpe23Uri) from the nvdcve.jsonl items, like the UNNESTs in the SQL."""
+    for item in iter_host_records(path):
+        cve_id = get_field(item, 'cve', 'CVE_data_meta', 'ID')
+        for node in get_field(item, 'configurations', 'nodes') or ():
+            for cpe_match in node.get('cpe_match') or ():
+                yield cve_id, cpe_match.get('cpe23Uri')
+
+
+def build_index(nvd_paths):
+    """Builds a CpeIndex over every NVD file."""
+    index = CpeIndex()
+    for path in nvd_paths:
+        for cve_id, cpe in iter_nvd_cpes(path):
+            index.add(cve_id, cpe)
+    return index
+
+
+def group_hosts_by_cpe(host_paths):
+    """Maps each distinct (valid) OS CPE to the IPs of the hosts reporting it."""
+    hosts_by_cpe = dict()
+    for path in host_paths:
+        for record in iter_host_records(path):
+            os_uri = get_field(record, 'operating_system', 'uniform_resource_identifier')
+            if split_cpe(os_uri) is None:
+                continue
+            hosts_by_cpe.setdefault(os_uri, list()).append(get_field(record, 'host_identifier', 'ipv4'))
+    return hosts_by_cpe
+
+
+def iter_cve_map(index, hosts_by_cpe):
+    """Yields (host_ip, cve_id, cpe) rows, matching each distinct CPE once."""
+    for os_uri, host_ips in hosts_by_cpe.items():
+        matches = index.match(os_uri)
+        for host_ip in host_ips:
+            for cve_id, cpe in matches:
+                yield host_ip, cve_id, cpe
+
+
+def write_cve_map(rows, out_path):
+    """Writes the host_ip, cve_id, cpe map as CSV and returns the row count."""
+    count = 0
+    with open(out_path, 'w', newline='') as file:
+        writer = csv.writer(file)
+        writer.writerow(['host_ip', 'cve_id', 'cpe'])
+        for row in rows:
+            writer.writerow(row)
+            count += 1
+    return count
+
+
+if __name__ == '__main__':
+    parser = argparse.ArgumentParser(description='Join Censys host OS CPEs to NVD CVEs with an indexed matcher.')
+    parser.add_argument('--nvd', nargs='+', required=True, help='nvdcve.jsonl file(s) (one CVE item per line)')
+    parser.add_argument('--hosts', nargs='+', required=True, help='Censys host export shards (NDJSON[.gz])')
+    parser.add_argument('--out', required=True, help='Output CSV with host_ip, cve_id, cpe')
+    args = parser.parse_args()
+
+    cpe_index = build_index(args.nvd)
+    host_groups = group_hosts_by_cpe(args.hosts)
+    n_rows = write_cve_map(iter_cve_map(cpe_index, host_groups), args.out)
+    print(f"Indexed {cpe_index.patterns} CPE patterns, matched {len(host_groups)} distinct host CPEs, wrote {n_rows} rows")
@@ -0,0 +1,295 @@
+"""
+CVSS-weighted CVE exposure per host and per country.
+
+`starlink-cve-locations.sql` (and `local_aggregate.py`) only flag whether a host has
+any CVE. Here the CVEs are enriched locally:
+
+* `CveTable.from_nvd` streams the NVD JSON 1.1 items (`nvdcve.jsonl`, one item per
+  line, see `../data/README_DATA.md`) and keeps, per CVE, the CVSS v3 and v2 base
+  scores and vectors and the publish date in compact columns: an int64 key
+  (`year * 10**8 + number`) sorted for binary search, float32 scores, dictionary-coded
+  vectors and datetime64 dates. The table is saved as an Arrow file under
+  `../data/cves/` and memory-mapped on load.
+* `host_exposure` scores a `cpe_match.py` host -> CVE map: host IPs and CVE IDs are
+  factorized once, each distinct CVE is looked up once, duplicate (host, CVE) pairs are
+  dropped, and the per-host sums, maxima and severity-band counts are bincounts and
+  reduceats over the sorted pairs. Millions of pairs take seconds.
+* `country_exposure` joins that onto every host (hosts without CVEs count in the
+  denominators) and aggregates per country, with the `os_cve_locations` columns plus
+  the exposure columns.
+
+A host's score for a CVE is its v3 base score, or the v2 score where NVD has no v3
+metrics; its severity-weighted exposure is the sum of those scores over its distinct
+CVEs, divided by 10 (so a critical 10.0 CVE counts 1 and a low 2.0 CVE 0.2). Bands
+follow the CVSS v3 ratings: low 0.1-3.9, medium 4.0-6.9, high 7.0-8.9, critical 9.0-10.
+
+Usage (from `scripts/`):
+
+    python cvss_exposure.py --nvd nvdcve.jsonl --cve-map starlink_cve_map.csv \
+        --hosts starlink-*.json.gz --name starlink
+    python cvss_exposure.py --cve-map baseline_cve_map.csv --hosts ../data/hosts/baseline --name baseline
+"""
+import argparse
+import os
+import time
+
+import numpy as np
+import pandas as pd
+import pyarrow as pa
+import pyarrow.csv as pa_csv
+
+from local_aggregate import get_field, iter_host_records
+from snapshot_store import DATA_DIR, RAW_DIR
+
+CVE_DIR = os.path.join(DATA_DIR, 'cves')
+CVE_TABLE_PATH = os.path.join(CVE_DIR, 'cve_table.arrow')
+SEVERITY_DIR = os.path.join(RAW_DIR, 'os_cve_severity')
+KEY_SCALE = 10 ** 8
+SEVERITY_BANDS = ('none', 'low', 'medium', 'high', 'critical')
+BAND_EDGES = [0.1, 4.0, 7.0, 9.0]
+
+
+# --- CVE table ---
+
+def cve_keys(cve_ids):
+    """'CVE-2021-44228' -> 2021 * 10**8 + 44228 (-1 for anything else)."""
+    parts = pd.Series(cve_ids, dtype=object).str.extract(r'^CVE-(\d{4})-(\d{1,8})$')
+    keys = pd.to_numeric(parts[0]) * KEY_SCALE + pd.to_numeric(parts[1])
+    return keys.fillna(-1).to_numpy(dtype=np.int64)
+
+
+def cve_ids(keys):
+    """Inverse of cve_keys."""
+    keys = np.asarray(keys, dtype=np.int64)
+    return ('CVE-' + pd.Series(keys // KEY_SCALE).astype(str) + '-'
+            + pd.Series(keys % KEY_SCALE).astype(str).str.zfill(4)).to_numpy(dtype=object)
+
+
+def iter_nvd_scores(path):
+    """Yields (cve_id, v3 score, v3 vector, v2 score, v2 vector, published date) per NVD item."""
+    for item in iter_host_records(path):
+        impact = item.get('impact') or dict()
+        v3 = get_field(impact, 'baseMetricV3', 'cvssV3') or dict()
+        v2 = get_field(impact, 'baseMetricV2', 'cvssV2') or dict()
+        yield (get_field(item, 'cve', 'CVE_data_meta', 'ID'), v3.get('baseScore'), v3.get('vectorString'),
+               v2.get('baseScore'), v2.get('vectorString'), item.get('publishedDate'))
+
+
+def _score_array(values):
+    return np.array([np.nan if value is None else value for value in values], dtype=np.float32)
+
+
+class CveTable:
+    """CVSS scores, vectors and publish dates of every CVE, sorted by numeric key."""
+
+    def __init__(self, key, cvss3_score, cvss3_vector, cvss2_score, cvss2_vector, published):
+        self.key = np.asarray(key, dtype=np.int64)
+        self.cvss3_score = np.asarray(cvss3_score, dtype=np.float32)
+        self.cvss3_vector = pd.Categorical(cvss3_vector)
+        self.cvss2_score = np.asarray(cvss2_score, dtype=np.float32)
+        self.cvss2_vector = pd.Categorical(cvss2_vector)
+        self.published = np.asarray(published, dtype='datetime64[s]')
+
+    def __len__(self):
+        return len(self.key)
+
+    @classmethod
+    def from_nvd(cls, paths):
+        """Streams NVD items (a later duplicate of a CVE replaces the earlier one)."""
+        rows = [row for path in paths for row in iter_nvd_scores(path)]
+        ids, v3_score, v3_vector, v2_score, v2_vector, published = zip(*rows) if rows else ((),) * 6
+        keys = cve_keys(ids)
+        # Keep the last occurrence of each valid key, in key order
+        order = np.lexsort((-np.arange(len(keys)), keys))
+        order = order[keys[order] >= 0]
+        order = order[np.r_[True, keys[order][1:] != keys[order][:-1]]] if len(order) else order
+        dates = pd.to_datetime(pd.Series(published, dtype=object), utc=True, errors='coerce', format='mixed')
+        return cls(keys[order], _score_array(v3_score)[order], np.asarray(v3_vector, dtype=object)[order],
+                   _score_array(v2_score)[order], np.asarray(v2_vector, dtype=object)[order],
+                   dates.dt.tz_localize(None).to_numpy(dtype='datetime64[s]')[order])
+
+    @property
+    def score(self):
+        """CVSS v3 base score, or v2 where there is no v3 (NaN if neither)."""
+        return np.where(np.isnan(self.cvss3_score), self.cvss2_score, self.cvss3_score)
+
+    @property
+    def score_version(self):
+        return np.where(~np.isnan(self.cvss3_score), 3, np.where(~np.isnan(self.cvss2_score), 2, 0)).astype(np.int8)
+
+    def lookup(self, ids):
+        """Row of each CVE ID in the table, -1 where it is absent."""
+        keys = cve_keys(ids)
+        rows = np.minimum(np.searchsorted(self.key, keys), max(len(self.key) - 1, 0))
+        found = (len(self.key) > 0) & (self.key[rows] == keys) if len(self.key) else np.zeros(len(keys), bool)
+        return np.where(found, rows, -1)
+
+    def to_frame(self):
+        return pd.DataFrame({'cve_id': cve_ids(self.key), 'cvss3_score': self.cvss3_score,
+                             'cvss3_vector': self.cvss3_vector, 'cvss2_score': self.cvss2_score,
+                             'cvss2_vector': self.cvss2_vector, 'published': self.published,
+                             'score': self.score, 'severity': severity_band(self.score)})
+
+    def save(self, path=CVE_TABLE_PATH):
+        table = pa.table({'key': self.key, 'cvss3_score': self.cvss3_score,
+                          'cvss3_vector': pa.DictionaryArray.from_pandas(self.cvss3_vector),
+                          'cvss2_score': self.cvss2_score,
+                          'cvss2_vector': pa.DictionaryArray.from_pandas(self.cvss2_vector),
+                          'published': self.published})
+        os.makedirs(os.path.dirname(path), exist_ok=True)
+        with pa.OSFile(path, 'wb') as sink:
+            with pa.ipc.new_file(sink, table.schema) as writer:
+                writer.write_table(table)
+
+    @classmethod
+    def load(cls, path=CVE_TABLE_PATH):
+        """Memory-maps a saved table."""
+        if not os.path.exists(path):
+            raise FileNotFoundError(f"{path} not found; build it with --nvd nvdcve.jsonl")
+        table = pa.ipc.open_file(pa.memory_map(path, 'r')).read_all()
+        return cls(*(table.column(name).to_pandas() if name.endswith('vector') else table.column(name).to_numpy()
+                     for name in ('key', 'cvss3_score', 'cvss3_vector', 'cvss2_score', 'cvss2_vector', 'published')))
+
+
+def severity_band(scores):
+    """Categorical CVSS v3 rating of each score (NaN scores stay missing)."""
+    scores = np.asarray(scores, dtype=float)
+    codes = np.where(np.isnan(scores), -1, np.digitize(np.nan_to_num(scores), BAND_EDGES))
+    return pd.Categorical.from_codes(codes, SEVERITY_BANDS, ordered=True)
+
+
+# --- Exposure ---
+
+def read_cve_map(path):
+    """host_ip and cve_id columns of a cpe_match.py map, dictionary-encoded as they are read."""
+    strings = pa.dictionary(pa.int32(), pa.string())
+    options = pa_csv.ConvertOptions(include_columns=['host_ip', 'cve_id'],
+                                    column_types={'host_ip': strings, 'cve_id': strings})
+    return pa_csv.read_csv(path, convert_options=options).to_pandas()
+
+
+def host_exposure(cve_map, table):
+    """Per-host CVE count, severity-weighted exposure, max score/severity and band counts.
+
+    cve_map has one row per (host_ip, cve_id) match, duplicates allowed; CVEs missing
+    from the table or without CVSS metrics count in n_cves but not in the scores.
+    """
+    host_codes, hosts = pd.factorize(cve_map['host_ip'])
+    cve_codes, cve_uniques = pd.factorize(cve_map['cve_id'])
+    rows = table.lookup(cve_uniques)
+    cve_score = np.full(len(cve_uniques), np.nan)
+    if len(table):
+        # float32 scores widened back to their one-decimal values, so the sums carry no float32 noise
+        cve_score = np.where(rows >= 0, table.score[np.maximum(rows, 0)].astype(float).round(1), np.nan)
+
+    n_hosts, n_distinct = len(hosts), max(len(cve_uniques), 1)
+    pairs = np.unique(host_codes.astype(np.int64) * n_distinct + cve_codes)
+    host, score = pairs // n_distinct, cve_score[pairs % n_distinct]
+    scored = ~np.isnan(score)
+
+    n_cves = np.bincount(host, minlength=n_hosts)
+    exposure = np.bincount(host[scored], score[scored] / 10, minlength=n_hosts)
+    starts = np.searchsorted(host, np.arange(n_hosts))
+    max_score = np.fmax.reduceat(score, starts) if len(pairs) else np.zeros(0)
+    bands = np.bincount(host[scored] * len(SEVERITY_BANDS) + np.digitize(score[scored], BAND_EDGES),
+                        minlength=n_hosts * len(SEVERITY_BANDS)).reshape(n_hosts, len(SEVERITY_BANDS))
+    frame = pd.DataFrame({'host_ip': np.asarray(hosts, dtype=object), 'n_cves': n_cves,
+                          'n_scored': np.bincount(host[scored], minlength=n_hosts), 'exposure': exposure,
+                          'max_score': max_score, 'max_severity': severity_band(max_score)})
+    for j, band in enumerate(SEVERITY_BANDS[1:], start=1):
+        frame[f'n_{band}'] = bands[:, j]
+    return frame
+
+
+def host_locations(paths):
+    """(host_ip, country, country_code) of every host, from export shards or a saved host_table directory."""
+    from host_table import HostTable, is_table_dir, uint32_to_ipv4
+
+    frames = list()
+    for path in paths:
+        if is_table_dir(path):
+            table = HostTable.load(path)
+            frames.append(pd.DataFrame({'host_ip': uint32_to_ipv4(table.ipv4),
+                                        'country': table.countries()[table.location],
+                                        'country_code': table.country_codes()[table.location]}))
+        else:
+            frames.append(pd.DataFrame(
+                [(get_field(record, 'host_identifier', 'ipv4'), get_field(record, 'location', 'country'),
+                  get_field(record, 'location', 'country_code')) for record in iter_host_records(path)],
+                columns=['host_ip', 'country', 'country_code']))
+    return pd.concat(frames, ignore_index=True)
+
+
+def country_exposure(hosts, exposure):
+    """os_cve_locations-style per-country rows with mean exposure and high/critical shares.
+
+    Every host in `hosts` counts (one row per host, as the SQL's COUNT(*)); hosts absent
+    from `exposure` have no CVEs.
+    """
+    merged = hosts.merge(exposure[['host_ip', 'n_cves', 'exposure', 'max_score']], on='host_ip', how='left')
+    merged[['n_cves', 'exposure']] = merged[['n_cves', 'exposure']].fillna(0)
+    merged['has_cve'] = merged['n_cves'] > 0
+    merged['high'] = merged['max_score'] >= BAND_EDGES[2]
+    merged['critical'] = merged['max_score'] >= BAND_EDGES[3]
+    grouped = merged.groupby('country_code', dropna=False, sort=False)
+    table = grouped.agg(country=('country', 'first'), hosts_with_cve=('has_cve', 'sum'),
+                        host_count=('has_cve', 'size'), hosts_high=('high', 'sum'),
+                        hosts_critical=('critical', 'sum'), mean_exposure=('exposure', 'mean'),
+                        mean_max_score=('max_score', 'mean')).reset_index()
+    table['percentage_with_cve'] = (table['hosts_with_cve'] * 100.0 / table['host_count']).round(2)
+    table['percentage_high_or_critical'] = (table['hosts_high'] * 100.0 / table['host_count']).round(2)
+    table['percentage_critical'] = (table['hosts_critical'] * 100.0 / table['host_count']).round(2)
+    columns = ['country', 'country_code', 'hosts_with_cve', 'host_count', 'percentage_with_cve', 'mean_exposure',
+               'mean_max_score', 'hosts_high', 'hosts_critical', 'percentage_high_or_critical',
+               'percentage_critical']
+    return table[columns].sort_values('percentage_with_cve', ascending=False, kind='stable').reset_index(drop=True)
+
+
+def severity_table_path(name):
+    return os.path.join(SEVERITY_DIR, f'cve_severity_{name}.csv')
+
+
+def load_severity_table(name):
+    """A country_exposure table written by this script (country codes kept as text, so 'NA' stays Namibia)."""
+    path = severity_table_path(name)
+    if not os.path.exists(path):
+        raise FileNotFoundError(f"{path} not found; write it with `python cvss_exposure.py --cve-map <{name} cpe_match "
+                                f"map> --hosts <{name} host exports> --name {name}` (add --nvd nvdcve.jsonl on the "
+                                "first run)")
+    return pd.read_csv(path, keep_default_na=False, na_values={
+        column: [''] for column in ('mean_max_score', 'mean_exposure')})
+
+
+if __name__ == '__main__':
+    parser = argparse.ArgumentParser(description='CVSS-weighted CVE exposure per host and per country.')
+    parser.add_argument('--nvd', nargs='+', default=None,
+                        help=f'nvdcve.jsonl file(s) to (re)build the CVE table from (default: reuse {CVE_TABLE_PATH})')
+    parser.add_argument('--cve-map', default=None, help='cpe_match.py output (host_ip, cve_id, cpe)')
+    parser.add_argument('--hosts', nargs='+', default=None,
+                        help='Censys host export shards or host_table.py directories (for the country table)')
+    parser.add_argument('--name', default='starlink', help='Dataset name used in the output file names')
+    parser.add_argument('--out-dir', default=SEVERITY_DIR, help='Where to write cve_severity_<name>.csv')
+    parser.add_argument('--host-out', default=None, help='Also write the per-host exposure here')
+    args = parser.parse_args()
+
+    start = time.perf_counter()
+    if args.nvd:
+        cve_table = CveTable.from_nvd(args.nvd)
+        cve_table.save()
+        print(f'Parsed {len(cve_table)} CVEs into {CVE_TABLE_PATH} ({time.perf_counter() - start:.1f}s)')
+    else:
+        cve_table = CveTable.load()
+
+    if args.cve_map:
+        start = time.perf_counter()
+        cve_pairs = read_cve_map(args.cve_map)
+        per_host = host_exposure(cve_pairs, cve_table)
+        print(f'Scored {len(cve_pairs)} host-CVE pairs over {len(per_host)} hosts ({time.perf_counter() - start:.1f}s)')
+        if args.host_out:
+            per_host.to_csv(args.host_out, index=False)
+        if args.hosts:
+            per_country = country_exposure(host_locations(args.hosts), per_host)
+            os.makedirs(args.out_dir, exist_ok=True)
+            out_path = os.path.join(args.out_dir, f'cve_severity_{args.name}.csv')
+            per_country.to_csv(out_path, index=False)
+            print(f'Wrote {len(per_country)} countries to {out_path}')
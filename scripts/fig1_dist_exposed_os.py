@@ -1,12 +1,15 @@
 import matplotlib.pyplot as plt
+import numpy as np
+import pandas as pd
 import seaborn as sns
-import json
+from bar_render import legend_handles, stacked_barh
+from profiling import mark
+from snapshot_store import load_frame
 
 
-def load_and_process_data(file_path, replacements_list):
-    """Loads and processes OS distribution data from a JSON file."""
-    with open(file_path, 'r') as file:
-        raw_data_list = json.load(file)
+def load_and_process_data(input_name, replacements_list):
+    """Loads and processes OS distribution data from an OS-share export."""
+    raw_data_list = load_frame(input_name).to_dict('records')
 
     processed_data_dict = dict()
     os_names_set = set()
@@ -28,69 +31,58 @@ def load_and_process_data(file_path, replacements_list):
     return processed_data_dict, os_names_set
 
 
-def plot_continent_group_bars(ax_obj, group_data, y_offset, continents_order_list, colors_map, legend_os_set, bar_hgt):
-    """Plots a group of stacked horizontal bars for OS distribution by continent."""
-    current_group_y_ticks = []
-    current_group_y_labels = []
-    group_base_y = y_offset  # This is the y-value below the first bar's center of this group
+def plot_continent_group_bars(ax_obj, group_data, y_offset, continents_order_list, colors_map, legend_os_order, bar_hgt):
+    """Plots a group of stacked horizontal bars for OS distribution by continent, as one batched collection."""
+    segments = pd.DataFrame([(idx, os_key, percent_val)
+                             for idx, continent_val in enumerate(continents_order_list)
+                             for os_key, percent_val in group_data.get(continent_val, {}).items()],
+                            columns=['bar', 'os', 'percent'])
+    # bar_center_y is the y-coordinate for the center of each horizontal bar
+    bar_center_y = y_offset + np.arange(1, len(continents_order_list) + 1)
+    # Legend entries in order of first appearance across groups
+    legend_os_order.update(dict.fromkeys(segments['os']))
 
-    for idx, continent_val in enumerate(continents_order_list):
-        # bar_center_y is the y-coordinate for the center of the horizontal bar
-        bar_center_y = group_base_y + idx + 1
-        current_group_y_ticks.append(bar_center_y)
-        current_group_y_labels.append(continent_val)
-
-        current_left_position = 0
-        os_data_for_continent = group_data.get(continent_val, {})
-
-        for os_key, percent_val in os_data_for_continent.items():
-            bar_legend_label = None
-            # Add to legend only if this OS hasn't been added before from any group
-            if os_key not in legend_os_set:
-                bar_legend_label = os_key
-                legend_os_set.add(os_key)
-
-            ax_obj.barh(bar_center_y, percent_val, left=current_left_position, height=bar_hgt,
-                        color=colors_map.get(os_key), label=bar_legend_label)
-
-            os_key_parts = os_key.split(" ")
-            short_os_name_for_bar = " ".join(os_key_parts[1:]) if len(os_key_parts) > 1 else os_key
-            if percent_val > 7:
-                ax_obj.text(current_left_position + percent_val / 2, bar_center_y, short_os_name_for_bar,
-                            ha='center', va='center', fontsize=9, fontweight='bold')
-            current_left_position += percent_val
+    # Label segments wider than 7% with the OS name minus its vendor
+    short_os_names = segments['os'].str.split(' ', n=1).str[1].fillna(segments['os'])
+    stacked_barh(ax_obj, bar_center_y, segments['bar'], segments['percent'], segments['os'], colors_map,
+                 height=bar_hgt, labels=short_os_names, label_min=7,
+                 label_kwargs=dict(fontsize=9, fontweight='bold'))
 
     # Return the y-coordinate of the center of the topmost bar in this group
-    topmost_bar_center_y_in_group = group_base_y + len(continents_order_list)
-    return current_group_y_ticks, current_group_y_labels, topmost_bar_center_y_in_group
+    topmost_bar_center_y_in_group = y_offset + len(continents_order_list)
+    return list(bar_center_y), list(continents_order_list), topmost_bar_center_y_in_group
 
 
 # --- Configuration ---
-json_file_path1 = '../data/raw/os_share_by_continent/bquxjob_4255453e_19630859374.json'
-json_file_path2 = '../data/raw/os_share_by_continent/bquxjob_7e2fc6cf_196f5df2a7c.json'
+# Inputs from snapshot_store (bquxjob_4255453e_19630859374.json and bquxjob_7e2fc6cf_196f5df2a7c.json)
+os_share_input1 = 'os_share_starlink'
+os_share_input2 = 'os_share_baseline'
 
 os_name_replacements = [('os', 'OS'), ('Os', 'OS'), ('bsd', 'BSD'), ('MicrOSoft', 'Microsoft')]
 # Order of continents for display (bottom to top for each group of bars)
 continents_display_order = ['Oceania', 'South America', 'North America', 'Europe', 'Asia', 'Africa']
 
 # --- Data Loading and Preparation ---
-dataset1_data, dataset1_os_names = load_and_process_data(json_file_path1, os_name_replacements)
+dataset1_data, dataset1_os_names = load_and_process_data(os_share_input1, os_name_replacements)
 # It's assumed placeholder_second_file.json exists and has the same format.
-dataset2_data, dataset2_os_names = load_and_process_data(json_file_path2, os_name_replacements)
+dataset2_data, dataset2_os_names = load_and_process_data(os_share_input2, os_name_replacements)
 
+mark('transform')
 combined_os_names = dataset1_os_names.union(dataset2_os_names)
 num_unique_os = len(combined_os_names)
 # Generate a color palette for all unique OS types across both datasets
 color_palette = sns.color_palette("hls", num_unique_os)
 os_color_mapping = dict(zip(combined_os_names, color_palette))
 
+mark('render')
+
 # --- Plotting Setup ---
 num_continents_val = len(continents_display_order)
 # Estimate figure height: 2 groups of bars, plus space for 2 headings and legend.
 fig_height = (num_continents_val * 2 * 0.9) + 4
 fig, ax = plt.subplots(figsize=(10, fig_height if fig_height > 10 else 12))
 
-master_used_os_for_legend = set()
+master_used_os_for_legend = dict()
 bar_element_height = 0.7
 space_for_heading_and_padding = 1.5
 
@@ -136,13 +128,12 @@ ax.tick_params(axis='x', which='both', length=0)
 
 ax.xaxis.grid(True, linestyle='--', alpha=0.7)
 
-handles, labels = ax.get_legend_handles_labels()
-unique_legend_items = dict(zip(labels, handles))
-ax.legend(unique_legend_items.values(), unique_legend_items.keys(),
+ax.legend(handles=legend_handles(os_color_mapping, list(master_used_os_for_legend)),
           loc='upper center', bbox_to_anchor=(0.5, -0.06),
           fancybox=True, shadow=True, ncol=4)
 
 plt.title('', fontsize=14, pad=20)
 plt.tight_layout()
 plt.subplots_adjust(bottom=0.15 if fig_height > 12 else 0.2)
+mark('save')
 plt.savefig('../figures/fig1_dist_exposed_os.png')
@@ -0,0 +1,43 @@
+import matplotlib.pyplot as plt
+import numpy as np
+from comparison_frame import ComparisonFrame
+from cvss_exposure import load_severity_table
+from profiling import mark
+
+# Written by `python cvss_exposure.py --name starlink ...` / `--name baseline ...`
+starlink_raw_data = load_severity_table('starlink')
+non_starlink_raw_data = load_severity_table('baseline')
+
+mark('transform')
+starlink_filtered = starlink_raw_data[starlink_raw_data['host_count'] > 100].head(12)
+
+# Each country's baseline severity, aligned on country_code in one join
+comparison = ComparisonFrame.from_tables(starlink_filtered, non_starlink_raw_data, on='country_code',
+                                         metrics=['percentage_high_or_critical', 'mean_exposure'])
+countries = list(comparison.labels['country'])
+
+mark('render')
+
+# Y positions for bar pairs
+y = np.arange(len(countries))
+bar_height = 0.4
+
+fig, axes = plt.subplots(1, 2, figsize=(10, 6), sharey=True)
+panels = [('percentage_high_or_critical', 'Hosts with a High/Critical OS CVE (%)'),
+          ('mean_exposure', 'Mean CVSS-Weighted Exposure per Host')]
+
+for ax, (metric, xlabel) in zip(axes, panels):
+    ax.barh(y + bar_height/2, comparison.baseline[metric], height=bar_height, color='blue',
+            label='Non-Starlink Hosts')
+    ax.barh(y - bar_height/2, comparison.starlink[metric], height=bar_height, color='red', label='Starlink Hosts')
+    ax.set_xlabel(xlabel)
+
+# Formatting
+axes[0].set_yticks(y)
+axes[0].set_yticklabels(countries)
+axes[0].invert_yaxis()
+axes[0].legend()
+
+plt.tight_layout()
+mark('save')
+plt.savefig('../figures/fig2_5_cve_severity.png')
@@ -1,36 +1,25 @@
 import matplotlib.pyplot as plt
 import numpy as np
-import json
+from comparison_frame import ComparisonFrame
+from profiling import mark
+from snapshot_store import load_frame
 
-starlink_data_file = '../data/raw/os_cve_locations/bquxjob_3c73f9c5_1965065a6b9.json'
-non_starlink_data_file = '../data/raw/os_cve_locations/bquxjob_5e7c6743_19650747b04.json'
+starlink_raw_data = load_frame('os_cve_starlink')
+non_starlink_raw_data = load_frame('os_cve_baseline')
 
+mark('transform')
+starlink_filtered = starlink_raw_data[starlink_raw_data['host_count'] > 100].head(12)
 
-with open(starlink_data_file, 'r') as file:
-    starlink_raw_data = json.load(file)
-
-with open(non_starlink_data_file, 'r') as file:
-    non_starlink_raw_data = json.load(file)
-
-starlink_filtered = list(filter(lambda r: int(r['host_count']) > 100, starlink_raw_data))[:12]
-
-data = list()
-
-for entry in starlink_filtered:
-    formatted = dict()
-    formatted['country'] = entry['country']
-
-    formatted['percent'] = float(entry['percentage_with_cve'])
-
-    non_entry = next(r for r in non_starlink_raw_data if r['country_code'] == entry['country_code'])
-    formatted['non_percent'] = float(non_entry['percentage_with_cve'])
-
-    data.append(formatted)
+# Each country's baseline percentage, aligned on country_code in one join
+comparison = ComparisonFrame.from_tables(starlink_filtered, non_starlink_raw_data, on='country_code',
+                                         metrics=['percentage_with_cve'])
 
 # Extract components
-countries = [entry['country'] for entry in data]
-percent = [entry['percent'] for entry in data]
-non_percent = [entry['non_percent'] for entry in data]
+countries = list(comparison.labels['country'])
+percent = list(comparison.starlink['percentage_with_cve'])
+non_percent = list(comparison.baseline['percentage_with_cve'])
+
+mark('render')
 
 # Y positions for bar pairs
 y = np.arange(len(countries))
@@ -56,4 +45,5 @@ ax.legend()
 #ax.legend(bbox_to_anchor=(1.05, 1), loc=2, borderaxespad=0.)
 
 plt.tight_layout()
+mark('save')
 plt.savefig('../figures/fig2_disparity_insecure_os.png')
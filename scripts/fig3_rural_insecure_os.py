@@ -1,17 +1,17 @@
 import matplotlib.pyplot as plt
 import numpy as np
-import json
-import sqlite3
 from matplotlib.ticker import PercentFormatter
 import seaborn as sns  # For KDE plot
 from statsmodels.nonparametric.smoothers_lowess import lowess  # For LOESS
+from covariates import load_covariates
+from profiling import mark
+from smoothing import BINNED_THRESHOLD, plot_kde, plot_lowess
+from snapshot_store import load_frame
 
 # --- Your existing code for data loading and preparation ---
-starlink_data_file = '../data/raw/os_cve_locations/bquxjob_3c73f9c5_1965065a6b9.json'
-
-with open(starlink_data_file, 'r') as file:
-    starlink_raw_data = json.load(file)
+starlink_raw_data = load_frame('os_cve_starlink').to_dict('records')
 
+mark('transform')
 data = list()
 
 for entry in starlink_raw_data:
@@ -21,37 +21,15 @@ for entry in starlink_raw_data:
     data.append(formatted)
 
 
-def get_rurality_by_a2(a2_value):
-    try:
-        database_path = "../data/raw/world_bank_rurality/wb_rurality.sqlite"
-        conn = sqlite3.connect(database_path)
-        cursor = conn.cursor()
-
-        table_name = 'api_sprurtotlzs_ds2_en_csv_v2_21017'
-        rurality_column = "2023"
-        a2_column = "ne_10m_admin_0_countries_iso_a2"
-        query = f'SELECT "{rurality_column}" FROM {table_name} WHERE "{a2_column}" = ? LIMIT 1'
-        cursor.execute(query, (a2_value,))
-        result = cursor.fetchone()
-
-        conn.close()
-        return float(result[0]) if result and result[0] is not None else None
-    except sqlite3.Error as e:
-        print(f"SQLite error: {e}")
-        return None
-    except ValueError as e:
-        print(
-            f"ValueError converting rurality: {e}. Value was: {result[0] if 'result' in locals() and result else 'N/A'}")
-        return None
-
+# Rurality for every country in one vectorized lookup (all years are bulk-loaded once)
+rurality_values = load_covariates().rurality_for([entry['country_code'] for entry in data], year='2023')
 
 x_list = list()
 y_list = list()
 label_list = list()
 
-for entry in data:
-    rurality = get_rurality_by_a2(entry['country_code'])
-    if rurality is None:
+for entry, rurality in zip(data, rurality_values):
+    if np.isnan(rurality):
         continue
 
     if entry['percentage_with_cve'] <= 0:
@@ -70,9 +48,16 @@ if len(x_np) == 0 or len(y_np) == 0:
     print("No data available to plot after filtering.")
     exit()
 
+mark('render')
 plt.figure(figsize=(3.5, 3))
 
-if len(x_np) > 1 and len(y_np) > 1:
+# Past a few thousand points (per-region or per-/24 views) the exact KDE and LOESS are
+# quadratic in the point count, so switch to the binned versions
+use_binned = len(x_np) > BINNED_THRESHOLD
+
+if use_binned:
+    plot_kde(plt.gca(), x_np, y_np, log_y=True, levels=5, colors='orangered', alpha=0.2, zorder=1)
+elif len(x_np) > 1 and len(y_np) > 1:
     sns.kdeplot(
         x=x_np,
         y=y_np,
@@ -88,7 +73,10 @@ if len(x_np) > 1 and len(y_np) > 1:
 
 plt.scatter(x_np, y_np, color='blue', alpha=0.7, s=60, zorder=2)
 
-if len(x_np) >= 5:
+if use_binned:
+    plot_lowess(plt.gca(), x_np, y_np, log_y=True, frac=2 / 3, it=3, color='darkviolet', linewidth=1.75,
+                linestyle='-', label='LOESS Trend', zorder=3)
+elif len(x_np) >= 5:
     y_log_for_loess = np.log10(y_np)
     sort_indices = np.argsort(x_np)
     x_sorted = x_np[sort_indices]
@@ -111,4 +99,5 @@ plt.yscale('log')
 plt.gca().yaxis.set_major_formatter(PercentFormatter(100))
 plt.grid(True, linestyle='--', alpha=0.7)
 plt.tight_layout()
+mark('save')
 plt.savefig('../figures/fig3_rural_insecure_os.png')
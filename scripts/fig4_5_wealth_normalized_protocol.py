@@ -1,27 +1,25 @@
 import matplotlib.pyplot as plt
 import matplotlib.colors as mcolors
 import pandas as pd
-import geopandas as gpd
 import numpy as np
-from sklearn.linear_model import LinearRegression
+from comparison_frame import ComparisonFrame
+from covariates import load_covariates
+from geometry_cache import load_world
+from profiling import mark
+from regression_diagnostics import design_matrix, fit_ols
+from snapshot_store import load_frame
 
 # Load insecure hosts data
-data = pd.read_csv("../data/raw/insecure_hosts/insecure_hosts_plus.csv")
-data["insecure_ratio"] = data["starlink_insecure_rate"] / data["all_insecure_rate"]
+data = load_frame('insecure_hosts_plus')
+data["insecure_ratio"] = ComparisonFrame.from_paired_columns(data).ratio("insecure_rate")
 data = data.dropna()
 
-# Load wealth data for normalization
-affluent = pd.read_csv("../data/raw/affluent/affluent.csv")
-# Clean the median wealth column (remove quotes, estimates, and convert to numeric)
-affluent['Median'] = (affluent['Median'].str.replace('"', '')
-                                        .str.replace(',', '')
-                                        .str.replace(r'\s*\(est\.\)', '', regex=True))
-# Convert to numeric, setting invalid values to NaN
-affluent['Median'] = pd.to_numeric(affluent['Median'], errors='coerce')
+mark('transform')
 
-# Merge with wealth data using country names
-data_with_wealth = data.merge(affluent[['Location', 'Median']],
-                              left_on='country_name', right_on='Location', how='left')
+# Merge with wealth data (affluent.csv, cleaned and keyed by ISO-A2 in the covariate store)
+wealth = load_covariates().wealth
+data_with_wealth = data.merge(wealth[['Location', 'Median']],
+                              left_on='country', right_index=True, how='left').reset_index(drop=True)
 
 # Remove countries without wealth data for regression
 regression_data = data_with_wealth.dropna(subset=['Median', 'insecure_ratio']).copy()
@@ -29,29 +27,34 @@ regression_data = data_with_wealth.dropna(subset=['Median', 'insecure_ratio']).c
 # Transform wealth to log scale for better linear relationship
 regression_data['log_median_wealth'] = np.log10(regression_data['Median'])
 
+mark('stats')
+
 # Fit linear regression: insecurity_ratio ~ log(median_wealth)
-X = regression_data[['log_median_wealth']]
-y = regression_data['insecure_ratio']
-model = LinearRegression().fit(X, y)
+model = fit_ols(regression_data, 'insecure_ratio', ['log_median_wealth'])
 
 # Predict expected insecurity for all countries with wealth data
 data_with_wealth['log_median_wealth'] = np.log10(data_with_wealth['Median'])
 mask = ~data_with_wealth['log_median_wealth'].isna()
-data_with_wealth.loc[mask, 'expected_insecurity'] = model.predict(data_with_wealth.loc[mask, ['log_median_wealth']])
+data_with_wealth.loc[mask, 'expected_insecurity'] = model.predict(
+    design_matrix(data_with_wealth.loc[mask], ['log_median_wealth']))
 
 # Calculate residuals (actual - expected)
 data_with_wealth['insecurity_residual'] = data_with_wealth['insecure_ratio'] - data_with_wealth['expected_insecurity']
 
+# Closed-form influence diagnostics (leave-one-out residual, studentized residual, Cook's distance)
+diagnostics = model.diagnostics(index=regression_data.index)
+data_with_wealth = data_with_wealth.join(diagnostics[['leverage', 'loo_residual', 'studentized_residual',
+                                                      'cooks_distance']])
+
+mark('transform')
+
 # Use residuals for coloring instead of raw ratios
 data = data_with_wealth.copy()
 data['insecure_ratio'] = data['insecurity_residual']
 
-world = gpd.read_file("../data/raw/ne_110m_admin_0_sovereignty/ne_110m_admin_0_sovereignty.shp")
-world = world.rename(columns={"ISO_A2_EH": "country"})
-
-# Aggregate by continent and merge with your data
-world_continents = world.dissolve(by='country').reset_index()
-merged = world_continents.merge(data, on='country', how='left')
+# Sovereignty polygons already dissolved by country_id (cached across runs)
+world_continents = load_world('sovereignty')
+merged = world_continents.merge(data, on='country_id', how='left')
 
 # Color based on residuals: green if below expected (better than expected), red if above expected (worse than expected)
 def get_color(residual):
@@ -69,6 +72,8 @@ def get_color(residual):
 merged['color'] = merged['insecure_ratio'].apply(get_color)
 
 
+mark('render')
+
 # Create a custom colorbar legend
 fig, ax = plt.subplots(figsize=(12, 6))
 merged.plot(ax=ax, color=merged['color'], edgecolor='black')
@@ -89,11 +94,13 @@ cbar.set_label('Residuals: Actual - Expected Insecurity Ratio', fontsize=12)
 cbar.set_ticks([-0.5, 0, 0.5])
 cbar.set_ticklabels(['Negative Residuals\n(More Secure)', 'Zero Residuals\n(As Expected)', 'Positive Residuals\n(Less Secure)'])
 
+mark('save')
 plt.savefig('../figures/fig4_5_wealth_normalized_protocol.png')
 
+mark('stats')
+
 # Calculate standard error of regression for significance testing
-y_pred = model.predict(X)
-residuals = y - y_pred
+residuals = model.residuals
 mse = np.mean(residuals**2)
 std_error = np.sqrt(mse)
 
@@ -104,6 +111,22 @@ valid_residuals = data_with_wealth['insecurity_residual'].dropna()
 residual_std = valid_residuals.std()
 significance_threshold = 1.0 * residual_std
 
+def print_country_breakdown(rows):
+    """Prints each country's residual and its Starlink / non-Starlink insecure and secure counts."""
+    starlink_secure = rows['starlink_total'] - rows['starlink_insecure']
+    non_starlink_insecure = rows['all_insecure'] - rows['starlink_insecure']
+    non_starlink_secure = (rows['all_total'] - rows['starlink_total']) - non_starlink_insecure
+    lines = [f"  {name}: residual = {residual:.3f} (expected: {expected:.3f}, actual: {actual:.3f})\n"
+             f"    Starlink: {int(s_insecure)} insecure, {int(s_secure)} secure\n"
+             f"    Non-Starlink: {int(n_insecure)} insecure, {int(n_secure)} secure"
+             for name, residual, expected, actual, s_insecure, s_secure, n_insecure, n_secure in zip(
+                 rows['country_name'], rows['insecurity_residual'], rows['expected_insecurity'],
+                 rows['insecure_ratio'], rows['starlink_insecure'], starlink_secure,
+                 non_starlink_insecure, non_starlink_secure)]
+    if lines:
+        print('\n'.join(lines))
+
+
 # Find significantly deviating countries
 significant_countries = data_with_wealth[
     (~data_with_wealth['insecurity_residual'].isna()) &
@@ -111,7 +134,7 @@ significant_countries = data_with_wealth[
 ].copy()
 
 print(f"\nRegression Summary:")
-print(f"R² = {model.score(X, y):.3f}")
+print(f"R² = {model.r_squared():.3f}")
 print(f"Regression Standard Error = {std_error:.3f}")
 print(f"Residual Standard Deviation = {residual_std:.3f}")
 print(f"Significance Threshold (1.0 * residual_std) = {significance_threshold:.3f}")
@@ -129,39 +152,36 @@ if len(significant_countries) > 0:
         significant_countries['insecurity_residual'].abs().sort_values(ascending=False).index
     )
 
-    print(f"\n🔴 WORSE than expected ({len(significant_countries[significant_countries['insecurity_residual'] > 0])} countries):")
     worse_countries = significant_countries[significant_countries['insecurity_residual'] > 0]
-    for _, row in worse_countries.iterrows():
-        starlink_secure = row['starlink_total'] - row['starlink_insecure']
-        non_starlink_insecure = row['all_insecure'] - row['starlink_insecure']
-        non_starlink_total = row['all_total'] - row['starlink_total']
-        non_starlink_secure = non_starlink_total - non_starlink_insecure
-        print(f"  {row['country_name']}: residual = {row['insecurity_residual']:.3f} (expected: {row['expected_insecurity']:.3f}, actual: {row['insecure_ratio']:.3f})")
-        print(f"    Starlink: {int(row['starlink_insecure'])} insecure, {int(starlink_secure)} secure")
-        print(f"    Non-Starlink: {int(non_starlink_insecure)} insecure, {int(non_starlink_secure)} secure")
-
-    print(f"\n🟢 BETTER than expected ({len(significant_countries[significant_countries['insecurity_residual'] < 0])} countries):")
+    print(f"\n🔴 WORSE than expected ({len(worse_countries)} countries):")
+    print_country_breakdown(worse_countries)
+
     better_countries = significant_countries[significant_countries['insecurity_residual'] < 0]
-    for _, row in better_countries.iterrows():
-        starlink_secure = row['starlink_total'] - row['starlink_insecure']
-        non_starlink_insecure = row['all_insecure'] - row['starlink_insecure']
-        non_starlink_total = row['all_total'] - row['starlink_total']
-        non_starlink_secure = non_starlink_total - non_starlink_insecure
-        print(f"  {row['country_name']}: residual = {row['insecurity_residual']:.3f} (expected: {row['expected_insecurity']:.3f}, actual: {row['insecure_ratio']:.3f})")
-        print(f"    Starlink: {int(row['starlink_insecure'])} insecure, {int(starlink_secure)} secure")
-        print(f"    Non-Starlink: {int(non_starlink_insecure)} insecure, {int(non_starlink_secure)} secure")
+    print(f"\n🟢 BETTER than expected ({len(better_countries)} countries):")
+    print_country_breakdown(better_countries)
 
 else:
     print("No countries significantly deviate from wealth-expected levels.")
 
 # Show the most negative residuals for context
 print(f"\n📊 Most negative residuals (green on map, but not significant):")
-most_negative = data_with_wealth.nsmallest(5, 'insecurity_residual')[['country_name', 'insecurity_residual', 'expected_insecurity', 'insecure_ratio']]
-for _, row in most_negative.iterrows():
-    if not pd.isna(row['insecurity_residual']):
-        print(f"  {row['country_name']}: residual = {row['insecurity_residual']:.3f} (expected: {row['expected_insecurity']:.3f}, actual: {row['insecure_ratio']:.3f})")
+most_negative = data_with_wealth.nsmallest(5, 'insecurity_residual').dropna(subset=['insecurity_residual'])
+for name, residual, expected, actual in zip(most_negative['country_name'], most_negative['insecurity_residual'],
+                                            most_negative['expected_insecurity'], most_negative['insecure_ratio']):
+    print(f"  {name}: residual = {residual:.3f} (expected: {expected:.3f}, actual: {actual:.3f})")
 
 print(f"\nTotal countries analyzed: {len(regression_data)}")
 print(f"Countries with significant deviations: {len(significant_countries)}")
 
+# Leave-one-out view of the same fit: countries that move the regression line the most
+cooks_threshold = 4 / len(regression_data)
+influential = data_with_wealth[data_with_wealth['cooks_distance'] > cooks_threshold].sort_values(
+    'cooks_distance', ascending=False)
+print(f"\n=== Influential Countries (Cook's distance > 4/n = {cooks_threshold:.3f}) ===")
+for name, cooks, studentized, loo in zip(influential['country_name'], influential['cooks_distance'],
+                                         influential['studentized_residual'], influential['loo_residual']):
+    print(f"  {name}: Cook's D = {cooks:.3f}, studentized residual = {studentized:.2f}, "
+          f"leave-one-out residual = {loo:.3f}")
+
+mark('save')
 data_with_wealth.to_html("../html/fig4_5_wealth_normalized_protocol.html")
\ No newline at end of file
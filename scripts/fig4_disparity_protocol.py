@@ -1,18 +1,19 @@
 import matplotlib.pyplot as plt
 import matplotlib.colors as mcolors
 import pandas as pd
-import geopandas as gpd
+from comparison_frame import ComparisonFrame
+from geometry_cache import load_world
+from profiling import mark
+from snapshot_store import load_frame
 
-data = pd.read_csv("../data/raw/insecure_hosts/insecure_hosts.csv")
-data["insecure_ratio"] = data["starlink_insecure_rate"] / data["all_insecure_rate"]
+data = load_frame('insecure_hosts')
+data["insecure_ratio"] = ComparisonFrame.from_paired_columns(data).ratio("insecure_rate")
 data = data.dropna()
 
-world = gpd.read_file("../data/raw/ne_110m_admin_0_sovereignty/ne_110m_admin_0_sovereignty.shp")
-world = world.rename(columns={"ISO_A2_EH": "country"})
-
-# Aggregate by continent and merge with your data
-world_continents = world.dissolve(by='country').reset_index()
-merged = world_continents.merge(data, on='country', how='left')
+# Sovereignty polygons already dissolved by country_id (cached across runs)
+world_continents = load_world('sovereignty')
+mark('transform')
+merged = world_continents.merge(data, on='country_id', how='left')
 
 # Normalize the color: green if <1, red if >1
 def get_color(value):
@@ -29,6 +30,8 @@ def get_color(value):
 merged['color'] = merged['insecure_ratio'].apply(get_color)
 
 
+mark('render')
+
 # Create a custom colorbar legend
 fig, ax = plt.subplots(figsize=(12, 6))
 merged.plot(ax=ax, color=merged['color'], edgecolor='black')
@@ -53,5 +56,6 @@ cbar.set_ticklabels(['More Secure (<1)', 'Equal (1)', 'Less Secure (>2.5)'])
 # Add title
 plt.title('Starlink Insecurity Ratio by Country', fontsize=14)
 plt.axis('off')
+mark('save')
 plt.savefig('../figures/fig4_disparity_protocol.png')
 
@@ -1,14 +1,20 @@
 import matplotlib.pyplot as plt
 import pandas as pd
 import numpy as np
+from comparison_frame import ComparisonFrame
+from profiling import mark
+from snapshot_store import load_frame
 
-data = pd.read_csv("../data/raw/insecure_hosts/insecure_hosts.csv")
-data["insecure_ratio"] = data["starlink_insecure_rate"] / data["all_insecure_rate"]
+data = load_frame('insecure_hosts')
+data["insecure_ratio"] = ComparisonFrame.from_paired_columns(data).ratio("insecure_rate")
 data = data.dropna()
 
+mark('transform')
 top_10 = data.sort_values(by='insecure_ratio', ascending=False).head(10)
-top_10['ratio'] = top_10['starlink_insecure_rate'] / top_10['all_insecure_rate'].replace(0, np.nan)
-top_10['percent_more'] = (top_10['ratio'] - 1) * 100
+# No percentage where the baseline rate is 0
+top_10['percent_more'] = (top_10['insecure_ratio'].replace(np.inf, np.nan) - 1) * 100
+
+mark('render')
 
 # Plot as horizontal bars
 fig, ax = plt.subplots(figsize=(8, 6))
@@ -46,4 +52,5 @@ max_rate = top_10['starlink_insecure_rate'].max()
 ax.set_xlim(0, max_rate * 1.2)
 
 plt.tight_layout()
+mark('save')
 plt.savefig('../figures/fig5_per_country_protocol.png')
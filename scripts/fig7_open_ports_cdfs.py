@@ -1,11 +1,15 @@
 import pandas as pd
 import numpy as np
 import matplotlib.pyplot as plt
-from scipy.interpolate import interp1d
+from port_histogram import PortHistogram
+from profiling import mark
+from snapshot_store import load_frame
 
 # Load CSV files
-df_baseline = pd.read_csv("../data/raw/cdf_open_ports/csv_baseline.csv")
-df_starlink = pd.read_csv("../data/raw/cdf_open_ports/csv_starlink.csv")
+df_baseline = load_frame('cdf_open_ports_baseline')
+df_starlink = load_frame('cdf_open_ports_starlink')
+
+mark('transform')
 
 # Identify all unique continents across both datasets
 all_continents = sorted(set(df_baseline['continent']).union(df_starlink['continent']))
@@ -13,28 +17,20 @@ colors = plt.get_cmap('tab10')
 continent_colors = {continent: colors(i % 10) for i, continent in enumerate(all_continents)}
 
 def plot_cdf_by_continent(ax, df, title, show_xlabel=True):
-    df = df.sort_values(['continent', 'num_open_ports'])
+    histogram = PortHistogram.from_cdf(df, 'continent')
     min_x = df['num_open_ports'].replace(0, np.nan).min()
     max_x = df['num_open_ports'].max()
     x_vals = np.logspace(np.log10(min_x), np.log10(max_x), 300)
 
-    # Track Asia intercept
-    asia_intercept_x = None
-
-    for continent, group in df.groupby('continent'):
-        group = group[group['num_open_ports'] > 0]
-        interp_fn = interp1d(group['num_open_ports'], group['cdf'], kind='linear',
-                             bounds_error=False, fill_value=(0, 1))
-        y_vals = interp_fn(x_vals)
+    # Every continent's CDF at once, interpolated between its data points as before
+    y_by_continent = histogram.interpolated_cdf(x_vals)
+    for continent, y_vals in zip(histogram.groups, y_by_continent):
         ax.plot(x_vals, y_vals, label=continent, color=continent_colors[continent])
 
-        # Save x where Asia curve crosses y = 0.9
-        if continent == "Asia":
-            try:
-                inv_interp = interp1d(y_vals, x_vals, bounds_error=False)
-                asia_intercept_x = inv_interp(0.9)
-            except Exception:
-                pass  # if interpolation fails, skip marking
+    # Open ports at which the Asia curve crosses y = 0.9 (exact 0.9 quantile)
+    asia_intercept_x = None
+    if "Asia" in histogram.groups:
+        asia_intercept_x = histogram.quantile(0.9)[histogram.groups.index("Asia"), 0]
 
     ax.set_xscale('log')
     ax.set_ylim(0, 1)
@@ -60,6 +56,8 @@ def plot_cdf_by_continent(ax, df, title, show_xlabel=True):
     # if ax == ax2: ax.set_xlabel('Number of Open Ports (log scale)')
 
 
+mark('render')
+
 # Create subplots
 fig, (ax1, ax2) = plt.subplots(2, 1, figsize=(8, 6), sharex=True)
 fig.suptitle('CDF of Open Ports per Continent', fontsize=16)
@@ -70,4 +68,5 @@ plot_cdf_by_continent(ax1, df_starlink, 'Starlink Hosts', show_xlabel=False)
 # Tight layout
 plt.subplots_adjust(left=0.18, right=0.98, hspace=0.1)
 plt.tight_layout()
+mark('save')
 plt.savefig("../figures/fig7_open_ports_cdfs.png")
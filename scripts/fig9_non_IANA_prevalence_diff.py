@@ -1,67 +1,35 @@
-import geopandas as gpd
 import matplotlib.pyplot as plt
 import pandas as pd
 import numpy as np
+from comparison_frame import ComparisonFrame
+from country_keys import get_resolver
+from geometry_cache import load_world
+from profiling import mark
+from snapshot_store import load_frame
 
-# Path to the downloaded shapefile (adjust this path as needed)
-shapefile_path = '../data/mapfiles/ne_110m_admin_0_countries.shp'
-
-# Load the shapefile manually
-world = gpd.read_file(shapefile_path)
+# Country polygons from ../data/mapfiles/ne_110m_admin_0_countries.shp, keyed by country_id (cached across runs)
+world = load_world('countries')
 
 # Assume df_starlink has columns: country, hosts_with_nonstandard_ports, total_hosts, proportion_nonstandard
-df_starlink = pd.read_csv('../data/raw/non_IANA_ports/nonstandard_ports_starlink.csv')
-df_baseline = pd.read_csv('../data/raw/non_IANA_ports/nonstandard_ports_baseline.csv')
+df_starlink = load_frame('nonstandard_ports_starlink')
+df_baseline = load_frame('nonstandard_ports_baseline')
 
 # df_starlink = pd.read_csv('data/test.csv')
 
-# Strip and align country names if necessary
-df_starlink['country'] = df_starlink['country'].str.strip()
-df_baseline['country'] = df_baseline['country'].str.strip()
-
-
-country_mapping = {
-    'United States': 'United States of America',
-    'Samoa': 'Samoa',
-    'Malta': 'Malta',
-    'Dominican Republic': 'Dominican Republic',
-    'Czech Republic': 'Czechia',
-    'South Sudan': 'South Sudan',
-    'Cape Verde': 'Cabo Verde',
-    'Solomon Islands': 'Solomon Islands',
-    # 'Reunion': 'France',  # Réunion is an overseas department of France
-    'Singapore': 'Singapore',
-    # 'Saint Martin': 'France',  # Likely Saint Martin (French part), part of France
-    # 'Guernsey': 'United Kingdom',  # Crown dependency, not separately listed
-    # 'Martinique': 'France',
-    # 'Mayotte': 'France',
-    # 'Guadeloupe': 'France',
-    'Tuvalu': 'Tuvalu',
-    # 'Guam': 'United States of America',
-    'Barbados': 'Barbados',
-    'Tonga': 'Tonga',
-    'Swaziland': 'Eswatini',
-    # 'Cook Islands': 'New Zealand',  # Free association with New Zealand
-    # 'Saint Barthelemy': 'France',
-    'Maldives': 'Maldives',
-    # 'French Guiana': 'France',
-    # 'U.S. Virgin Islands': 'United States of America',
-    'Macedonia': 'North Macedonia'
-}
-
-# Resolve naming issues between censys and geopandas
-df_starlink['country'] = df_starlink['country'].replace(country_mapping)
-df_baseline['country'] = df_baseline['country'].replace(country_mapping)
+mark('transform')
+
+# Resolve naming issues between censys and geopandas: both sides join on the integer country_id,
+# and countries are labelled with their Natural Earth names (e.g. 'United States of America')
+resolver = get_resolver()
+df_starlink['country'] = resolver.name_of(df_starlink['country_id'].cat.codes.to_numpy())
+df_baseline['country'] = resolver.name_of(df_baseline['country_id'].cat.codes.to_numpy())
 
 # Merge your data with the map
-merged_starlink = world.merge(df_starlink, left_on='ADMIN', right_on='country', how='left')
-merged_baseline = world.merge(df_baseline, left_on='ADMIN', right_on='country', how='left')
+merged_starlink = world.merge(df_starlink, on='country_id', how='left')
+merged_baseline = world.merge(df_baseline, on='country_id', how='left')
 
 # print(merged_starlink.columns)
 
-df_starlink.set_index('country')
-df_baseline.set_index('country')
-
 ################################### END OF DATAFRAME DEFINITIONS #############################################################################################################################################################
 
 import matplotlib.colors as mcolors
@@ -69,12 +37,12 @@ import matplotlib.pyplot as plt
 
 df_baseline_restricted = df_baseline[df_baseline['country'].isin(df_starlink['country'])]
 
-df_proportion_difference = pd.DataFrame(columns=['country', 'proportion_nonstandard_diff'])
-df_proportion_difference.set_index('country', inplace=True)  # Modify in place
-for country in set(df_starlink.country.values):
-    starlink_proportion = df_starlink[df_starlink['country'] == country]['proportion_nonstandard'].iloc[0]
-    baseline_proportion = df_baseline[df_baseline['country'] == country]['proportion_nonstandard'].iloc[0]
-    df_proportion_difference.loc[country] = starlink_proportion - baseline_proportion
+# Starlink minus baseline for every country at once, aligned on the integer country_id both
+# snapshots carry (so the diff joins the map directly)
+comparison = ComparisonFrame.from_tables(df_starlink, df_baseline, on='country_id', metrics=['proportion_nonstandard'])
+df_proportion_difference = comparison.diff().add_suffix('_diff')
+
+mark('render')
 
 # Create a custom colormap from green (negative) to red (positive)
 cmap = mcolors.LinearSegmentedColormap.from_list('green_red', ['green', 'white', 'red'])
@@ -84,7 +52,7 @@ norm = mcolors.TwoSlopeNorm(vmin=df_proportion_difference['proportion_nonstandar
                             vcenter=0,
                             vmax=df_proportion_difference['proportion_nonstandard_diff'].max())
 
-proportion_diff_world = world.merge(df_proportion_difference, left_on='ADMIN', right_on='country', how='left')
+proportion_diff_world = world.merge(df_proportion_difference.reset_index(), on='country_id', how='left')
 fig, ax = plt.subplots(1, 1, figsize=(12, 8))
 
 # Plot with the custom colormap
@@ -121,4 +89,5 @@ ax.set_title('Starlink Hosts with Non-IANA Services', fontsize=15)
 # Turn off axis
 ax.axis('off')
 
+mark('save')
 plt.savefig("../figures/fig9_non_IANA_prevalence_diff.png")
@@ -0,0 +1,102 @@
+"""
+Dissolved, optionally simplified and reprojected country polygons, cached as GeoParquet.
+
+The map figures all start from a Natural Earth admin-0 shapefile: fig4 and fig4_5
+dissolve the sovereignty shapefile by country, fig8 and fig9 use the countries
+shapefile as is. `load_world(name)` does that read/key/dissolve once and writes the
+result to `data/geometry/`, under a key made of the shapefile's SHA-256 (every
+sidecar file), the country key table and the processing options. Later runs read the
+GeoParquet file back directly; editing a shapefile, the key table or an option
+simply produces a new cache file.
+
+To (re)build the default variants up front, run from `scripts/`:
+
+    python geometry_cache.py
+"""
+import glob
+import hashlib
+import os
+
+import geopandas as gpd
+
+from country_keys import KEYS_PATH, add_country_id
+from snapshot_store import DATA_DIR, file_sha256
+
+GEOMETRY_DIR = os.path.join(DATA_DIR, 'geometry')
+# Bump whenever the processing below changes so existing cache files are ignored
+GEOMETRY_VERSION = 1
+KEEP_COLUMNS = ['country_id', 'ADMIN', 'geometry']
+
+# name -> (shapefile relative to data/, dissolve by country_id)
+SHAPEFILES = {
+    # ISO_A2_EH is -99 for several sovereignties (Israel among them), so the dissolve is by country_id
+    'sovereignty': ('raw/ne_110m_admin_0_sovereignty/ne_110m_admin_0_sovereignty.shp', True),
+    'countries': ('mapfiles/ne_110m_admin_0_countries.shp', False),
+}
+
+
+def shapefile_sha256(path):
+    """Hashes a shapefile together with its sidecar files (.dbf, .shx, .prj, ...)."""
+    digest = hashlib.sha256()
+    stem, _ = os.path.splitext(path)
+    for part in sorted(glob.glob(stem + '.*')):
+        if part.endswith(('.shp', '.shx', '.dbf', '.prj', '.cpg')):
+            digest.update(os.path.basename(part).encode())
+            digest.update(file_sha256(part).encode())
+    return digest.hexdigest()
+
+
+def cache_path(name, simplify=None, crs=None):
+    """Path of the cache file for a shapefile and set of options (it may not exist yet)."""
+    shapefile, dissolve = SHAPEFILES[name]
+    digest = hashlib.sha256()
+    for part in (shapefile_sha256(os.path.join(DATA_DIR, shapefile)), file_sha256(KEYS_PATH),
+                 GEOMETRY_VERSION, dissolve, simplify, crs):
+        digest.update(repr(part).encode())
+    return os.path.join(GEOMETRY_DIR, f'{name}-{digest.hexdigest()[:16]}.parquet')
+
+
+def build_world(name, simplify=None, crs=None):
+    """Reads a shapefile, keys it by country_id, dissolves/simplifies/reprojects as requested."""
+    shapefile, dissolve = SHAPEFILES[name]
+    world = add_country_id(gpd.read_file(os.path.join(DATA_DIR, shapefile)), 'ADMIN')
+    if dissolve:
+        world = world.dissolve(by='country_id', observed=True).reset_index()
+    world = world[KEEP_COLUMNS]
+    if crs is not None:
+        world = world.to_crs(crs)
+    if simplify is not None:
+        # Tolerance is in the units of the (output) CRS: degrees for the default WGS84
+        world = world.set_geometry(world.geometry.simplify(simplify, preserve_topology=True))
+    return world
+
+
+# (name, simplify, crs) -> GeoDataFrame already loaded by this process
+_worlds = dict()
+
+
+def load_world(name, simplify=None, crs=None):
+    """Returns the country polygons for `name` ('sovereignty' or 'countries') from the cache.
+
+    Columns are country_id (categorical), ADMIN and geometry; `simplify` is a
+    tolerance in CRS units and `crs` anything GeoDataFrame.to_crs accepts.
+    """
+    if name not in SHAPEFILES:
+        raise KeyError(f"Unknown shapefile '{name}', expected one of: {', '.join(SHAPEFILES)}")
+    key = (name, simplify, crs)
+    if key not in _worlds:
+        path = cache_path(name, simplify, crs)
+        if os.path.exists(path):
+            _worlds[key] = gpd.read_parquet(path)
+        else:
+            _worlds[key] = build_world(name, simplify, crs)
+            os.makedirs(GEOMETRY_DIR, exist_ok=True)
+            _worlds[key].to_parquet(path, index=False)
+    # The figures add columns to the merged frame, so each caller gets its own copy
+    return _worlds[key].copy()
+
+
+if __name__ == '__main__':
+    for shapefile_name in SHAPEFILES:
+        countries = load_world(shapefile_name)
+        print(f"{shapefile_name}: {len(countries)} polygons in {cache_path(shapefile_name)}")
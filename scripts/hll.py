@@ -0,0 +1,122 @@
+"""
+Mergeable distinct counters for `COUNT(DISTINCT ipv4)`-style host counts.
+
+`HyperLogLog` keeps 2^p one-byte registers (16 KiB at the default 1% error) however
+many hosts it sees, and two sketches merge by an element-wise max, so shards and
+snapshots can be counted separately and combined. `ExactDistinct` has the same
+interface backed by a set, for small host sets such as Starlink's where the exact
+answer is affordable.
+"""
+import hashlib
+import math
+
+import numpy as np
+
+MIN_PRECISION, MAX_PRECISION = 4, 18
+FLUSH_EVERY = 4096
+
+
+def hash64(value):
+    """64-bit hash of a value's string form (stable across processes, unlike hash())."""
+    return int.from_bytes(hashlib.blake2b(str(value).encode(), digest_size=8).digest(), 'little')
+
+
+def precision_for(error):
+    """Smallest register-count exponent whose standard error 1.04 / sqrt(2^p) is at most `error`."""
+    p = math.ceil(math.log2((1.04 / error) ** 2))
+    return min(max(p, MIN_PRECISION), MAX_PRECISION)
+
+
+def _bit_length(values):
+    """Vectorized int.bit_length for uint64 arrays."""
+    values = values.copy()
+    lengths = np.zeros(values.shape, dtype=np.uint8)
+    for shift in (32, 16, 8, 4, 2, 1):
+        wide = values >= np.uint64(1 << shift)
+        lengths[wide] += shift
+        values[wide] >>= np.uint64(shift)
+    return lengths + (values > 0)
+
+
+class HyperLogLog:
+    """HyperLogLog sketch of the distinct values added to it."""
+
+    def __init__(self, error=0.01, precision=None):
+        self.precision = precision_for(error) if precision is None else precision
+        self.registers = np.zeros(1 << self.precision, dtype=np.uint8)
+        self._pending = list()  # hashes not yet folded into the registers
+
+    def add(self, value):
+        self._pending.append(hash64(value))
+        if len(self._pending) >= FLUSH_EVERY:
+            self._flush()
+
+    def add_hashes(self, hashes):
+        """Folds an array of 64-bit hashes into the registers in one vectorized update."""
+        hashes = np.asarray(hashes, dtype=np.uint64)
+        rest_bits = 64 - self.precision
+        index = (hashes >> np.uint64(rest_bits)).astype(np.intp)
+        rest = hashes & np.uint64((1 << rest_bits) - 1)
+        # Position of the leftmost 1-bit in the remaining bits (rest_bits + 1 if they are all 0)
+        rank = (rest_bits + 1 - _bit_length(rest)).astype(np.uint8)
+        np.maximum.at(self.registers, index, rank)
+
+    def _flush(self):
+        if self._pending:
+            self.add_hashes(np.fromiter(self._pending, dtype=np.uint64, count=len(self._pending)))
+            self._pending = list()
+
+    def merge(self, other):
+        """Folds another sketch (same precision) into this one."""
+        if other.precision != self.precision:
+            raise ValueError(f"Cannot merge HyperLogLog sketches of precision {self.precision} and {other.precision}")
+        self._flush()
+        other._flush()
+        np.maximum(self.registers, other.registers, out=self.registers)
+        return self
+
+    def count(self):
+        """Estimated number of distinct values, with the small-range (linear counting) correction."""
+        self._flush()
+        m = len(self.registers)
+        alpha = 0.7213 / (1 + 1.079 / m) if m >= 128 else {16: 0.673, 32: 0.697, 64: 0.709}[m]
+        estimate = alpha * m * m / np.ldexp(1.0, -self.registers.astype(np.int64)).sum()
+        zeros = int((self.registers == 0).sum())
+        if estimate <= 2.5 * m and zeros:
+            estimate = m * math.log(m / zeros)
+        return int(round(estimate))
+
+    def __getstate__(self):
+        self._flush()
+        return {'precision': self.precision, 'registers': self.registers}
+
+    def __setstate__(self, state):
+        self.precision = state['precision']
+        self.registers = state['registers']
+        self._pending = list()
+
+
+class ExactDistinct:
+    """Same interface as HyperLogLog, backed by a set of the values themselves."""
+
+    def __init__(self):
+        self.values = set()
+
+    def add(self, value):
+        self.values.add(value)
+
+    def merge(self, other):
+        self.values.update(other.values)
+        return self
+
+    def count(self):
+        return len(self.values)
+
+
+def make_distinct_counter(mode, error=0.01):
+    """'exact' -> ExactDistinct, 'hll' -> HyperLogLog with the given standard error."""
+    if mode == 'exact':
+        return ExactDistinct()
+    if mode == 'hll':
+        return HyperLogLog(error)
+    raise ValueError(f"Unknown distinct-count mode '{mode}', expected 'exact' or 'hll'")
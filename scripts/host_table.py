@@ -0,0 +1,380 @@
+"""
+Compact struct-of-arrays table of Censys hosts, for analyses that need the hosts
+themselves rather than one of the aggregates.
+
+Per host the table keeps only the fields the queries in `data/sql/` read, as NumPy
+arrays:
+
+* `ipv4` as uint32, and `asn` (autonomous_system.asn) as uint32 (0 when missing)
+* `location` and `continent` as small-int categoricals; a location is a
+  (country, country_code) pair, since the queries group by either
+* `os` ('vendor product', lowercased as in os-share-by-continent-*.sql) and `cpe`
+  (operating_system.uniform_resource_identifier) as dictionary ids, -1 when missing
+* `ports_list` and `services` as CSR arrays: `port_offsets` into `ports` (uint16), and
+  `service_offsets` into `service_ports`, `service_names` (dictionary ids of the
+  lowercased name) and `service_insecure` (the insecure_hosts.sql condition, evaluated
+  once at build time)
+
+That is roughly 36 bytes per host plus 2 per open port and 9 per service, instead of
+a nested dict per host; the builder appends into buffers of the same widths. Rows are
+sorted by location and then ASN, and locations are numbered by (country_code, country),
+so every location, every (location, ASN) and every country code is a contiguous row
+range: `by_country` and `by_asn` return views that share the parent's arrays, and fall
+back to a merged copy only when a country name spans several codes. `build_table` builds
+one table per shard and merges the sorted shards. `save` writes one .npy file per array,
+and `load` maps them back with mmap, so a saved table is opened without reading it into
+memory.
+
+`HostAggregate.add_table` (and so every `local_aggregate.py` table, including the port
+histograms) consumes a table directly, and `hosts_frame`/`services_frame` feed
+`iana_registry.py`. Build a table from exports (from `scripts/`):
+
+    python host_table.py --hosts starlink-*.json.gz --out ../data/hosts/starlink
+    python local_aggregate.py --starlink ../data/hosts/starlink --baseline ../data/hosts/baseline --out-dir ../data/local
+"""
+import argparse
+import json
+import os
+from array import array
+
+import numpy as np
+import pandas as pd
+
+from local_aggregate import as_int, get_field, is_insecure_service, iter_host_records
+
+TABLE_VERSION = 1
+
+ROW_COLUMNS = {'ipv4': np.uint32, 'location': np.int16, 'continent': np.int8, 'asn': np.uint32,
+               'os': np.int32, 'cpe': np.int32, 'ports_known': np.bool_}
+PORT_COLUMNS = {'ports': np.uint16}
+SERVICE_COLUMNS = {'service_ports': np.int32, 'service_names': np.int32, 'service_insecure': np.bool_}
+DICTIONARIES = ('locations', 'continents', 'oses', 'cpes', 'service_name_values')
+ID_COLUMNS = {'location': 'locations', 'continent': 'continents', 'os': 'oses', 'cpe': 'cpes',
+              'service_names': 'service_name_values'}
+TYPECODES = {np.int8: 'b', np.int16: 'h', np.int32: 'i', np.uint16: 'H', np.uint32: 'I', np.bool_: 'b'}
+
+
+def ipv4_to_uint32(ips):
+    """Dotted-quad strings to uint32 (missing or malformed addresses become 0)."""
+    octets = pd.Series(ips, dtype=object).str.split('.', expand=True)
+    if octets.shape[1] != 4:
+        return np.zeros(len(octets), dtype=np.uint32)
+    octets = octets.apply(pd.to_numeric, errors='coerce').fillna(0).to_numpy(dtype=np.uint64)
+    return ((octets[:, 0] << 24) | (octets[:, 1] << 16) | (octets[:, 2] << 8) | octets[:, 3]).astype(np.uint32)
+
+
+def _ipv4_int(ip):
+    """One dotted-quad string to an int (0 if missing or malformed), as ipv4_to_uint32."""
+    try:
+        octets = [int(octet) for octet in ip.split('.')]
+    except (AttributeError, ValueError):
+        return 0
+    if len(octets) != 4 or not all(0 <= octet <= 255 for octet in octets):
+        return 0
+    return (octets[0] << 24) | (octets[1] << 16) | (octets[2] << 8) | octets[3]
+
+
+def uint32_to_ipv4(values):
+    """uint32 addresses back to dotted-quad strings."""
+    values = np.asarray(values, dtype=np.uint32)
+    parts = [pd.Series((values >> shift) & 0xFF).astype(str) for shift in (24, 16, 8, 0)]
+    return (parts[0] + '.' + parts[1] + '.' + parts[2] + '.' + parts[3]).to_numpy(dtype=object)
+
+
+class _Dictionary:
+    """Assigns consecutive ids to values in order of first appearance."""
+
+    def __init__(self):
+        self.ids = dict()
+        self.values = list()
+
+    def encode(self, value):
+        if value is None:
+            return -1
+        i = self.ids.get(value)
+        if i is None:
+            i = self.ids[value] = len(self.values)
+            self.values.append(value)
+        return i
+
+
+class HostTableBuilder:
+    """Appends host records into growable typed buffers; `build` sorts them into a HostTable."""
+
+    def __init__(self):
+        # Typed like the table's columns, so build() reads them without converting
+        self.rows = {name: array(TYPECODES[dtype]) for name, dtype in ROW_COLUMNS.items()}
+        self.port_lengths = array('I')
+        self.ports = array(TYPECODES[PORT_COLUMNS['ports']])
+        self.service_lengths = array('I')
+        for name, dtype in SERVICE_COLUMNS.items():
+            setattr(self, name, array(TYPECODES[dtype]))
+        self.locations = _Dictionary()
+        self.continents = _Dictionary()
+        self.oses = _Dictionary()
+        self.cpes = _Dictionary()
+        self.service_name_values = _Dictionary()
+
+    def add(self, record):
+        self.rows['ipv4'].append(_ipv4_int(get_field(record, 'host_identifier', 'ipv4')))
+        self.rows['location'].append(self.locations.encode((get_field(record, 'location', 'country'),
+                                                            get_field(record, 'location', 'country_code'))))
+        self.rows['continent'].append(self.continents.encode(get_field(record, 'location', 'continent')))
+        self.rows['asn'].append(as_int(get_field(record, 'autonomous_system', 'asn')) or 0)
+
+        vendor = get_field(record, 'operating_system', 'vendor')
+        product = get_field(record, 'operating_system', 'product')
+        os_name = f'{vendor} {product}'.lower() if vendor is not None and product is not None else None
+        self.rows['os'].append(self.oses.encode(os_name))
+        self.rows['cpe'].append(self.cpes.encode(get_field(record, 'operating_system', 'uniform_resource_identifier')))
+
+        ports_list = record.get('ports_list')
+        self.rows['ports_known'].append(ports_list is not None)
+        self.port_lengths.append(len(ports_list or ()))
+        self.ports.extend(int(port) for port in ports_list or ())
+
+        services = record.get('services') or ()
+        self.service_lengths.append(len(services))
+        for service in services:
+            port = as_int(service.get('port'))
+            self.service_ports.append(-1 if port is None else port)
+            self.service_names.append(self.service_name_values.encode((service.get('service_name') or '').lower()))
+            self.service_insecure.append(is_insecure_service(service))
+
+    def build(self):
+        """The table with rows sorted by location and then ASN."""
+        rows = {name: np.frombuffer(buffer, dtype=ROW_COLUMNS[name]) for name, buffer in self.rows.items()}
+        ports = {'ports': np.frombuffer(self.ports, dtype=PORT_COLUMNS['ports'])}
+        services = {name: np.frombuffer(getattr(self, name), dtype=dtype) for name, dtype in SERVICE_COLUMNS.items()}
+        dictionaries = {name: getattr(self, name).values for name in DICTIONARIES}
+        return _sorted_table(rows, np.frombuffer(self.port_lengths, dtype=np.uint32), ports,
+                             np.frombuffer(self.service_lengths, dtype=np.uint32), services, dictionaries)
+
+
+def _location_key(location):
+    """Orders locations by country code and then name, missing values last."""
+    return tuple((value is None, str(value)) for value in reversed(location))
+
+
+def _sorted_table(rows, port_lengths, ports, service_lengths, services, dictionaries):
+    """A HostTable of the given arrays, locations renumbered by _location_key and rows sorted by (location, ASN).
+
+    The stable sort finds already-sorted runs, so merging sorted shards costs little more than copying them.
+    """
+    locations = dictionaries['locations']
+    location_order = sorted(range(len(locations)), key=lambda i: _location_key(locations[i]))
+    location_rank = np.empty(len(locations), dtype=ROW_COLUMNS['location'])
+    location_rank[location_order] = np.arange(len(locations))
+    location = location_rank[rows['location']]
+
+    order = np.argsort((location.astype(np.uint64) << 32) | rows['asn'].astype(np.uint64), kind='stable')
+    columns = {name: (location if name == 'location' else rows[name])[order].astype(dtype, copy=False)
+               for name, dtype in ROW_COLUMNS.items()}
+    columns['port_offsets'], port_index = _reordered_csr(port_lengths, order)
+    columns['ports'] = ports['ports'][port_index].astype(PORT_COLUMNS['ports'], copy=False)
+    columns['service_offsets'], service_index = _reordered_csr(service_lengths, order)
+    for name, dtype in SERVICE_COLUMNS.items():
+        columns[name] = services[name][service_index].astype(dtype, copy=False)
+
+    dictionaries = dict(dictionaries, locations=[locations[i] for i in location_order])
+    return HostTable(columns, dictionaries)
+
+
+def _reordered_csr(lengths, order):
+    """New offsets for CSR rows taken in `order`, and the value index that gathers them."""
+    lengths = np.asarray(lengths, dtype=np.int64)
+    starts = np.concatenate([[0], np.cumsum(lengths)])
+    new_lengths = lengths[order]
+    offsets = np.concatenate([[0], np.cumsum(new_lengths)]).astype(np.int64)
+    index = np.repeat(starts[:-1][order] - offsets[:-1], new_lengths) + np.arange(offsets[-1])
+    return offsets, index
+
+
+class HostTable:
+    """Hosts as parallel arrays; a slice of rows shares its parent's arrays."""
+
+    def __init__(self, columns, dictionaries):
+        self.columns = columns
+        self.dictionaries = dictionaries
+        for name, values in dictionaries.items():
+            setattr(self, name, values)
+        for name, values in columns.items():
+            setattr(self, name, values)
+
+    def __len__(self):
+        return len(self.ipv4)
+
+    def nbytes(self):
+        return sum(values.nbytes for values in self.columns.values())
+
+    # --- Zero-copy slices ---
+
+    def rows(self, start, stop):
+        """A view of rows [start, stop); CSR offsets stay absolute, value arrays are sliced to match."""
+        columns = {name: self.columns[name][start:stop] for name in ROW_COLUMNS}
+        for offsets_name, value_columns in (('port_offsets', PORT_COLUMNS), ('service_offsets', SERVICE_COLUMNS)):
+            offsets = self.columns[offsets_name][start:stop + 1]
+            columns[offsets_name] = offsets
+            first, last = (int(offsets[0]), int(offsets[-1])) if len(offsets) else (0, 0)
+            base = int(self.columns[offsets_name][0])
+            for name in value_columns:
+                columns[name] = self.columns[name][first - base:last - base]
+        return HostTable(columns, self.dictionaries)
+
+    def _location_rows(self, location_id):
+        return (int(np.searchsorted(self.location, location_id, side='left')),
+                int(np.searchsorted(self.location, location_id, side='right')))
+
+    def _joined(self, ranges):
+        """One view if the row ranges are adjacent, else a merged copy of them."""
+        runs = list()
+        for start, stop in sorted(ranges):
+            if runs and runs[-1][1] == start:
+                runs[-1][1] = stop
+            elif stop > start:
+                runs.append([start, stop])
+        if len(runs) <= 1:
+            return self.rows(*runs[0]) if runs else self.rows(0, 0)
+        return HostTable.concatenate([self.rows(start, stop) for start, stop in runs])
+
+    def location_ids(self, country):
+        """Ids of every location whose country name or code is `country`."""
+        return [i for i, (name, code) in enumerate(self.locations) if country in (name, code)]
+
+    def by_country(self, country):
+        """The hosts of one country, by name or code: a view, or a copy if its locations are not adjacent."""
+        return self._joined([self._location_rows(i) for i in self.location_ids(country)])
+
+    def by_asn(self, asn, country=None):
+        """Views of the hosts of one ASN, one per location it appears in (a single table if country is given)."""
+        location_ids = self.location_ids(country) if country is not None else np.unique(self.location)
+        ranges = list()
+        for location_id in location_ids:
+            begin, end = self._location_rows(location_id)
+            asns = self.asn[begin:end]
+            start = int(np.searchsorted(asns, asn, side='left'))
+            stop = int(np.searchsorted(asns, asn, side='right'))
+            if stop > start:
+                ranges.append((begin + start, begin + stop))
+        if country is not None:
+            return self._joined(ranges)
+        return [self.rows(start, stop) for start, stop in ranges]
+
+    @classmethod
+    def concatenate(cls, tables):
+        """One table with the rows of all tables (e.g. per-shard tables), dictionaries merged and rows re-sorted."""
+        merged = {name: _Dictionary() for name in DICTIONARIES}
+        parts = {name: list() for name in (*ROW_COLUMNS, *PORT_COLUMNS, *SERVICE_COLUMNS)}
+        port_lengths, service_lengths = list(), list()
+        for table in tables:
+            # Old id -> merged id; the appended -1 keeps missing ids (-1) missing
+            remap = {name: np.append(np.array([merged[name].encode(value) for value in table.dictionaries[name]],
+                                              dtype=np.int64), -1)
+                     for name in DICTIONARIES}
+            for name in parts:
+                values = table.columns[name]
+                if name in ID_COLUMNS:
+                    values = remap[ID_COLUMNS[name]][values]
+                parts[name].append(values)
+            port_lengths.append(table.n_ports())
+            service_lengths.append(table.n_services())
+        columns = {name: np.concatenate(values) if values else np.empty(0, dtype=np.int64)
+                   for name, values in parts.items()}
+        dictionaries = {name: dictionary.values for name, dictionary in merged.items()}
+        return _sorted_table(columns, np.concatenate(port_lengths or [[]]), columns,
+                             np.concatenate(service_lengths or [[]]), columns, dictionaries)
+
+    # --- Per-host and per-service derived arrays ---
+
+    def n_services(self):
+        return np.diff(self.service_offsets)
+
+    def n_ports(self):
+        return np.diff(self.port_offsets)
+
+    def service_host_index(self):
+        """Row (within this table) of every service."""
+        return np.repeat(np.arange(len(self)), self.n_services())
+
+    def countries(self):
+        """Country name of every location id."""
+        return np.array([name for name, _ in self.locations], dtype=object)
+
+    def country_codes(self):
+        return np.array([code for _, code in self.locations], dtype=object)
+
+    def misplaced_services(self, iana_ports):
+        """True for services whose name is in iana_ports but whose port differs (non_IANA_ports_*.sql).
+
+        A missing port (stored as -1) is never misplaced, as NULL != port is not true in the SQL.
+        """
+        expected = np.array([iana_ports.get(name, -1) for name in self.service_name_values], dtype=np.int64)
+        expected_port = expected[self.service_names]
+        return (expected_port >= 0) & (self.service_ports >= 0) & (self.service_ports != expected_port)
+
+    def has_cve(self, cve_ips):
+        """True for hosts whose IPv4 is in cve_ips (a set of dotted-quad strings)."""
+        return np.isin(self.ipv4, ipv4_to_uint32(sorted(cve_ips)))
+
+    def hosts_frame(self):
+        """(ipv4, country) per host, as iana_registry.explode_services returns."""
+        return pd.DataFrame({'ipv4': uint32_to_ipv4(self.ipv4), 'country': self.countries()[self.location]})
+
+    def services_frame(self):
+        """(host, service_name, port) per service, as iana_registry.explode_services returns."""
+        names = np.array(self.service_name_values, dtype=object)
+        return pd.DataFrame({'host': self.service_host_index(),
+                             'service_name': names[self.service_names],
+                             'port': self.service_ports.astype(np.int64)})
+
+    # --- Persistence ---
+
+    def save(self, directory):
+        """Writes one .npy file per array plus meta.json with the dictionaries."""
+        os.makedirs(directory, exist_ok=True)
+        for name, values in self.columns.items():
+            np.save(os.path.join(directory, f'{name}.npy'), np.ascontiguousarray(values))
+        meta = {'version': TABLE_VERSION, 'hosts': len(self), 'columns': sorted(self.columns)}
+        meta.update(self.dictionaries)
+        with open(os.path.join(directory, 'meta.json'), 'w') as file:
+            json.dump(meta, file)
+
+    @classmethod
+    def load(cls, directory, mmap=True):
+        """Opens a saved table; with mmap the arrays are read from disk on access."""
+        with open(os.path.join(directory, 'meta.json'), 'r') as file:
+            meta = json.load(file)
+        if meta.get('version') != TABLE_VERSION:
+            raise ValueError(f"{directory} holds host table version {meta.get('version')}, expected {TABLE_VERSION}; rebuild it")
+        columns = {name: np.load(os.path.join(directory, f'{name}.npy'), mmap_mode='r' if mmap else None)
+                   for name in meta['columns']}
+        dictionaries = {name: meta[name] for name in DICTIONARIES}
+        dictionaries['locations'] = [tuple(location) for location in dictionaries['locations']]
+        return cls(columns, dictionaries)
+
+
+def is_table_dir(path):
+    return os.path.isdir(path) and os.path.exists(os.path.join(path, 'meta.json'))
+
+
+def build_table(paths):
+    """Reads host export shards into one HostTable: one sorted table per shard, then merged."""
+    tables = list()
+    for path in paths:
+        builder = HostTableBuilder()
+        for record in iter_host_records(path):
+            builder.add(record)
+        tables.append(builder.build())
+    return tables[0] if len(tables) == 1 else HostTable.concatenate(tables)
+
+
+if __name__ == '__main__':
+    parser = argparse.ArgumentParser(description='Build a memory-mappable struct-of-arrays table from host exports.')
+    parser.add_argument('--hosts', nargs='+', required=True, help='Censys host export shards (NDJSON[.gz])')
+    parser.add_argument('--out', required=True, help='Directory to write the table to (e.g. ../data/hosts/starlink)')
+    args = parser.parse_args()
+
+    host_table = build_table(args.hosts)
+    host_table.save(args.out)
+    print(f"Wrote {len(host_table)} hosts, {len(host_table.service_ports)} services and "
+          f"{len(host_table.locations)} locations ({host_table.nbytes() / 2 ** 20:.1f} MiB) to {args.out}")
@@ -0,0 +1,268 @@
+"""
+The IANA service-name/port registry as array-backed indexes, and a vectorized detector
+for services running on a port the registry does not assign to them.
+
+`non_IANA_ports_*.sql` (and `local_aggregate.py`) only know 15 service/port pairs. Here
+the registry is loaded from IANA's `service-names-port-numbers.csv`
+(https://www.iana.org/assignments/service-names-port-numbers/), with port ranges
+expanded, plus the SQL's pairs (which use Censys names such as 'rdp' and 'dns' rather
+than IANA's 'ms-wbt-server' and 'domain'). Service names are interned to integer ids and
+the (service, port) assignments are held twice in CSR form:
+
+* service -> ports: `service_offsets` into `service_ports`
+* port -> services: `port_offsets` (one slot per port 0..65535) into `port_services`
+
+Detection works on exploded service records: names are factorized once per batch and
+mapped to ids, then every record is checked with integer operations only, by looking
+up the key `service_id << 16 | port` in the sorted assignment keys. A record is
+misplaced when its service is registered and its port is not one of that service's
+ports, which reduces to the SQL's `f.port != i.port` for single-port services. The cost
+is linear in service records for a fixed registry.
+
+Usage (from `scripts/`):
+
+    python iana_registry.py --hosts starlink-*.json.gz --out nonstandard_breakdown_starlink.csv
+"""
+import argparse
+import os
+
+import numpy as np
+import pandas as pd
+from scipy import sparse
+
+from local_aggregate import IANA_PORTS, as_int, get_field, iter_host_records
+from snapshot_store import RAW_DIR
+
+DEFAULT_REGISTRY = os.path.join(RAW_DIR, 'iana', 'service-names-port-numbers.csv')
+N_PORTS = 1 << 16
+PORT_BITS = 16
+
+
+def _expand_ports(port_numbers):
+    """IANA 'Port Number' cells ('80', '6000-6063' or empty) as (row, port) arrays."""
+    text = port_numbers.fillna('').astype(str).str.strip()
+    bounds = text.str.extract(r'^(\d+)(?:-(\d+))?$')
+    valid = bounds[0].notna().to_numpy()
+    rows = np.flatnonzero(valid)
+    low = bounds[0][valid].astype(np.int64).to_numpy()
+    high = bounds[1][valid].fillna(bounds[0][valid]).astype(np.int64).to_numpy()
+    lengths = high - low + 1
+    row_of = np.repeat(rows, lengths)
+    starts = np.repeat(low - np.cumsum(np.concatenate([[0], lengths[:-1]])), lengths)
+    return row_of, starts + np.arange(lengths.sum())
+
+
+class ServiceRegistry:
+    """Registered (service, port) assignments, indexed by service id and by port."""
+
+    def __init__(self, names, service_ids, ports):
+        self.names = np.asarray(names, dtype=object)
+        self.ids = {name: i for i, name in enumerate(self.names)}
+
+        keys = np.unique((np.asarray(service_ids, dtype=np.int64) << PORT_BITS) | np.asarray(ports, dtype=np.int64))
+        self.keys = keys  # sorted service_id << 16 | port
+        service_of = keys >> PORT_BITS
+        port_of = keys & (N_PORTS - 1)
+
+        self.service_ports = port_of
+        self.service_offsets = np.searchsorted(service_of, np.arange(len(self.names) + 1))
+        by_port = np.lexsort((service_of, port_of))
+        self.port_services = service_of[by_port]
+        self.port_offsets = np.searchsorted(port_of[by_port], np.arange(N_PORTS + 1))
+
+    @classmethod
+    def from_pairs(cls, pairs):
+        """Registry of (service name, port) pairs; names are lowercased."""
+        names, ports = zip(*((str(name).lower(), int(port)) for name, port in pairs))
+        uniques, service_ids = np.unique(np.array(names, dtype=object), return_inverse=True)
+        return cls(uniques, service_ids, ports)
+
+    @classmethod
+    def from_csv(cls, path, protocols=('tcp', 'udp'), extra_pairs=IANA_PORTS.items()):
+        """Loads IANA's service-names-port-numbers.csv, keeping the given transport protocols."""
+        table = pd.read_csv(path, usecols=['Service Name', 'Port Number', 'Transport Protocol'], dtype=str)
+        table = table[table['Service Name'].notna()
+                      & table['Transport Protocol'].str.lower().isin(protocols)].reset_index(drop=True)
+        row_of, ports = _expand_ports(table['Port Number'])
+        names = table['Service Name'].str.lower().to_numpy()[row_of]
+
+        extra = list(extra_pairs)
+        if extra:
+            names = np.concatenate([names, np.array([str(name).lower() for name, _ in extra], dtype=object)])
+            ports = np.concatenate([ports, np.array([port for _, port in extra], dtype=np.int64)])
+        uniques, service_ids = np.unique(names.astype(object), return_inverse=True)
+        return cls(uniques, service_ids, ports)
+
+    def __len__(self):
+        return len(self.names)
+
+    def ports_for(self, name):
+        """Registered ports of a service name (empty if the name is unknown)."""
+        i = self.ids.get(name.lower())
+        if i is None:
+            return np.empty(0, dtype=np.int64)
+        return self.service_ports[self.service_offsets[i]:self.service_offsets[i + 1]]
+
+    def services_on(self, port):
+        """Service names registered on a port."""
+        return self.names[self.port_services[self.port_offsets[port]:self.port_offsets[port + 1]]]
+
+    def service_ids(self, names):
+        """Registry id of every (lowercased) name, -1 where unregistered; each distinct name is looked up once."""
+        codes, uniques = pd.factorize(pd.Series(names, dtype=object).str.lower(), use_na_sentinel=True)
+        unique_ids = np.array([self.ids.get(name, -1) for name in uniques], dtype=np.int64)
+        return np.where(codes >= 0, unique_ids[np.maximum(codes, 0)], -1)
+
+    def misplaced(self, service_ids, ports):
+        """True where a registered service runs on a port the registry does not assign to it.
+
+        Missing ports (-1) are never misplaced, as NULL != port is not true in the SQL.
+        """
+        service_ids = np.asarray(service_ids, dtype=np.int64)
+        ports = np.asarray(ports, dtype=np.int64)
+        keys = (service_ids << PORT_BITS) | (ports & (N_PORTS - 1))
+        slots = np.minimum(np.searchsorted(self.keys, keys), len(self.keys) - 1)
+        registered = (self.keys[slots] == keys) & (ports >= 0) & (ports < N_PORTS)
+        return (service_ids >= 0) & (ports >= 0) & ~registered
+
+
+def load_registry(path=DEFAULT_REGISTRY, protocols=('tcp', 'udp')):
+    """The full IANA registry plus the SQL's pairs."""
+    if not os.path.exists(path):
+        raise FileNotFoundError(f"{path} not found; download service-names-port-numbers.csv from "
+                                "https://www.iana.org/assignments/service-names-port-numbers/")
+    return ServiceRegistry.from_csv(path, protocols)
+
+
+# --- Exploded services ---
+
+def explode_services(records):
+    """Host-level (ipv4, country) and service-level (host index, service_name, port) frames."""
+    hosts, rows = list(), list()
+    for host, record in enumerate(records):
+        hosts.append((get_field(record, 'host_identifier', 'ipv4'), get_field(record, 'location', 'country')))
+        for service in record.get('services') or ():
+            port = as_int(service.get('port'))
+            rows.append((host, service.get('service_name'), -1 if port is None else port))
+    return (pd.DataFrame(hosts, columns=['ipv4', 'country']),
+            pd.DataFrame(rows, columns=['host', 'service_name', 'port']))
+
+
+class NonstandardBreakdown:
+    """Misplaced-service counts as a sparse country x service matrix, with per-country host counts."""
+
+    def __init__(self, registry, countries, mismatch_counts, hosts_with_mismatch, total_hosts):
+        self.registry = registry
+        self.countries = np.asarray(countries, dtype=object)
+        self.mismatch_counts = sparse.csr_matrix(mismatch_counts, dtype=np.int64)
+        self.hosts_with_mismatch = np.asarray(hosts_with_mismatch, dtype=np.int64)
+        self.total_hosts = np.asarray(total_hosts, dtype=np.int64)
+
+    @classmethod
+    def from_services(cls, registry, hosts, services):
+        """Builds the breakdown from explode_services output (hosts without a country are grouped under None)."""
+        country_codes, countries = pd.factorize(hosts['country'], use_na_sentinel=False)
+        service_ids = registry.service_ids(services['service_name'].to_numpy())
+        flagged = registry.misplaced(service_ids, services['port'].to_numpy())
+        host_index = services['host'].to_numpy()[flagged]
+        host_country = country_codes[host_index]
+
+        shape = (len(countries), len(registry))
+        counts = sparse.coo_matrix((np.ones(len(host_index), dtype=np.int64), (host_country, service_ids[flagged])),
+                                   shape=shape).tocsr()
+        # COUNT(DISTINCT ipv4) over all hosts with services, and over hosts with at least one mismatch
+        with_services = np.unique(services['host'].to_numpy())
+        ipv4 = hosts['ipv4'].to_numpy()
+        total = cls._distinct_per_country(ipv4[with_services], country_codes[with_services], len(countries))
+        mismatched = np.unique(host_index)
+        with_mismatch = cls._distinct_per_country(ipv4[mismatched], country_codes[mismatched], len(countries))
+        return cls(registry, countries, counts, with_mismatch, total)
+
+    @staticmethod
+    def _distinct_per_country(ipv4, country_codes, n_countries):
+        pairs = pd.DataFrame({'country': country_codes, 'ipv4': ipv4}).drop_duplicates()
+        return np.bincount(pairs['country'].to_numpy(), minlength=n_countries)
+
+    def merge(self, other):
+        """Adds another breakdown over disjoint hosts (e.g. another shard) with the same registry."""
+        countries = pd.Index(self.countries).append(pd.Index(other.countries)).unique()
+        mine = pd.Index(countries).get_indexer(self.countries)
+        theirs = pd.Index(countries).get_indexer(other.countries)
+        shape = (len(countries), len(self.registry))
+        counts = self._reindexed(self.mismatch_counts, mine, shape) + self._reindexed(other.mismatch_counts, theirs, shape)
+        with_mismatch = np.zeros(len(countries), dtype=np.int64)
+        total = np.zeros(len(countries), dtype=np.int64)
+        np.add.at(with_mismatch, mine, self.hosts_with_mismatch)
+        np.add.at(with_mismatch, theirs, other.hosts_with_mismatch)
+        np.add.at(total, mine, self.total_hosts)
+        np.add.at(total, theirs, other.total_hosts)
+        return NonstandardBreakdown(self.registry, countries, counts, with_mismatch, total)
+
+    @staticmethod
+    def _reindexed(matrix, rows, shape):
+        coo = matrix.tocoo()
+        return sparse.csr_matrix((coo.data, (rows[coo.row], coo.col)), shape=shape)
+
+    def to_frame(self):
+        """Long format: one row per (country, service) with at least one mismatch, with its share of the country's mismatches."""
+        coo = self.mismatch_counts.tocoo()
+        per_country = np.asarray(self.mismatch_counts.sum(axis=1)).ravel()
+        df = pd.DataFrame({'country': self.countries[coo.row],
+                           'service_name': self.registry.names[coo.col],
+                           'mismatch_count': coo.data,
+                           'pct': coo.data / per_country[coo.row]})
+        return df.sort_values(['country', 'mismatch_count', 'service_name'], ascending=[True, False, True],
+                              kind='stable').reset_index(drop=True)
+
+    def wide_table(self, services=tuple(IANA_PORTS)):
+        """Same columns as nonstandard_ports_*.csv, with a pct_ column for each of the given services.
+
+        Hosts without a country are left out, as the SQL's country join drops them.
+        """
+        columns = self.registry.service_ids(list(services))
+        per_country = np.asarray(self.mismatch_counts.sum(axis=1)).ravel()
+        keep = (self.hosts_with_mismatch > 0) & np.asarray(pd.notna(self.countries))
+        df = pd.DataFrame({'country': self.countries[keep],
+                           'hosts_with_nonstandard_ports': self.hosts_with_mismatch[keep],
+                           'total_hosts': self.total_hosts[keep]})
+        df['proportion_nonstandard'] = df['hosts_with_nonstandard_ports'] / df['total_hosts']
+        dense = self.mismatch_counts[np.flatnonzero(keep)][:, np.maximum(columns, 0)].toarray().astype(float)
+        dense[:, columns < 0] = 0
+        with np.errstate(invalid='ignore', divide='ignore'):
+            shares = dense / per_country[keep, None]
+        shares[dense == 0] = np.nan  # SAFE_DIVIDE(SUM(CASE ...)) is NULL when the service never appears
+        for j, name in enumerate(services):
+            df['pct_' + name] = shares[:, j]
+        return (df.sort_values(['proportion_nonstandard', 'country'], ascending=[False, True], kind='stable')
+                .reset_index(drop=True))
+
+
+def breakdown_paths(registry, paths):
+    """The breakdown over host export shards, one shard in memory at a time."""
+    result = None
+    for path in paths:
+        hosts, services = explode_services(iter_host_records(path))
+        shard = NonstandardBreakdown.from_services(registry, hosts, services)
+        result = shard if result is None else result.merge(shard)
+    return result
+
+
+if __name__ == '__main__':
+    parser = argparse.ArgumentParser(description='Per-country, per-service counts of services on non-IANA ports.')
+    parser.add_argument('--hosts', nargs='+', required=True, help='Censys host export shards (NDJSON[.gz])')
+    parser.add_argument('--registry', default=DEFAULT_REGISTRY,
+                        help='IANA service-names-port-numbers.csv (default: data/raw/iana/)')
+    parser.add_argument('--sql-pairs-only', action='store_true',
+                        help='Use only the 15 service/port pairs of non_IANA_ports_*.sql')
+    parser.add_argument('--out', required=True, help='Output CSV in long format (country, service_name, mismatch_count, pct)')
+    parser.add_argument('--wide-out', default=None, help='Optional nonstandard_ports_*.csv-style table for the SQL services')
+    args = parser.parse_args()
+
+    service_registry = ServiceRegistry.from_pairs(IANA_PORTS.items()) if args.sql_pairs_only else load_registry(args.registry)
+    breakdown = breakdown_paths(service_registry, args.hosts)
+    long_table = breakdown.to_frame()
+    long_table.to_csv(args.out, index=False)
+    if args.wide_out:
+        breakdown.wide_table().to_csv(args.wide_out, index=False)
+    print(f"{len(service_registry)} registered services; {long_table['service_name'].nunique()} seen off their ports "
+          f"in {len(breakdown.countries)} countries; wrote {args.out}")
@@ -0,0 +1,157 @@
+"""
+Incremental weekly update of the local aggregates, keyed on `host_identifier.ipv4`.
+
+`local_aggregate.py` rebuilds every table from a full snapshot. Here the counters of the
+last snapshot are persisted together with a compact per-host summary (country,
+continent, service/insecure/misplaced counts, open ports, OS, CVE flag; see
+`local_aggregate.host_summary`). A new snapshot is summarized shard by shard and diffed
+against those summaries by IPv4: only added, removed and changed hosts touch the
+counters, and hosts whose fields changed in ways no table looks at cost nothing.
+
+State lives in `<state-dir>/<label>.pkl` (one file per host set, e.g. starlink and
+baseline). The first run, or `--rebuild`, builds it from scratch.
+
+Usage (from `scripts/`):
+
+    python incremental.py --snapshot 20250414 --starlink starlink-*.json.gz --baseline sample-*.json.gz \
+        --state-dir ../data/incremental --out-dir ../data/local
+"""
+import argparse
+import os
+import pickle
+from multiprocessing import Pool
+
+from local_aggregate import (HostAggregate, get_field, host_summary, iter_host_records, load_cve_ips,
+                             write_tables)
+
+# Bump whenever host_summary or the counters change so persisted state is rebuilt
+STATE_VERSION = 3
+
+
+class SnapshotState:
+    """The counters of one host set plus the summary of each host they were built from."""
+
+    def __init__(self, snapshot=None, aggregate=None, hosts=None):
+        self.snapshot = snapshot
+        self.aggregate = aggregate if aggregate is not None else HostAggregate()
+        self.hosts = hosts if hosts is not None else dict()   # ipv4 -> host_summary tuple
+
+    def apply(self, snapshot, new_hosts):
+        """Moves the state to a new snapshot's host summaries; returns the diff counts."""
+        aggregate, old_hosts = self.aggregate, self.hosts
+        counts = {'added': 0, 'removed': 0, 'changed': 0, 'unchanged': 0}
+        for ip, summary in new_hosts.items():
+            old = old_hosts.pop(ip, None)
+            if old is None:
+                aggregate.add_summary(summary)
+                counts['added'] += 1
+            elif old != summary:
+                aggregate.add_summary(old, weight=-1)
+                aggregate.add_summary(summary)
+                counts['changed'] += 1
+            else:
+                counts['unchanged'] += 1
+        # Whatever is left was not in the new snapshot
+        for summary in old_hosts.values():
+            aggregate.add_summary(summary, weight=-1)
+        counts['removed'] = len(old_hosts)
+
+        aggregate.prune()
+        self.snapshot = snapshot
+        self.hosts = new_hosts
+        return counts
+
+
+# --- Summarizing a snapshot ---
+
+def summarize_file(path, cve_ips=None):
+    """Maps each host IPv4 in one shard to its host_summary."""
+    return {get_field(record, 'host_identifier', 'ipv4'): host_summary(record, cve_ips)
+            for record in iter_host_records(path)}
+
+
+def summarize_files(paths, processes=None, cve_ips=None):
+    """Summarizes shard files on a process pool; later shards win for duplicate IPs."""
+    paths = list(paths)
+    if processes == 1 or len(paths) <= 1:
+        partials = [summarize_file(path, cve_ips) for path in paths]
+    else:
+        with Pool(processes) as pool:
+            partials = pool.starmap(summarize_file, [(path, cve_ips) for path in paths])
+    hosts = dict()
+    for shard in partials:
+        hosts.update(shard)
+    return hosts
+
+
+# --- Persistence ---
+
+def state_path(state_dir, label):
+    return os.path.join(state_dir, f'{label}.pkl')
+
+
+def load_state(state_dir, label):
+    """Returns the persisted SnapshotState, or None if there is none (or it is from an older version)."""
+    path = state_path(state_dir, label)
+    if not os.path.exists(path):
+        return None
+    with open(path, 'rb') as file:
+        payload = pickle.load(file)
+    if payload.get('version') != STATE_VERSION:
+        return None
+    return SnapshotState(payload['snapshot'], payload['aggregate'], payload['hosts'])
+
+
+def save_state(state, state_dir, label):
+    """Writes the state atomically, so an interrupted run leaves the previous week intact."""
+    os.makedirs(state_dir, exist_ok=True)
+    path = state_path(state_dir, label)
+    payload = {'version': STATE_VERSION, 'snapshot': state.snapshot,
+               'aggregate': state.aggregate, 'hosts': state.hosts}
+    with open(path + '.tmp', 'wb') as file:
+        pickle.dump(payload, file, protocol=pickle.HIGHEST_PROTOCOL)
+    os.replace(path + '.tmp', path)
+
+
+def update(label, paths, snapshot, state_dir, processes=None, cve_ips=None, rebuild=False):
+    """Brings one host set's persisted counters up to `snapshot`.
+
+    Returns (state, diff counts, label of the snapshot the state was at before, or None).
+    """
+    state = None if rebuild else load_state(state_dir, label)
+    if state is None:
+        state = SnapshotState()
+    previous = state.snapshot
+    # The CVE flag is part of each summary, so hosts whose flag flipped count as changed
+    counts = state.apply(snapshot, summarize_files(paths, processes, cve_ips))
+    save_state(state, state_dir, label)
+    # Only set now so the CVE IP set is not persisted; write_tables checks it for the os_cve tables
+    state.aggregate.cve_ips = cve_ips
+    return state, counts, previous
+
+
+if __name__ == '__main__':
+    parser = argparse.ArgumentParser(description='Apply a new Censys snapshot to the persisted local aggregates.')
+    parser.add_argument('--snapshot', required=True, help='Snapshot label, e.g. 20250414')
+    parser.add_argument('--starlink', nargs='+', required=True, help='Starlink host export shards (NDJSON[.gz])')
+    parser.add_argument('--baseline', nargs='+', required=True, help='Baseline host export shards (NDJSON[.gz])')
+    parser.add_argument('--state-dir', required=True, help='Directory holding the persisted counters')
+    parser.add_argument('--out-dir', required=True, help='Directory to write the derived tables to')
+    parser.add_argument('--processes', type=int, default=None, help='Worker processes (default: all cores)')
+    parser.add_argument('--starlink-cve-map', default=None, help='cpe_match.py output for Starlink (adds os_cve tables)')
+    parser.add_argument('--baseline-cve-map', default=None, help='cpe_match.py output for the baseline')
+    parser.add_argument('--rebuild', action='store_true', help='Ignore the persisted state and start over')
+    args = parser.parse_args()
+
+    states = dict()
+    for host_set, shard_paths, cve_map in (('starlink', args.starlink, args.starlink_cve_map),
+                                           ('baseline', args.baseline, args.baseline_cve_map)):
+        cve_ips = load_cve_ips(cve_map) if cve_map else None
+        states[host_set], diff, previous = update(host_set, shard_paths, args.snapshot, args.state_dir,
+                                                  args.processes, cve_ips, args.rebuild)
+        since = f"since {previous}" if previous is not None else "from scratch"
+        print(f"{host_set} {args.snapshot} ({since}): {diff['added']} added, {diff['removed']} removed, "
+              f"{diff['changed']} changed, {diff['unchanged']} unchanged")
+
+    write_tables(states['starlink'].aggregate, states['baseline'].aggregate, args.out_dir)
+    print(f"Wrote tables for {args.snapshot} to {args.out_dir}")
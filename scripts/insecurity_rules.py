@@ -0,0 +1,283 @@
+"""
+Config-driven version of the "insecure service" definition in `insecure_hosts.sql`, with
+a count per rule as well as the combined flag.
+
+Rules live in `data/rules/insecure_services.json`. Each rule names a dotted service
+field and a predicate:
+
+* `in` / `equals`: the scalar field is one of `values` / equal to `value` (numbers are
+  compared numerically, since BigQuery exports INT64 as strings)
+* `contains` / `not_contains` / `regex`: matched case-insensitively (like the SQL's
+  LOWER(...) LIKE), against the field or, for arrays such as the SSH cipher lists,
+  against any element. A `regex` pattern is searched for anywhere in the value, like
+  `contains`; anchor it with `^` / `$` to match the whole value
+
+All text predicates on one field are compiled into a single regex made of one optional
+lookahead group per rule, so one `str.extract` over the field's flattened values (every
+cipher of every service) decides every rule at once. Services are flattened once per
+batch of records; `--services-cache` keeps the flattened fields as Arrow (written batch
+by batch, keyed by the inputs' paths, sizes and mtimes) so a changed rule file is
+re-evaluated without rereading the host export.
+
+Usage (from `scripts/`):
+
+    python insecurity_rules.py --hosts starlink-*.json.gz --out starlink_rule_breakdown.csv
+"""
+import argparse
+import json
+import os
+import re
+
+import numpy as np
+import pandas as pd
+import pyarrow as pa
+
+from local_aggregate import get_field, iter_host_records
+from snapshot_store import DATA_DIR
+
+DEFAULT_RULES = os.path.join(DATA_DIR, 'rules', 'insecure_services.json')
+TEXT_KINDS = ('contains', 'not_contains', 'regex')
+SCALAR_KINDS = ('in', 'equals')
+BATCH_SIZE = 100000
+
+
+def _rule_pattern(rule):
+    """The regex body for one text rule, matched at the start of the value (so searches begin with .*)."""
+    values = '|'.join(re.escape(value.lower()) for value in rule.get('values', ()))
+    if rule['kind'] == 'contains':
+        return f'.*(?:{values})'
+    if rule['kind'] == 'not_contains':
+        return f'(?!.*(?:{values}))'
+    return f'.*(?:{rule["pattern"]})'
+
+
+class RuleSet:
+    """Insecurity rules grouped by field, with one compiled regex per field for the text rules."""
+
+    def __init__(self, rules):
+        self.rules = list(rules)
+        self.names = [rule['name'] for rule in self.rules]
+        if len(set(self.names)) != len(self.names):
+            raise ValueError("Rule names must be unique")
+        for rule in self.rules:
+            if rule['kind'] not in TEXT_KINDS + SCALAR_KINDS:
+                raise ValueError(f"Rule '{rule['name']}' has unknown kind '{rule['kind']}'")
+
+        self.fields = sorted({rule['field'] for rule in self.rules})
+        self.field_types = {field: self._arrow_type(field) for field in self.fields}
+        self.scalar_rules = [rule for rule in self.rules if rule['kind'] in SCALAR_KINDS]
+        self.text_patterns = dict()  # field -> (compiled regex, {group name: rule name})
+        for field in self.fields:
+            text_rules = [rule for rule in self.rules if rule['field'] == field and rule['kind'] in TEXT_KINDS]
+            if not text_rules:
+                continue
+            groups = {f'r{i}': rule['name'] for i, rule in enumerate(text_rules)}
+            body = ''.join(f'(?:(?=(?P<{group}>{_rule_pattern(rule)})))?'
+                           for group, rule in zip(groups, text_rules))
+            self.text_patterns[field] = (re.compile('^' + body, re.DOTALL | re.IGNORECASE), groups)
+
+    def _arrow_type(self, field):
+        """Cache column type of a field: string lists for text rules (scalars become one-element lists), else scalars."""
+        rules = [rule for rule in self.rules if rule['field'] == field]
+        if any(rule['kind'] in TEXT_KINDS for rule in rules):
+            return pa.list_(pa.string())
+        if any(rule['kind'] == 'equals' and isinstance(rule['value'], bool) for rule in rules):
+            return pa.bool_()
+        return pa.string()
+
+    def evaluate(self, services):
+        """Boolean DataFrame (one column per rule, plus 'insecure') aligned with a flattened services frame."""
+        flags = pd.DataFrame(False, index=services.index, columns=self.names)
+
+        for rule in self.scalar_rules:
+            values = services[rule['field']]
+            if rule['kind'] == 'in':
+                flags[rule['name']] = values.isin(rule['values']).to_numpy()
+            elif isinstance(rule['value'], bool):
+                flags[rule['name']] = (values == rule['value']).fillna(False).to_numpy(dtype=bool)
+            else:
+                flags[rule['name']] = (pd.to_numeric(values, errors='coerce') == rule['value']).to_numpy()
+
+        for field, (pattern, groups) in self.text_patterns.items():
+            # One row per array element (or per scalar value), keyed by its service's row
+            elements = services[field].explode().dropna()
+            if elements.empty:
+                continue
+            matched = elements.astype(str).str.lower().str.extract(pattern).notna()
+            per_service = matched.groupby(level=0).any()
+            for group, name in groups.items():
+                flags.loc[per_service.index, name] = per_service[group].to_numpy()
+
+        flags['insecure'] = flags[self.names].any(axis=1)
+        return flags
+
+
+def load_rules(path=DEFAULT_RULES):
+    """Reads and compiles a rules file."""
+    with open(path, 'r') as file:
+        return RuleSet(json.load(file)['rules'])
+
+
+# --- Flattening ---
+
+def _cell(value):
+    """Numbers become strings, as BigQuery already exports INT64s, so each column has one Arrow type."""
+    if isinstance(value, (int, float)) and not isinstance(value, bool):
+        return str(value)
+    return value
+
+
+def flatten_services(records, fields):
+    """One row per service (the SQL's UNNEST(services)) with the host's location and the given fields."""
+    paths = {field: field.split('.') for field in fields}
+    rows = list()
+    for record in records:
+        country = get_field(record, 'location', 'country')
+        country_code = get_field(record, 'location', 'country_code')
+        for service in record.get('services') or ():
+            row = {'country': country, 'country_code': country_code}
+            for field, path in paths.items():
+                row[field] = _cell(get_field(service, *path))
+            rows.append(row)
+    return pd.DataFrame(rows, columns=['country', 'country_code'] + list(fields))
+
+
+def iter_service_batches(paths, fields, batch_size=BATCH_SIZE):
+    """Flattens host exports batch by batch, so memory stays bounded."""
+    batch = list()
+    for path in paths:
+        for record in iter_host_records(path):
+            batch.append(record)
+            if len(batch) >= batch_size:
+                yield flatten_services(batch, fields)
+                batch = list()
+    if batch:
+        yield flatten_services(batch, fields)
+
+
+# --- Per-country breakdown ---
+
+def rule_counts(services, flags):
+    """Per-country service totals, combined insecure counts and per-rule counts for one batch.
+
+    As in the SQL, services of hosts without a country are left out and rows are grouped
+    by country_code.
+    """
+    keep = services['country'].notna().to_numpy()
+    counts = flags[keep].astype(np.int64)
+    counts.insert(0, 'total', 1)
+    return counts.groupby(services.loc[keep, 'country_code'].fillna('').to_numpy()).sum()
+
+
+def breakdown_table(counts, names):
+    """Adds rates to the summed counts: insecure_rate and, per rule, the share of services it flags."""
+    table = counts.rename_axis('country').reset_index()
+    table['country'] = table['country'].replace('', None)
+    table['insecure_rate'] = table['insecure'] / table['total']
+    for name in names:
+        table[f'{name}_rate'] = table[name] / table['total']
+    return table.sort_values('insecure_rate', ascending=False, kind='stable').reset_index(drop=True)
+
+
+def sources_fingerprint(paths):
+    """Path, size and mtime of every input, as JSON (the same cheap check as the snapshot manifest)."""
+    entries = list()
+    for path in paths:
+        stat = os.stat(path)
+        entries.append([os.path.abspath(path), stat.st_size, stat.st_mtime])
+    return json.dumps(entries)
+
+
+def cache_schema(paths, rules):
+    """Arrow schema of a services cache for these inputs and rules, with the inputs' fingerprint as metadata."""
+    fields = [('country', pa.string()), ('country_code', pa.string())] + list(rules.field_types.items())
+    return pa.schema(fields, metadata={'sources': sources_fingerprint(paths)})
+
+
+def _as_list(value):
+    if value is None or isinstance(value, list):
+        return None if value is None else [None if element is None else str(element) for element in value]
+    return [str(value)]
+
+
+def services_to_arrow(services, schema):
+    """A flattened services batch as an Arrow table of the cache schema."""
+    columns = dict()
+    for field in schema:
+        values = services[field.name]
+        if pa.types.is_list(field.type):
+            values = values.map(_as_list, na_action='ignore')
+        columns[field.name] = pa.array(values.astype(object).where(values.notna(), None), type=field.type,
+                                       from_pandas=True)
+    return pa.table(columns, schema=schema)
+
+
+def _cache_is_fresh(services_cache, schema):
+    """The cache was built from the same inputs and holds every field with the type the rules need."""
+    if not os.path.exists(services_cache):
+        return False
+    with pa.memory_map(services_cache, 'r') as source:
+        cached = pa.ipc.open_file(source).schema
+    if (cached.metadata or dict()).get(b'sources') != schema.metadata[b'sources']:
+        return False
+    return all(cached.get_field_index(field.name) >= 0 and cached.field(field.name).type == field.type
+               for field in schema)
+
+
+def _iter_cached_batches(services_cache, columns):
+    """The cached services one record batch at a time."""
+    with pa.memory_map(services_cache, 'r') as source:
+        reader = pa.ipc.open_file(source)
+        for i in range(reader.num_record_batches):
+            yield reader.get_batch(i).select(columns).to_pandas()
+
+
+def _iter_caching_batches(paths, rules, services_cache, schema):
+    """Flattens the exports batch by batch, appending each batch to a new cache as it goes."""
+    partial_path = services_cache + '.partial'
+    with pa.OSFile(partial_path, 'wb') as sink:
+        with pa.ipc.new_file(sink, schema) as writer:
+            for services in iter_service_batches(paths, rules.fields):
+                writer.write_table(services_to_arrow(services, schema))
+                yield services
+    os.replace(partial_path, services_cache)
+
+
+def evaluate_paths(paths, rules, services_cache=None):
+    """Runs every rule over host exports (or a cached flattened services table) and returns the breakdown.
+
+    The cache is reused only if it was built from the same input files (path, size and
+    mtime) and holds the rules' fields; otherwise it is rebuilt while the exports stream.
+    """
+    if services_cache is None:
+        batches = iter_service_batches(paths, rules.fields)
+    else:
+        schema = cache_schema(paths, rules)
+        if _cache_is_fresh(services_cache, schema):
+            batches = _iter_cached_batches(services_cache, schema.names)
+        else:
+            batches = _iter_caching_batches(paths, rules, services_cache, schema)
+
+    total = None
+    for services in batches:
+        partial_counts = rule_counts(services, rules.evaluate(services))
+        total = partial_counts if total is None else total.add(partial_counts, fill_value=0)
+    if total is None:
+        total = pd.DataFrame(columns=['total', 'insecure'] + rules.names, dtype=np.int64)
+    return breakdown_table(total.astype(np.int64), rules.names)
+
+
+if __name__ == '__main__':
+    parser = argparse.ArgumentParser(description='Per-country, per-rule insecure service counts from host exports.')
+    parser.add_argument('--hosts', nargs='+', required=True, help='Censys host export shards (NDJSON[.gz])')
+    parser.add_argument('--rules', default=DEFAULT_RULES, help='Rules file (default: data/rules/insecure_services.json)')
+    parser.add_argument('--out', required=True, help='Output CSV with per-country totals and per-rule counts')
+    parser.add_argument('--services-cache', default=None,
+                        help='Arrow file holding the flattened services, reused when the rules change (rebuilt if --hosts differ)')
+    args = parser.parse_args()
+
+    rule_set = load_rules(args.rules)
+    breakdown = evaluate_paths(args.hosts, rule_set, args.services_cache)
+    breakdown.to_csv(args.out, index=False)
+    print(f"Evaluated {len(rule_set.rules)} rules on {int(breakdown['total'].sum())} services "
+          f"in {len(breakdown)} countries; wrote {args.out}")
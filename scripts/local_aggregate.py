@@ -0,0 +1,541 @@
+"""
+Local, single-pass replacement for the per-metric BigQuery queries in `data/sql/`.
+
+Each of `insecure_hosts.sql`, `non_IANA_ports_*.sql`, `cdf_open_ports_*.sql` and
+`os-share-by-continent-*.sql` rescans (and re-UNNESTs) the whole Censys host table.
+This module reads newline-delimited Censys host records (the BigQuery JSON export of
+a host table, optionally gzipped and split into shards) exactly once and fills every
+table in the same pass. Shards are aggregated on a process pool and merged. Given a
+`cpe_match.py` map, the `os_cve_locations` tables are filled in too.
+
+Usage (from `scripts/`):
+
+    python local_aggregate.py --starlink starlink-*.json.gz --baseline sample-*.json.gz --out-dir ../data/local
+"""
+import argparse
+import csv
+import gzip
+import json
+import os
+from collections import Counter
+from functools import partial
+from multiprocessing import Pool
+
+import numpy as np
+import pandas as pd
+
+from hll import make_distinct_counter
+from port_histogram import PortHistogram
+from profiling import mark
+
+# Same 15 service/port pairs as the `iana_ports` CTE in non_IANA_ports_*.sql
+IANA_PORTS = {
+    'http': 80,
+    'https': 443,
+    'ssh': 22,
+    'ftp': 21,
+    'telnet': 23,
+    'smtp': 25,
+    'imap': 143,
+    'pop3': 110,
+    'dns': 53,
+    'mysql': 3306,
+    'rdp': 3389,
+    'mongodb': 27017,
+    'redis': 6379,
+    'postgresql': 5432,
+    'vnc': 5900,
+}
+SERVICE_COLS = ['pct_' + name for name in IANA_PORTS]
+
+# os-share-by-continent-*.sql keeps the top 9 OSes per continent and folds the rest into '<other>'
+OS_TOP_N = 9
+
+
+# --- Record reading ---
+
+def open_records(path, mode='r'):
+    """Opens a (possibly gzipped) newline-delimited JSON file for text reading (or writing, mode='w')."""
+    if path.endswith('.gz'):
+        return gzip.open(path, mode + 't', encoding='utf-8')
+    return open(path, mode, encoding='utf-8')
+
+
+def iter_host_records(path):
+    """Yields Censys host records one at a time from a newline-delimited JSON export."""
+    with open_records(path) as file:
+        for line in file:
+            line = line.strip()
+            if line:
+                yield json.loads(line)
+
+
+def get_field(record, *keys):
+    """Walks nested dict keys, returning None as soon as a level is missing or null."""
+    for key in keys:
+        if record is None:
+            return None
+        record = record.get(key)
+    return record
+
+
+def as_int(value):
+    """Converts an integer field to int; BigQuery's JSON export writes INT64 values as strings."""
+    return None if value is None else int(value)
+
+
+def load_cve_ips(path):
+    """Set of host IPs with at least one CVE in a cpe_match.py map (the SQL's cve_flags CTE)."""
+    with open(path, 'r', newline='') as file:
+        return {row['host_ip'] for row in csv.DictReader(file)}
+
+
+# --- Per-metric predicates (mirroring the SQL) ---
+
+def _weak_ciphers(ciphers):
+    """True if any SSH cipher is neither AES nor ChaCha, or is a CBC-mode cipher."""
+    for cipher in ciphers or ():
+        cipher = cipher.lower()
+        if 'cbc' in cipher or ('aes' not in cipher and 'chacha' not in cipher):
+            return True
+    return False
+
+
+def is_insecure_service(service):
+    """Evaluates the COUNTIF(...) condition of insecure_hosts.sql for one service."""
+    if get_field(service, 'tls', 'version_selected') in ('TLSv1_0', 'TLSv1_1'):
+        return True
+    if get_field(service, 'smb', 'smbv1_support') is True or as_int(get_field(service, 'smb', 'smb_version', 'major')) == 1:
+        return True
+    kex = get_field(service, 'ssh', 'kex_init_message')
+    if kex is not None:
+        return _weak_ciphers(kex.get('client_to_server_ciphers')) or _weak_ciphers(kex.get('server_to_client_ciphers'))
+    return False
+
+
+def host_summary(record, cve_ips=None):
+    """Reduces a host record to the fields the aggregates count, as a hashable tuple.
+
+    (country, country_code, continent, n_services, n_insecure, misplaced service names,
+    n_open_ports, os, has_cve): two records with the same summary contribute identically
+    to every table, which is what the incremental mode diffs on.
+    """
+    services = record.get('services') or []
+    misplaced = list()
+    n_insecure = 0
+    for service in services:
+        if is_insecure_service(service):
+            n_insecure += 1
+        service_name = (service.get('service_name') or '').lower()
+        iana_port = IANA_PORTS.get(service_name)
+        port = as_int(service.get('port'))
+        # As in the SQL, a NULL port is never != the IANA port
+        if iana_port is not None and port is not None and port != iana_port:
+            misplaced.append(service_name)
+
+    ports_list = record.get('ports_list')
+    vendor = get_field(record, 'operating_system', 'vendor')
+    product = get_field(record, 'operating_system', 'product')
+    os_name = f'{vendor} {product}'.lower() if vendor is not None and product is not None else None
+    has_cve = cve_ips is not None and get_field(record, 'host_identifier', 'ipv4') in cve_ips
+    return (get_field(record, 'location', 'country'), get_field(record, 'location', 'country_code'),
+            get_field(record, 'location', 'continent'), len(services), n_insecure, tuple(sorted(misplaced)),
+            None if ports_list is None else len(ports_list), os_name, has_cve)
+
+
+COUNTER_ATTRS = ('service_total', 'service_insecure', 'service_hosts', 'nonstandard_hosts',
+                 'nonstandard_services', 'port_counts', 'os_counts', 'cve_host_total', 'cve_hosts')
+# The COUNT(DISTINCT ipv4) / GROUP BY host_ip counts, which a distinct mode counts per IP
+DISTINCT_ATTRS = ('service_hosts', 'nonstandard_hosts', 'cve_host_total', 'cve_hosts')
+
+
+class HostAggregate:
+    """Mergeable counters for every per-country/per-continent metric, filled one host at a time.
+
+    By default hosts are assumed to be unique per snapshot (one row per IPv4, as in the
+    Censys tables), so the SQL's COUNT(DISTINCT ipv4) reduces to counting hosts. With
+    distinct='exact' or 'hll' the DISTINCT_ATTRS counts are taken over IPv4s instead
+    (a set or a HyperLogLog sketch of the given standard error per group), which stays
+    correct when the same host shows up in several shards or merged snapshots.
+    """
+
+    def __init__(self, cve_ips=None, distinct=None, error=0.01):
+        self.cve_ips = cve_ips                   # IPs with >= 1 CVE match (cpe_match.py output), if known
+        self.distinct = distinct
+        self.error = error
+        self.sketches = {attr: dict() for attr in DISTINCT_ATTRS} if distinct else None  # attr -> key -> counter
+        self.host_sketch = make_distinct_counter(distinct, error) if distinct else None
+        self.hosts = 0
+        self.country_names = dict()              # country_code -> country
+        self.service_total = Counter()           # country_code -> services
+        self.service_insecure = Counter()        # country_code -> insecure services
+        self.service_hosts = Counter()           # country -> hosts with >= 1 service
+        self.nonstandard_hosts = Counter()       # country -> hosts with >= 1 misplaced service
+        self.nonstandard_services = Counter()    # (country, service_name) -> misplaced services
+        self.port_counts = Counter()             # (continent, num_open_ports) -> hosts
+        self.os_counts = Counter()               # (continent, os) -> hosts
+        self.cve_host_total = Counter()          # country_code -> hosts
+        self.cve_hosts = Counter()               # country_code -> hosts with >= 1 CVE
+
+    def add(self, record):
+        """Folds one host record into every counter."""
+        summary = host_summary(record, self.cve_ips)
+        self.add_summary(summary)
+        if self.distinct:
+            self._add_distinct(get_field(record, 'host_identifier', 'ipv4'), summary)
+
+    def _sketch(self, attr, key):
+        sketches = self.sketches[attr]
+        if key not in sketches:
+            sketches[key] = make_distinct_counter(self.distinct, self.error)
+        return sketches[key]
+
+    def _add_distinct(self, ip, summary):
+        """Adds the host's IPv4 to the sketch of every distinct-count group it belongs to."""
+        country, country_code, _, n_services, _, misplaced, _, _, has_cve = summary
+        self.host_sketch.add(ip)
+        if n_services:
+            self._sketch('service_hosts', country).add(ip)
+            if misplaced:
+                self._sketch('nonstandard_hosts', country).add(ip)
+        self._sketch('cve_host_total', country_code).add(ip)
+        if has_cve:
+            self._sketch('cve_hosts', country_code).add(ip)
+
+    def add_summary(self, summary, weight=1):
+        """Adds (weight=1) or removes (weight=-1) one host's contribution to every counter."""
+        (country, country_code, continent, n_services, n_insecure, misplaced,
+         n_ports, os_name, has_cve) = summary
+        if weight < 0 and self.distinct:
+            raise ValueError("Distinct-count sketches cannot remove hosts; use distinct=None for incremental updates")
+        self.hosts += weight
+
+        if country is not None and country_code is not None:
+            self.country_names.setdefault(country_code, country)
+
+        # insecure_hosts.sql: one row per UNNESTed service, grouped by country_code
+        if country is not None and n_services:
+            self.service_total[country_code] += weight * n_services
+            if n_insecure:
+                self.service_insecure[country_code] += weight * n_insecure
+
+        # non_IANA_ports_*.sql: hosts (and misplaced services) by country name
+        if n_services:
+            self.service_hosts[country] += weight
+            for service_name in misplaced:
+                self.nonstandard_services[(country, service_name)] += weight
+            if misplaced:
+                self.nonstandard_hosts[country] += weight
+
+        # os_cve_locations/*.sql: every host counts, has_cve from the CVE map
+        self.cve_host_total[country_code] += weight
+        if has_cve:
+            self.cve_hosts[country_code] += weight
+
+        if continent is None:
+            return
+
+        # cdf_open_ports_*.sql
+        if n_ports is not None:
+            self.port_counts[(continent, n_ports)] += weight
+
+        # os-share-by-continent-*.sql
+        if os_name is not None:
+            self.os_counts[(continent, os_name)] += weight
+
+    def add_table(self, table):
+        """Folds a host_table.HostTable (or a slice of one) into every counter, summing each group at once."""
+        n = len(table)
+        self.hosts += n
+        n_locations = len(table.locations)
+        countries, country_codes = table.countries(), table.country_codes()
+        location = table.location.astype(np.int64)
+        service_host = table.service_host_index()
+        n_services = table.n_services()
+        misplaced = table.misplaced_services(IANA_PORTS)
+        n_misplaced = np.bincount(service_host, weights=misplaced, minlength=n)
+        has_cve = table.has_cve(self.cve_ips) if self.cve_ips is not None else np.zeros(n, dtype=bool)
+
+        def by_location(weights):
+            return np.bincount(location, weights=weights, minlength=n_locations).astype(np.int64)
+
+        def add_counts(counter, keys, counts):
+            for key, count in zip(keys, counts):
+                if count:
+                    counter[key] += int(count)
+
+        present = by_location(None) > 0
+        for i in np.flatnonzero(present):
+            if countries[i] is not None and country_codes[i] is not None:
+                self.country_names.setdefault(country_codes[i], countries[i])
+
+        has_country = np.array([name is not None for name in countries], dtype=bool)
+        add_counts(self.service_total, country_codes[has_country], by_location(n_services)[has_country])
+        n_insecure = np.bincount(service_host, weights=table.service_insecure, minlength=n)
+        add_counts(self.service_insecure, country_codes[has_country], by_location(n_insecure)[has_country])
+
+        add_counts(self.service_hosts, countries, by_location(n_services > 0))
+        add_counts(self.nonstandard_hosts, countries, by_location(n_misplaced > 0))
+        pairs, pair_counts = np.unique(np.column_stack([location[service_host[misplaced]],
+                                                        table.service_names[misplaced]]), axis=0, return_counts=True)
+        add_counts(self.nonstandard_services,
+                   [(countries[loc], table.service_name_values[name]) for loc, name in pairs], pair_counts)
+
+        add_counts(self.cve_host_total, country_codes, by_location(None))
+        add_counts(self.cve_hosts, country_codes, by_location(has_cve))
+
+        continent = table.continent.astype(np.int64)
+        with_ports = (continent >= 0) & table.ports_known
+        keys, counts = np.unique(np.column_stack([continent[with_ports], table.n_ports()[with_ports]]), axis=0,
+                                 return_counts=True)
+        add_counts(self.port_counts, [(table.continents[c], int(k)) for c, k in keys], counts)
+        with_os = (continent >= 0) & (table.os >= 0)
+        keys, counts = np.unique(np.column_stack([continent[with_os], table.os[with_os]]), axis=0, return_counts=True)
+        add_counts(self.os_counts, [(table.continents[c], table.oses[o]) for c, o in keys], counts)
+
+        if self.distinct:
+            self._add_distinct_table(table, location, countries, country_codes, n_services > 0, n_misplaced > 0, has_cve)
+
+    def _add_distinct_table(self, table, location, countries, country_codes, with_services, with_misplaced, has_cve):
+        """_add_distinct for every host of a table."""
+        from host_table import uint32_to_ipv4
+        ips = uint32_to_ipv4(table.ipv4)
+        for ip in ips:
+            self.host_sketch.add(ip)
+        for i in np.unique(location):
+            rows = location == i
+            for attr, key, mask in (('service_hosts', countries[i], with_services),
+                                    ('nonstandard_hosts', countries[i], with_misplaced),
+                                    ('cve_host_total', country_codes[i], None),
+                                    ('cve_hosts', country_codes[i], has_cve)):
+                selected = rows if mask is None else rows & mask
+                if selected.any():
+                    sketch = self._sketch(attr, key)
+                    for ip in ips[selected]:
+                        sketch.add(ip)
+
+    def prune(self):
+        """Drops keys whose count fell to zero after removals, so the tables do not emit empty rows."""
+        for attr in COUNTER_ATTRS:
+            counter = getattr(self, attr)
+            for key in [key for key, count in counter.items() if count <= 0]:
+                del counter[key]
+        return self
+
+    def merge(self, other):
+        """Adds another aggregate's counters into this one (e.g. from another shard)."""
+        self.hosts += other.hosts
+        for code, name in other.country_names.items():
+            self.country_names.setdefault(code, name)
+        for attr in COUNTER_ATTRS:
+            getattr(self, attr).update(getattr(other, attr))
+        if self.distinct:
+            self.host_sketch.merge(other.host_sketch)
+            for attr in DISTINCT_ATTRS:
+                for key, sketch in other.sketches[attr].items():
+                    self._sketch(attr, key).merge(sketch)
+        return self
+
+    def counts(self, attr):
+        """A counter by name, with distinct-count groups read from their sketches in a distinct mode."""
+        if self.distinct and attr in DISTINCT_ATTRS:
+            return Counter({key: sketch.count() for key, sketch in self.sketches[attr].items()})
+        return getattr(self, attr)
+
+    def host_count(self):
+        """Hosts seen: distinct IPv4s in a distinct mode, records otherwise."""
+        return self.host_sketch.count() if self.distinct else self.hosts
+
+    # --- Output tables (same columns as the committed exports) ---
+
+    def insecure_table(self):
+        """Per-country service totals and insecure counts (one side of insecure_hosts.sql)."""
+        rows = [{'country': code,
+                 'total': total,
+                 'insecure': self.service_insecure[code],
+                 'insecure_rate': self.service_insecure[code] / total}
+                for code, total in self.service_total.items() if total > 0]
+        return pd.DataFrame(rows, columns=['country', 'total', 'insecure', 'insecure_rate'])
+
+    def non_iana_table(self):
+        """Same columns as nonstandard_ports_*.csv (hosts without a country are left out, as by the SQL's country join)."""
+        per_country = dict()
+        for (country, service_name), count in self.nonstandard_services.items():
+            per_country.setdefault(country, Counter())[service_name] = count
+
+        service_hosts = self.counts('service_hosts')
+        rows = list()
+        for country, mismatched_hosts in self.counts('nonstandard_hosts').items():
+            if country is None:
+                continue
+            total_hosts = service_hosts[country]
+            row = {'country': country,
+                   'hosts_with_nonstandard_ports': mismatched_hosts,
+                   'total_hosts': total_hosts,
+                   'proportion_nonstandard': mismatched_hosts / total_hosts}
+            breakdown = per_country.get(country, Counter())
+            mismatch_total = sum(breakdown.values())
+            for service_name in IANA_PORTS:
+                # SAFE_DIVIDE(SUM(CASE ...)) is NULL when the service never appears
+                count = breakdown.get(service_name)
+                row['pct_' + service_name] = count / mismatch_total if count else None
+            rows.append(row)
+
+        columns = ['country', 'hosts_with_nonstandard_ports', 'total_hosts', 'proportion_nonstandard'] + SERVICE_COLS
+        df = pd.DataFrame(rows, columns=columns)
+        return (df.sort_values(['proportion_nonstandard', 'country'], ascending=[False, True], kind='stable')
+                .reset_index(drop=True))
+
+    def open_ports_cdf_table(self):
+        """Same columns as csv_*.csv under data/raw/cdf_open_ports."""
+        df = pd.DataFrame([(continent, n, count) for (continent, n), count in self.port_counts.items()],
+                          columns=['continent', 'num_open_ports', 'count'])
+        df = df.sort_values(['continent', 'num_open_ports']).reset_index(drop=True)
+        grouped = df.groupby('continent')['count']
+        df['cdf'] = grouped.cumsum() / grouped.transform('sum')
+        return df[['continent', 'num_open_ports', 'cdf']]
+
+    def port_histogram(self):
+        """The open-port counts per continent as a PortHistogram (exact, mergeable host counts)."""
+        return PortHistogram.from_counts(self.port_counts)
+
+    def os_share_rows(self):
+        """Same rows (string-valued, like the BigQuery JSON export) as the os_share_by_continent files."""
+        per_continent = dict()
+        for (continent, os_name), count in self.os_counts.items():
+            per_continent.setdefault(continent, list()).append((os_name, count))
+
+        rows = list()
+        for continent in sorted(per_continent):
+            # Ties broken by name so the output does not depend on the order hosts were seen
+            ranked = sorted(per_continent[continent], key=lambda t: (-t[1], t[0]))
+            combined = ranked[:OS_TOP_N]
+            if len(ranked) > OS_TOP_N:
+                combined.append(('<other>', sum(count for _, count in ranked[OS_TOP_N:])))
+            total = sum(count for _, count in combined)
+            shares = [(os_name, round(count * 100.0 / total, 2), count) for os_name, count in combined]
+            for os_name, share, count in sorted(shares, key=lambda t: (-t[1], t[0])):
+                rows.append({'continent': continent, 'os': os_name,
+                             'percentage_share': str(share), 'count': str(count)})
+        return rows
+
+    def os_cve_rows(self):
+        """Same rows (string-valued) as the os_cve_locations exports; needs the aggregate's cve_ips."""
+        cve_hosts = self.counts('cve_hosts')
+        rows = list()
+        for code, host_count in self.counts('cve_host_total').items():
+            with_cve = cve_hosts[code]
+            rows.append({'country': self.country_names.get(code), 'country_code': code,
+                         'hosts_with_cve': str(with_cve), 'host_count': str(host_count),
+                         'percentage_with_cve': str(round(with_cve * 100.0 / host_count, 2))})
+        return sorted(rows, key=lambda row: (-float(row['percentage_with_cve']), str(row['country_code'])))
+
+
+def combine_insecure(starlink, baseline):
+    """Full outer join of the two insecure tables into the insecure_hosts.csv layout."""
+    merged = baseline.insecure_table().merge(starlink.insecure_table(), on='country', how='outer',
+                                             suffixes=('_all', '_starlink'))
+    names = dict(baseline.country_names)
+    names.update(starlink.country_names)
+    out = pd.DataFrame({
+        'country': merged['country'],
+        'country_name': merged['country'].map(names),
+        'starlink_total': merged['total_starlink'],
+        'starlink_insecure': merged['insecure_starlink'],
+        'starlink_insecure_rate': merged['insecure_rate_starlink'],
+        'all_total': merged['total_all'],
+        'all_insecure': merged['insecure_all'],
+        'all_insecure_rate': merged['insecure_rate_all'],
+    })
+    return out.sort_values('starlink_insecure_rate', ascending=False, kind='stable').reset_index(drop=True)
+
+
+# --- Sharded driver ---
+
+def aggregate_file(path, cve_ips=None, distinct=None, error=0.01):
+    """Aggregates a single shard file, or a host_table.py directory."""
+    aggregate = HostAggregate(cve_ips, distinct, error)
+    if os.path.isdir(path):
+        from host_table import HostTable
+        aggregate.add_table(HostTable.load(path))
+        return aggregate
+    for record in iter_host_records(path):
+        aggregate.add(record)
+    return aggregate
+
+
+def aggregate_files(paths, processes=None, cve_ips=None, distinct=None, error=0.01):
+    """Aggregates shard files on a process pool and merges the partial results."""
+    paths = list(paths)
+    worker = partial(aggregate_file, cve_ips=cve_ips, distinct=distinct, error=error)
+    if processes == 1 or len(paths) <= 1:
+        partials = map(worker, paths)
+    else:
+        with Pool(processes) as pool:
+            partials = pool.map(worker, paths)
+    result = HostAggregate(cve_ips, distinct, error)
+    for shard in partials:
+        result.merge(shard)
+    return result
+
+
+def write_tables(starlink, baseline, out_dir):
+    """Writes every derived table to out_dir, mirroring the data/raw layout."""
+    outputs = {
+        'insecure_hosts/insecure_hosts.csv': combine_insecure(starlink, baseline),
+        'non_IANA_ports/nonstandard_ports_starlink.csv': starlink.non_iana_table(),
+        'non_IANA_ports/nonstandard_ports_baseline.csv': baseline.non_iana_table(),
+        'cdf_open_ports/csv_starlink.csv': starlink.open_ports_cdf_table(),
+        'cdf_open_ports/csv_baseline.csv': baseline.open_ports_cdf_table(),
+        'cdf_open_ports/hist_starlink.csv': starlink.port_histogram().to_frame('continent'),
+        'cdf_open_ports/hist_baseline.csv': baseline.port_histogram().to_frame('continent'),
+        'cdf_open_ports/ks_starlink_vs_baseline.csv':
+            starlink.port_histogram().ks_2samp(baseline.port_histogram()).rename(columns={'group': 'continent'}),
+    }
+    for rel_path, df in outputs.items():
+        path = os.path.join(out_dir, rel_path)
+        os.makedirs(os.path.dirname(path), exist_ok=True)
+        df.to_csv(path, index=False)
+
+    for label, aggregate in (('starlink', starlink), ('baseline', baseline)):
+        path = os.path.join(out_dir, 'os_share_by_continent', f'os_share_{label}.json')
+        os.makedirs(os.path.dirname(path), exist_ok=True)
+        with open(path, 'w') as file:
+            json.dump(aggregate.os_share_rows(), file, indent=2)
+        if aggregate.cve_ips is not None:
+            path = os.path.join(out_dir, 'os_cve_locations', f'os_cve_{label}.json')
+            os.makedirs(os.path.dirname(path), exist_ok=True)
+            with open(path, 'w') as file:
+                json.dump(aggregate.os_cve_rows(), file, indent=2)
+
+
+if __name__ == '__main__':
+    parser = argparse.ArgumentParser(description='Build every per-country/per-continent table in one pass.')
+    parser.add_argument('--starlink', nargs='+', required=True,
+                        help='Starlink host export shards (NDJSON[.gz]) or host_table.py directories')
+    parser.add_argument('--baseline', nargs='+', required=True,
+                        help='Baseline host export shards (NDJSON[.gz]) or host_table.py directories')
+    parser.add_argument('--out-dir', required=True, help='Directory to write the derived tables to')
+    parser.add_argument('--processes', type=int, default=None, help='Worker processes (default: all cores)')
+    parser.add_argument('--starlink-cve-map', default=None, help='cpe_match.py output for Starlink (adds os_cve tables)')
+    parser.add_argument('--baseline-cve-map', default=None, help='cpe_match.py output for the baseline')
+    parser.add_argument('--starlink-distinct', choices=['rows', 'exact', 'hll'], default='rows',
+                        help="How Starlink's distinct host counts are taken: one host per row (default), "
+                             "exact sets of IPv4s, or HyperLogLog sketches")
+    parser.add_argument('--baseline-distinct', choices=['rows', 'exact', 'hll'], default='rows',
+                        help='Same for the baseline (hll keeps memory bounded on the full host table)')
+    parser.add_argument('--hll-error', type=float, default=0.01, help='Standard error of the HyperLogLog sketches')
+    args = parser.parse_args()
+
+    starlink_agg = aggregate_files(args.starlink, args.processes,
+                                   load_cve_ips(args.starlink_cve_map) if args.starlink_cve_map else None,
+                                   None if args.starlink_distinct == 'rows' else args.starlink_distinct,
+                                   args.hll_error)
+    baseline_agg = aggregate_files(args.baseline, args.processes,
+                                   load_cve_ips(args.baseline_cve_map) if args.baseline_cve_map else None,
+                                   None if args.baseline_distinct == 'rows' else args.baseline_distinct,
+                                   args.hll_error)
+    mark('save')
+    write_tables(starlink_agg, baseline_agg, args.out_dir)
+    print(f"Aggregated {starlink_agg.host_count()} Starlink and {baseline_agg.host_count()} baseline hosts "
+          f"into {args.out_dir}")
@@ -0,0 +1,203 @@
+"""
+Regenerates every figure and table from one Python process.
+
+The heavy libraries and the inputs shared between scripts (Arrow snapshots, cached
+map polygons, covariates, country keys) are loaded once in the parent. Each script
+then runs in a forked worker of a process pool with the headless Agg backend, so it
+inherits all of that without re-importing or re-reading anything and cannot leak
+matplotlib/pandas state into the next script. Output is written to `../figures` and
+`../html` exactly as when the scripts are run by hand.
+
+Usage (from anywhere):
+
+    python scripts/make_figures.py                 # everything
+    python scripts/make_figures.py fig4 fig4_5     # scripts whose name starts with these
+    python scripts/make_figures.py --list
+    python scripts/make_figures.py --stages --profile-json profile.json   # per-stage time and memory
+
+Opt-in scripts, not run here because their inputs are not committed (run them by hand
+once the inputs exist):
+
+* `fig2_5_cve_severity.py` reads `../data/raw/os_cve_severity/cve_severity_{starlink,baseline}.csv`,
+  written by `python cvss_exposure.py --cve-map ... --hosts ... --name starlink|baseline`
+"""
+import argparse
+import contextlib
+import io
+import multiprocessing
+import os
+import runpy
+import time
+from functools import partial
+
+import matplotlib
+
+matplotlib.use('Agg')
+
+from profiling import format_stages, profile_run, write_json
+
+SCRIPTS_DIR = os.path.dirname(os.path.abspath(__file__))
+
+# script -> outputs (relative to the repository root) and the shared inputs it reads:
+# snapshot_store inputs, geometry_cache shapefiles ('geometry:<name>') and 'covariates'
+FIGURES = {
+    'fig1_dist_exposed_os.py': {
+        'outputs': ['figures/fig1_dist_exposed_os.png'],
+        'inputs': ['os_share_starlink', 'os_share_baseline'],
+    },
+    'fig2_disparity_insecure_os.py': {
+        'outputs': ['figures/fig2_disparity_insecure_os.png'],
+        'inputs': ['os_cve_starlink', 'os_cve_baseline'],
+    },
+    'fig3_rural_insecure_os.py': {
+        'outputs': ['figures/fig3_rural_insecure_os.png'],
+        'inputs': ['os_cve_starlink', 'covariates'],
+    },
+    'fig4_disparity_protocol.py': {
+        'outputs': ['figures/fig4_disparity_protocol.png'],
+        'inputs': ['insecure_hosts', 'geometry:sovereignty'],
+    },
+    'fig4_5_wealth_normalized_protocol.py': {
+        'outputs': ['figures/fig4_5_wealth_normalized_protocol.png', 'html/fig4_5_wealth_normalized_protocol.html'],
+        'inputs': ['insecure_hosts_plus', 'covariates', 'geometry:sovereignty'],
+    },
+    'fig5_per_country_protocol.py': {
+        'outputs': ['figures/fig5_per_country_protocol.png'],
+        'inputs': ['insecure_hosts'],
+    },
+    'fig6_cdf_protocol.py': {
+        'outputs': ['figures/fig6_cve_protocol.png'],
+        'inputs': ['insecure_hosts'],
+    },
+    'fig7_open_ports_cdfs.py': {
+        'outputs': ['figures/fig7_open_ports_cdfs.png'],
+        'inputs': ['cdf_open_ports_starlink', 'cdf_open_ports_baseline'],
+    },
+    'fig8_per_country_non_IANA.py': {
+        'outputs': ['figures/fig8_per_country_non_IANA.png'],
+        'inputs': ['nonstandard_ports_starlink', 'nonstandard_ports_baseline', 'geometry:countries'],
+    },
+    'fig9_non_IANA_prevalence_diff.py': {
+        'outputs': ['figures/fig9_non_IANA_prevalence_diff.png'],
+        'inputs': ['nonstandard_ports_starlink', 'nonstandard_ports_baseline', 'geometry:countries'],
+    },
+    'NA_os_cve_binomial_comparison.py': {
+        'outputs': [],  # results are printed
+        'inputs': ['os_cve_starlink', 'os_cve_baseline'],
+    },
+}
+
+# Imported in the parent so forked workers start with them already loaded
+HEAVY_MODULES = ['matplotlib.pyplot', 'seaborn', 'geopandas', 'scipy.stats', 'scipy.interpolate',
+                 'sklearn.linear_model', 'statsmodels.api']
+
+
+def select_scripts(prefixes):
+    """Scripts matching any of the given names or name prefixes (all of them if none are given)."""
+    if not prefixes:
+        return list(FIGURES)
+    selected = [script for script in FIGURES
+                if any(script == p or script.startswith(p.removesuffix('.py') + '_') or script == p + '.py'
+                       for p in prefixes)]
+    if not selected:
+        raise SystemExit(f"No script matches {', '.join(prefixes)}; see --list")
+    return selected
+
+
+def preload(scripts):
+    """Imports the heavy libraries and loads every input the selected scripts share."""
+    import importlib
+
+    from country_keys import get_resolver
+    from covariates import load_covariates
+    from geometry_cache import load_world
+    from snapshot_store import load_table
+
+    for module in HEAVY_MODULES:
+        importlib.import_module(module)
+    get_resolver()
+    for name in sorted({name for script in scripts for name in FIGURES[script]['inputs']}):
+        if name == 'covariates':
+            load_covariates()
+        elif name.startswith('geometry:'):
+            load_world(name.split(':', 1)[1])
+        else:
+            load_table(name)
+
+
+def run_script(script, cprofile_dir=None, sample_dir=None):
+    """Runs one script as __main__ from scripts/, returning (script, seconds, stdout, error, stage record)."""
+    import matplotlib.pyplot as plt
+
+    os.chdir(SCRIPTS_DIR)
+    stem = os.path.splitext(script)[0]
+    stdout = io.StringIO()
+    try:
+        with contextlib.redirect_stdout(stdout):
+            record = profile_run(script, script,
+                                 cprofile_path=os.path.join(cprofile_dir, stem + '.prof') if cprofile_dir else None,
+                                 sample_path=os.path.join(sample_dir, stem + '.folded') if sample_dir else None)
+    finally:
+        plt.close('all')
+    return script, record['wall_seconds'], stdout.getvalue(), record['error'], record
+
+
+def run_all(scripts, processes=None, cprofile_dir=None, sample_dir=None):
+    """Runs the scripts on a pool of forked workers (one fresh worker per script)."""
+    for directory in (cprofile_dir, sample_dir):
+        if directory:
+            os.makedirs(directory, exist_ok=True)
+    worker = partial(run_script, cprofile_dir=cprofile_dir, sample_dir=sample_dir)
+    if processes == 1 or 'fork' not in multiprocessing.get_all_start_methods():
+        # Without fork the workers would re-import everything, so run in-process instead
+        return [worker(script) for script in scripts]
+    context = multiprocessing.get_context('fork')
+    with context.Pool(processes=processes or min(len(scripts), os.cpu_count()), maxtasksperchild=1) as pool:
+        return pool.map(worker, scripts, chunksize=1)
+
+
+if __name__ == '__main__':
+    parser = argparse.ArgumentParser(description='Regenerate the figures and tables in one process pool.')
+    parser.add_argument('scripts', nargs='*', help='Script names or prefixes (e.g. fig4 fig8); default: all')
+    parser.add_argument('--processes', type=int, default=None, help='Worker processes (1 runs serially)')
+    parser.add_argument('--list', action='store_true', help='List the scripts, their inputs and outputs')
+    parser.add_argument('--quiet', action='store_true', help="Do not echo the scripts' printed output")
+    parser.add_argument('--profile-json', default=None,
+                        help='Write per-script, per-stage wall/CPU time and peak RSS to this JSON file')
+    parser.add_argument('--cprofile-dir', default=None, help='Also dump a cProfile file per script here')
+    parser.add_argument('--sample-dir', default=None, help='Also write sampled stacks (collapsed format) per script here')
+    parser.add_argument('--stages', action='store_true', help='Print the per-stage timings of every script')
+    args = parser.parse_args()
+
+    if args.list:
+        for script_name, spec in FIGURES.items():
+            print(f"{script_name}: {', '.join(spec['inputs'])} -> {', '.join(spec['outputs']) or '(stdout)'}")
+        raise SystemExit(0)
+
+    os.chdir(SCRIPTS_DIR)
+    chosen = select_scripts(args.scripts)
+    started = time.perf_counter()
+    preload(chosen)
+    loaded = time.perf_counter()
+    results = run_all(chosen, args.processes, args.cprofile_dir, args.sample_dir)
+
+    failed = 0
+    for script_name, seconds, output, traceback_text, stage_record in results:
+        status = 'FAILED' if traceback_text else 'ok'
+        print(f"=== {script_name} ({status}, {seconds:.2f}s) ===")
+        if args.stages:
+            print(format_stages(stage_record))
+        if output and not args.quiet:
+            print(output, end='' if output.endswith('\n') else '\n')
+        if traceback_text:
+            print(traceback_text)
+            failed += 1
+    finished = time.perf_counter()
+    print(f"Loaded shared inputs in {loaded - started:.2f}s, ran {len(results)} scripts in "
+          f"{finished - loaded:.2f}s ({failed} failed)")
+    if args.profile_json:
+        write_json(args.profile_json, {'preload_seconds': round(loaded - started, 6),
+                                       'run_seconds': round(finished - loaded, 6),
+                                       'processes': args.processes,
+                                       'jobs': [result[4] for result in results]})
+    raise SystemExit(1 if failed else 0)
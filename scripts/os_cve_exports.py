@@ -0,0 +1,116 @@
+"""
+Keyed access to the os_cve_locations exports (`bquxjob_*.json`) and batched exact tests
+of Starlink CVE prevalence against the baseline.
+
+`KeyedExport` holds an export as typed columns plus a hash index on its key columns
+(`country_code` for the committed exports; `country_code, os` or `country_code, cve_id`
+for per-OS / per-CVE breakdowns). `align` looks every Starlink cell up in the baseline
+index in one vectorized `get_indexer` call and returns aligned arrays, so pairing
+n Starlink cells with m baseline rows costs O(n + m) instead of a scan per cell. The
+baseline may be keyed more coarsely than Starlink (e.g. per-OS Starlink cells against
+per-country baseline rates), via `baseline_keys`.
+
+`binomial_comparison` then runs the one-tailed binomial test of every cell at once
+(`proportion_tests.binomial_greater`) and adds Benjamini-Hochberg q-values. Run from
+`scripts/`:
+
+    python os_cve_exports.py                        # the committed per-country exports
+    python os_cve_exports.py --starlink os_cve_by_os_starlink.json --keys country_code os \
+        --baseline-keys country_code --out os_cve_by_os_tests.csv
+"""
+import argparse
+
+import numpy as np
+import pandas as pd
+
+from proportion_tests import benjamini_hochberg, binomial_greater
+from snapshot_store import INPUTS, OS_CVE_COLUMNS, load_frame, parse_bq_json
+
+DEFAULT_KEYS = ('country_code',)
+
+
+def load_export(source):
+    """An os_cve export by snapshot name ('os_cve_starlink', 'os_cve_baseline') or BigQuery JSON path."""
+    if source in INPUTS:
+        return load_frame(source)
+    return parse_bq_json(OS_CVE_COLUMNS)(source)
+
+
+class KeyedExport:
+    """An export's rows with a hash index on its key columns (the first row wins on duplicate keys)."""
+
+    def __init__(self, frame, keys=DEFAULT_KEYS):
+        self.keys = list(keys)
+        self.frame = frame.drop_duplicates(self.keys).reset_index(drop=True)
+        self.index = self._key_index(self.frame, self.keys)
+
+    @staticmethod
+    def _key_index(frame, keys):
+        if len(keys) == 1:
+            return pd.Index(frame[keys[0]].astype(object))
+        return pd.MultiIndex.from_frame(frame[keys].astype(object))
+
+    @classmethod
+    def load(cls, source, keys=DEFAULT_KEYS):
+        return cls(load_export(source), keys)
+
+    def positions(self, frame, keys=None):
+        """Row of this export matching each row of frame on keys (default: this export's keys); -1 if absent."""
+        return self.index.get_indexer(self._key_index(frame, list(keys) if keys is not None else self.keys))
+
+    def take(self, frame, column, keys=None):
+        """This export's column aligned to frame's rows, NaN where the key is absent."""
+        positions = self.positions(frame, keys)
+        values = self.frame[column].to_numpy(dtype=float)
+        return np.where(positions >= 0, values[np.maximum(positions, 0)], np.nan)
+
+
+def align(starlink, baseline, baseline_keys=None):
+    """Starlink cells with the matching baseline host count and CVE rate, as aligned arrays.
+
+    baseline_keys are the Starlink columns to look the baseline up by (default: the
+    baseline's own keys).
+    """
+    keys = baseline_keys if baseline_keys is not None else baseline.keys
+    return {'hosts_with_cve': starlink.frame['hosts_with_cve'].to_numpy(dtype=np.int64),
+            'host_count': starlink.frame['host_count'].to_numpy(dtype=np.int64),
+            'percentage_with_cve': starlink.frame['percentage_with_cve'].to_numpy(dtype=float),
+            'baseline_host_count': baseline.take(starlink.frame, 'host_count', keys),
+            'baseline_percentage_with_cve': baseline.take(starlink.frame, 'percentage_with_cve', keys)}
+
+
+def binomial_comparison(starlink, baseline, baseline_keys=None, min_hosts=100):
+    """One-tailed binomial test of every Starlink cell with at least min_hosts hosts against its baseline rate.
+
+    Returns the cells' key and label columns with counts, rates, p_value and q_value,
+    sorted by p-value (ties keep the export's order).
+    """
+    arrays = align(starlink, baseline, baseline_keys)
+    keep = arrays['host_count'] >= min_hosts
+    p_value = binomial_greater(arrays['hosts_with_cve'][keep], arrays['host_count'][keep],
+                               arrays['baseline_percentage_with_cve'][keep] / 100)
+    labels = starlink.frame.loc[keep, [c for c in starlink.frame.columns if c not in OS_CVE_COLUMNS]]
+    result = labels.assign(**{name: values[keep] for name, values in arrays.items()},
+                           p_value=p_value, q_value=benjamini_hochberg(p_value))
+    return result.sort_values('p_value', kind='stable').reset_index(drop=True)
+
+
+if __name__ == '__main__':
+    parser = argparse.ArgumentParser(description='Binomial tests of Starlink CVE prevalence against the baseline.')
+    parser.add_argument('--starlink', default='os_cve_starlink', help='Snapshot name or BigQuery JSON export')
+    parser.add_argument('--baseline', default='os_cve_baseline', help='Snapshot name or BigQuery JSON export')
+    parser.add_argument('--keys', nargs='+', default=list(DEFAULT_KEYS), help='Key columns of the Starlink export')
+    parser.add_argument('--baseline-keys', nargs='+', default=None,
+                        help='Key columns of the baseline export (default: --keys)')
+    parser.add_argument('--min-hosts', type=int, default=100, help='Skip cells with fewer Starlink hosts')
+    parser.add_argument('--out', default=None, help='Write the results as CSV instead of printing them')
+    args = parser.parse_args()
+
+    baseline_key_columns = args.baseline_keys or args.keys
+    tests = binomial_comparison(KeyedExport.load(args.starlink, args.keys),
+                                KeyedExport.load(args.baseline, baseline_key_columns), baseline_key_columns,
+                                args.min_hosts)
+    if args.out:
+        tests.to_csv(args.out, index=False)
+    else:
+        print(tests.to_string(index=False, float_format='{:.3g}'.format))
@@ -0,0 +1,220 @@
+"""
+Open-port-count histograms for many groups at once (continents, countries, ASNs, ...).
+
+A `PortHistogram` holds, per group, the host count of every open-port count that occurs:
+`counts` is a sparse (groups x max open ports + 1) CSR matrix, so memory grows with the
+non-empty bins rather than with groups x the widest row (one host with 65,535 open
+ports no longer widens every ASN). Histograms from different shards add up with
+`merge`, and CDFs, exact quantiles and two-sample KS tests are evaluated for every group
+at once on the non-empty bins (one searchsorted over the row-major bin keys) instead of
+one interpolation object per group.
+
+The `cdf_open_ports` exports only carry CDF rows, so `from_cdf` recovers the
+probability mass per group (float weights, or counts if the group totals are known);
+`local_aggregate.py` writes the integer histograms directly.
+"""
+import numpy as np
+import pandas as pd
+from scipy import sparse
+from scipy.stats import kstwo
+
+from proportion_tests import benjamini_hochberg
+
+
+def _csr(counts):
+    """Canonical CSR (sorted indices, summed duplicates, no stored zeros)."""
+    matrix = sparse.csr_matrix(counts)
+    matrix.sum_duplicates()
+    matrix.eliminate_zeros()
+    return matrix
+
+
+class PortHistogram:
+    """A sparse (groups x port counts) matrix of host counts, with vectorized distribution queries."""
+
+    def __init__(self, groups, counts):
+        self.groups = list(groups)
+        self.counts = _csr(counts)
+        if self.counts.shape[0] != len(self.groups):
+            raise ValueError(f"{len(self.groups)} groups but {self.counts.shape[0]} count rows")
+        self._index = {group: i for i, group in enumerate(self.groups)}
+
+    # --- Construction ---
+
+    @classmethod
+    def _from_entries(cls, codes, uniques, values, weights):
+        values = np.asarray(values, dtype=np.int64)
+        shape = (len(uniques), values.max() + 1 if len(values) else 1)
+        return cls(uniques, sparse.coo_matrix((weights, (codes, values)), shape=shape))
+
+    @classmethod
+    def from_values(cls, groups, values):
+        """Builds integer histograms from one (group, num_open_ports) pair per host."""
+        codes, uniques = pd.factorize(pd.Series(groups), sort=True)
+        return cls._from_entries(codes, uniques, values, np.ones(len(codes), dtype=np.int64))
+
+    @classmethod
+    def from_counts(cls, counter):
+        """Builds integer histograms from a {(group, num_open_ports): hosts} mapping (HostAggregate.port_counts)."""
+        items = [(group, n, count) for (group, n), count in counter.items()]
+        df = pd.DataFrame(items, columns=['group', 'num_open_ports', 'count'])
+        return cls.from_frame(df, 'group', count_col='count')
+
+    @classmethod
+    def from_frame(cls, df, group_col, value_col='num_open_ports', count_col='count'):
+        """Builds histograms from long rows of (group, num_open_ports, count)."""
+        codes, uniques = pd.factorize(df[group_col], sort=True)
+        return cls._from_entries(codes, uniques, df[value_col], df[count_col].to_numpy())
+
+    @classmethod
+    def from_cdf(cls, df, group_col, value_col='num_open_ports', cdf_col='cdf', totals=None):
+        """Recovers per-group mass from CDF rows like the cdf_open_ports exports.
+
+        Without `totals` (group -> hosts) the rows hold probabilities; with them,
+        rounded host counts.
+        """
+        df = df.sort_values([group_col, value_col])
+        mass = df.groupby(group_col, sort=False)[cdf_col].diff().fillna(df[cdf_col])
+        hist = cls.from_frame(df.assign(_mass=mass.to_numpy()), group_col, value_col, '_mass')
+        if totals is not None:
+            scale = np.array([totals[group] for group in hist.groups], dtype=float)
+            counts = hist.counts.copy()
+            counts.data = np.rint(counts.data * scale[hist._entry_rows()]).astype(np.int64)
+            hist.counts = _csr(counts)
+        return hist
+
+    def merge(self, other):
+        """Adds another histogram's counts (groups are matched by label, widths padded)."""
+        index = dict(self._index)
+        for group in other.groups:
+            index.setdefault(group, len(index))
+        groups = list(index)
+        shape = (len(groups), max(self.counts.shape[1], other.counts.shape[1]))
+        rows = np.array([index[g] for g in other.groups], dtype=np.int64)
+        mine = self.counts.tocoo()
+        theirs = other.counts.tocoo()
+        data = np.concatenate([mine.data, theirs.data]).astype(np.result_type(mine.data, theirs.data))
+        counts = sparse.coo_matrix((data, (np.concatenate([mine.row, rows[theirs.row]]),
+                                           np.concatenate([mine.col, theirs.col]))), shape=shape)
+        return PortHistogram(groups, counts)
+
+    def to_frame(self, group_col='group'):
+        """Long (group, num_open_ports, count) rows for the non-empty bins, a compact export format."""
+        return pd.DataFrame({group_col: np.asarray(self.groups, dtype=object)[self._entry_rows()],
+                             'num_open_ports': self.counts.indices.astype(np.int64), 'count': self.counts.data})
+
+    # --- Non-empty bins, row-major ---
+
+    @property
+    def width(self):
+        return self.counts.shape[1]
+
+    def _entry_rows(self):
+        return np.repeat(np.arange(len(self.groups)), np.diff(self.counts.indptr))
+
+    def _cumulative_at(self, rows, values):
+        """Hosts with at most values[i] open ports in group rows[i] (one searchsorted over the bins)."""
+        entry_rows = self._entry_rows()
+        keys = entry_rows * np.int64(self.width) + self.counts.indices
+        cumulative = pd.Series(self.counts.data).groupby(entry_rows).cumsum().to_numpy()
+        values = np.clip(values, -1, self.width - 1).astype(np.int64)
+        position = np.searchsorted(keys, rows * np.int64(self.width) + values, side='right') - 1
+        found = position >= self.counts.indptr[rows]
+        return np.where(found, cumulative[np.maximum(position, 0)] if len(keys) else 0, 0)
+
+    # --- Queries (every group at once) ---
+
+    def totals(self):
+        return np.asarray(self.counts.sum(axis=1)).ravel()
+
+    def cdf(self, x):
+        """Exact step CDF P(N <= x) for every group: a (groups x len(x)) array (NaN rows for empty groups)."""
+        x = np.floor(np.asarray(x, dtype=float))
+        n_groups = len(self.groups)
+        rows = np.repeat(np.arange(n_groups), x.size)
+        with np.errstate(invalid='ignore'):
+            cdf = self._cumulative_at(rows, np.tile(np.maximum(x.ravel(), -1), n_groups)) / self.totals()[rows]
+        return cdf.reshape((n_groups,) + x.shape)
+
+    def interpolated_cdf(self, x, min_value=1):
+        """CDF linearly interpolated between each group's non-empty bins >= min_value.
+
+        Matches interp1d over the CDF rows (fill 0 below the first bin, 1 above the
+        last), as fig7 plotted it on a log axis that starts at one open port.
+        """
+        x = np.asarray(x, dtype=float)
+        n_groups, width = len(self.groups), self.width
+        knots = self.counts.indices >= min_value
+        knot_rows = self._entry_rows()[knots]
+        knot_values = self.counts.indices[knots].astype(np.int64)
+        keys = knot_rows * np.int64(width) + knot_values
+        first = np.searchsorted(knot_rows, np.arange(n_groups + 1))
+
+        # Nearest knot at or below / at or above every x (-1 / width when there is none)
+        rows = np.repeat(np.arange(n_groups), x.size)
+        xs = np.tile(x.ravel(), n_groups)
+        below = np.searchsorted(keys, rows * np.int64(width) + np.clip(np.floor(xs), 0, width - 1).astype(np.int64),
+                                side='right') - 1
+        above = np.searchsorted(keys, rows * np.int64(width) + np.clip(np.ceil(xs), 0, width - 1).astype(np.int64),
+                                side='left')
+        padded = np.append(knot_values, 0)  # index -1 / len(keys) land on the padding
+        lo = np.where(below >= first[rows], padded[below], -1)
+        hi = np.where(above < first[rows + 1], padded[above], width)
+
+        totals = self.totals()[rows]
+        with np.errstate(divide='ignore', invalid='ignore'):
+            y_lo = self._cumulative_at(rows, np.clip(lo, 0, width - 1)) / totals
+            y_hi = self._cumulative_at(rows, np.clip(hi, 0, width - 1)) / totals
+            fraction = np.where(hi > lo, (xs - lo) / (hi - lo), 0.0)
+        y = y_lo + fraction * (y_hi - y_lo)
+        y = np.where(lo < 0, 0.0, y)
+        y = np.where(hi >= width, np.where(lo < 0, 0.0, 1.0), y)
+        return y.reshape((n_groups,) + x.shape)
+
+    def quantile(self, q):
+        """Exact quantiles: the smallest port count whose CDF reaches q, as a (groups x len(q)) float array.
+
+        Groups with no hosts have no quantiles (NaN), as ks_2samp gives NaN for empty samples.
+        """
+        n_groups = len(self.groups)
+        q = np.atleast_1d(np.asarray(q, dtype=float))
+        entry_rows = self._entry_rows()
+        totals = self.totals()
+        # The CDF only steps at non-empty bins; offsetting each group's steps by 2 makes
+        # them one sorted array, so a single searchsorted answers every (group, q) pair
+        steps = self._cumulative_at(entry_rows, self.counts.indices) / totals[entry_rows]
+        flat = np.append(steps + 2.0 * entry_rows, np.inf)
+        rows = np.repeat(np.arange(n_groups), len(q))
+        qs = np.tile(q, n_groups)
+        position = np.searchsorted(flat, qs + 2.0 * rows - 1e-12, side='left')
+        values = np.append(self.counts.indices, 0)[position]
+        quantiles = np.where(position < self.counts.indptr[rows + 1], values, np.nan)
+        quantiles = np.where(qs <= 0, 0.0, quantiles)  # every CDF reaches 0 at 0 open ports
+        quantiles[totals[rows] == 0] = np.nan
+        return quantiles.reshape(n_groups, len(q))
+
+    def ks_2samp(self, other):
+        """Two-sample KS test (two-sided, asymptotic) per group present in both histograms.
+
+        Counts must be host counts, since the sample sizes set the p-values. Port
+        counts are discrete, so the test is conservative. The CDFs only step at
+        non-empty bins, so the statistic is taken over the union of both groups' bins.
+        """
+        groups = [g for g in self.groups if g in other._index]
+        mine = PortHistogram(groups, self.counts[[self._index[g] for g in groups]])
+        theirs = PortHistogram(groups, other.counts[[other._index[g] for g in groups]])
+        union = mine.merge(theirs).counts
+        rows = np.repeat(np.arange(len(groups)), np.diff(union.indptr))
+
+        n1, n2 = mine.totals().astype(float), theirs.totals().astype(float)
+        with np.errstate(divide='ignore', invalid='ignore'):
+            gap = np.abs(mine._cumulative_at(rows, union.indices) / n1[rows]
+                         - theirs._cumulative_at(rows, union.indices) / n2[rows])
+            statistic = np.zeros(len(groups))
+            np.maximum.at(statistic, rows, gap)
+        statistic[(n1 == 0) | (n2 == 0)] = np.nan
+        with np.errstate(divide='ignore', invalid='ignore'):
+            p_value = kstwo.sf(statistic, np.round(n1 * n2 / (n1 + n2)))
+        return pd.DataFrame({'group': groups, 'statistic': statistic, 'p_value': p_value,
+                             'q_value': benjamini_hochberg(p_value), 'n1': n1.astype(np.int64),
+                             'n2': n2.astype(np.int64)})
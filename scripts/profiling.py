@@ -0,0 +1,261 @@
+"""
+Per-stage wall time, CPU time and memory for the figure scripts and table jobs.
+
+Scripts call `mark('<stage>')` where a new stage starts; the stages used are load,
+transform, stats, render and save, and everything before the first mark counts as
+load. Outside a profiled run `mark` does nothing. Inside one, every stage records:
+
+* wall_seconds and cpu_seconds (process CPU, user + system)
+* peak_rss_mb: the highest resident set size during the stage. On Linux the kernel's
+  high-water mark (VmHWM) is reset at every stage boundary by writing 5 to
+  /proc/self/clear_refs; where that is unavailable the field is None
+* process_peak_rss_mb: the process's high-water resident set size up to the end of the stage
+* rss_growth_mb: how much the current resident set grew during the stage
+
+`profile_run` runs a script (or any callable) under a recorder and returns the JSON
+record of the run, optionally with a cProfile dump or a sampled, flamegraph-ready
+stack profile ("collapsed" format, one `frame;frame;... count` line per stack).
+`make_figures.py --profile-json` profiles every figure; other jobs are profiled with
+this module's CLI (from `scripts/`):
+
+    python profiling.py --json ../profiles/aggregate.json local_aggregate.py --starlink ... --baseline ... --out-dir ...
+    python profiling.py --json fig4.json --cprofile fig4.prof fig4_disparity_protocol.py
+    python profiling.py --json fig3.json --sample fig3.folded fig3_rural_insecure_os.py
+"""
+import argparse
+import contextlib
+import cProfile
+import datetime
+import json
+import os
+import platform
+import resource
+import runpy
+import signal
+import sys
+import time
+import traceback
+from collections import Counter
+
+STAGES = ('load', 'transform', 'stats', 'render', 'save')
+SAMPLE_INTERVAL = 0.005
+
+_recorder = None  # the active StageRecorder, if any
+
+
+def peak_rss_mb():
+    """High-water resident set size of this process since start or the last reset_peak_rss().
+
+    Read from VmHWM in /proc/self/status where available, else ru_maxrss (KiB on Linux,
+    bytes on macOS).
+    """
+    try:
+        with open('/proc/self/status', 'r') as file:
+            for line in file:
+                if line.startswith('VmHWM:'):
+                    return int(line.split()[1]) / 2 ** 10
+    except (OSError, ValueError, IndexError):
+        pass
+    peak = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss
+    return peak / 2 ** 20 if sys.platform == 'darwin' else peak / 2 ** 10
+
+
+def reset_peak_rss():
+    """Resets the high-water mark to the current resident set (Linux 4.0+); False where unsupported."""
+    try:
+        with open('/proc/self/clear_refs', 'w') as file:
+            file.write('5')
+        return True
+    except OSError:
+        return False
+
+
+def current_rss_mb():
+    """Current resident set size, where /proc is available (None elsewhere)."""
+    try:
+        with open('/proc/self/statm', 'r') as file:
+            return int(file.read().split()[1]) * os.sysconf('SC_PAGE_SIZE') / 2 ** 20
+    except (OSError, ValueError, IndexError):
+        return None
+
+
+class StageRecorder:
+    """Splits a run into consecutive named stages and measures each one."""
+
+    def __init__(self, job, first_stage='load'):
+        self.job = job
+        self.stages = list()
+        self.started_at = datetime.datetime.now(datetime.timezone.utc).isoformat(timespec='seconds')
+        # Resetting the high-water mark also lowers ru_maxrss, so the process peak is tracked here
+        self._process_peak = peak_rss_mb()
+        self._per_stage_peak = reset_peak_rss()
+        self._start = self._snapshot()
+        self._stage = first_stage
+        self._stage_start = self._start
+
+    @staticmethod
+    def _snapshot():
+        return time.perf_counter(), time.process_time(), current_rss_mb()
+
+    def mark(self, stage):
+        """Ends the current stage and starts `stage`."""
+        now = self._snapshot()
+        wall, cpu, rss = (end - start if start is not None and end is not None else None
+                          for start, end in zip(self._stage_start, now))
+        stage_peak = peak_rss_mb()
+        self._process_peak = max(self._process_peak, stage_peak)
+        self.stages.append({'stage': self._stage,
+                            'wall_seconds': round(wall, 6),
+                            'cpu_seconds': round(cpu, 6),
+                            'peak_rss_mb': round(stage_peak, 2) if self._per_stage_peak else None,
+                            'process_peak_rss_mb': round(self._process_peak, 2),
+                            'rss_growth_mb': None if rss is None else round(rss, 2)})
+        if self._per_stage_peak:
+            reset_peak_rss()
+        self._stage = stage
+        self._stage_start = now
+
+    def finish(self, error=None):
+        """Closes the last stage and returns the run as a JSON-serializable dict."""
+        self.mark(None)
+        end = self._snapshot()
+        totals = Counter()
+        for record in self.stages:
+            totals[record['stage']] += record['wall_seconds']
+        return {'job': self.job,
+                'started_at': self.started_at,
+                'host': platform.node(),
+                'python': platform.python_version(),
+                'pid': os.getpid(),
+                'wall_seconds': round(end[0] - self._start[0], 6),
+                'cpu_seconds': round(end[1] - self._start[1], 6),
+                'peak_rss_mb': round(max(self._process_peak, peak_rss_mb()), 2),
+                'stage_wall_seconds': {stage: round(seconds, 6) for stage, seconds in totals.items()},
+                'stages': self.stages,
+                'error': error}
+
+
+def mark(stage):
+    """Starts a new stage of the current profiled run; a no-op otherwise."""
+    if _recorder is not None:
+        _recorder.mark(stage)
+
+
+# --- Hot-spot hooks ---
+
+class StackSampler:
+    """Statistical profiler: samples the main thread's Python stack on a CPU-time timer."""
+
+    def __init__(self, interval=SAMPLE_INTERVAL):
+        self.interval = interval
+        self.stacks = Counter()
+
+    def _sample(self, signum, frame):
+        names = list()
+        while frame is not None:
+            code = frame.f_code
+            names.append(f'{os.path.basename(code.co_filename)}:{code.co_name}:{frame.f_lineno}')
+            frame = frame.f_back
+        self.stacks[';'.join(reversed(names))] += 1
+
+    def __enter__(self):
+        self._previous = signal.signal(signal.SIGPROF, self._sample)
+        signal.setitimer(signal.ITIMER_PROF, self.interval, self.interval)
+        return self
+
+    def __exit__(self, *exc):
+        signal.setitimer(signal.ITIMER_PROF, 0, 0)
+        signal.signal(signal.SIGPROF, self._previous)
+        return False
+
+    def write(self, path):
+        """Writes the samples in collapsed-stack format (flamegraph.pl, speedscope)."""
+        with open(path, 'w') as file:
+            for stack, count in self.stacks.most_common():
+                file.write(f'{stack} {count}\n')
+
+
+@contextlib.contextmanager
+def _hotspot_hook(cprofile_path=None, sample_path=None):
+    """cProfile and/or stack sampling around the body, written out even if it raises."""
+    profiler = cProfile.Profile() if cprofile_path else None
+    sampler = StackSampler() if sample_path else None
+    try:
+        with sampler if sampler else contextlib.nullcontext():
+            if profiler:
+                profiler.enable()
+            try:
+                yield
+            finally:
+                if profiler:
+                    profiler.disable()
+    finally:
+        if profiler:
+            profiler.dump_stats(cprofile_path)
+        if sampler:
+            sampler.write(sample_path)
+
+
+def profile_run(job, target, cprofile_path=None, sample_path=None):
+    """Runs target (a script path run as __main__, or a callable) and returns its stage record.
+
+    Exceptions are caught and reported in the record's 'error' field; KeyboardInterrupt
+    propagates (after the previous recorder is restored), so an interrupted batch stops.
+    """
+    global _recorder
+    previous, _recorder = _recorder, StageRecorder(job)
+    error = None
+    try:
+        with _hotspot_hook(cprofile_path, sample_path):
+            if callable(target):
+                target()
+            else:
+                runpy.run_path(target, run_name='__main__')
+    except SystemExit as exc:
+        if exc.code not in (None, 0):
+            error = traceback.format_exc()
+    except Exception:
+        error = traceback.format_exc()
+    finally:
+        recorder, _recorder = _recorder, previous
+    return recorder.finish(error)
+
+
+def write_json(path, record):
+    directory = os.path.dirname(path)
+    if directory:
+        os.makedirs(directory, exist_ok=True)
+    with open(path, 'w') as file:
+        json.dump(record, file, indent=2)
+
+
+def format_stages(record):
+    """One line per stage, for printing next to a job's output."""
+    def peak(r):
+        if r['peak_rss_mb'] is None:
+            return f"{r['process_peak_rss_mb']:9.1f} MiB process peak"
+        return f"{r['peak_rss_mb']:9.1f} MiB peak"
+
+    return '\n'.join(f"  {r['stage']:<10} {r['wall_seconds']:8.3f}s wall {r['cpu_seconds']:8.3f}s cpu {peak(r)}"
+                     for r in record['stages'])
+
+
+if __name__ == '__main__':
+    parser = argparse.ArgumentParser(description='Run a script with per-stage timing and memory instrumentation.')
+    parser.add_argument('--json', required=True, help='Where to write the run record')
+    parser.add_argument('--cprofile', default=None, help='Also write a cProfile dump (pstats/snakeviz) here')
+    parser.add_argument('--sample', default=None, help='Also write sampled stacks (collapsed format) here')
+    parser.add_argument('script', help='Script to run as __main__')
+    parser.add_argument('args', nargs=argparse.REMAINDER, help="The script's own arguments")
+    args = parser.parse_args()
+
+    # Scripts import this module as `profiling`; make that the module holding the recorder
+    sys.modules.setdefault('profiling', sys.modules[__name__])
+    sys.argv = [args.script] + args.args
+    sys.path.insert(0, os.path.dirname(os.path.abspath(args.script)))
+    run_record = profile_run(os.path.basename(args.script), args.script, args.cprofile, args.sample)
+    write_json(args.json, run_record)
+    print(format_stages(run_record), file=sys.stderr)
+    if run_record['error']:
+        print(run_record['error'], file=sys.stderr)
+        raise SystemExit(1)
@@ -0,0 +1,88 @@
+"""
+Batched one-sided tests of "Starlink proportion > baseline proportion".
+
+Every function takes whole arrays of counts (x1 successes out of n1 for Starlink, x2
+out of n2 for the baseline), so the same code runs per country, per ASN or per /24
+without a Python loop over cells.
+"""
+import numpy as np
+from scipy.stats import binom, hypergeom, norm
+
+
+def _as_arrays(*arrays):
+    return [np.asarray(a, dtype=np.int64) for a in arrays]
+
+
+def ztest_greater(x1, n1, x2, n2):
+    """One-tailed pooled two-proportion z-test; returns (z_stat, p_value) arrays.
+
+    Cells with zero pooled standard error get z = NaN and p = 1, as in fig6.
+    """
+    x1, n1, x2, n2 = _as_arrays(x1, n1, x2, n2)
+    with np.errstate(divide='ignore', invalid='ignore'):
+        p1 = x1 / n1
+        p2 = x2 / n2
+        p_pool = (x1 + x2) / (n1 + n2)
+        se = np.sqrt(p_pool * (1 - p_pool) * (1 / n1 + 1 / n2))
+        z_stat = np.where(se > 0, (p1 - p2) / se, np.nan)
+    p_value = np.where(np.isnan(z_stat), 1.0, norm.sf(z_stat))
+    return z_stat, p_value
+
+
+def fisher_greater(x1, n1, x2, n2):
+    """Exact right-tailed Fisher p-values for the tables [[x1, n1 - x1], [x2, n2 - x2]].
+
+    Same value as scipy's fisher_exact(..., alternative='greater'): the hypergeometric
+    upper tail P(X >= x1), evaluated for all cells in one call.
+    """
+    x1, n1, x2, n2 = _as_arrays(x1, n1, x2, n2)
+    p_value = hypergeom.sf(x1 - 1, n1 + n2, n1, x1 + x2)
+    return np.minimum(p_value, 1.0)
+
+
+def binomial_greater(x, n, p):
+    """Exact one-tailed binomial p-values P(X >= x) for X ~ Bin(n, p), one per cell.
+
+    x = 0 is evaluated as P(X >= 1), as NA_os_cve_binomial_comparison.py always has. Cells
+    with an unknown rate p (NaN) get NaN.
+    """
+    x, n = _as_arrays(x, n)
+    p = np.asarray(p, dtype=float)
+    return binom.sf(np.maximum(x - 1, 0), n, p)
+
+
+def benjamini_hochberg(p_values):
+    """Benjamini-Hochberg adjusted q-values; NaN p-values stay NaN and are not counted."""
+    p_values = np.asarray(p_values, dtype=float)
+    q_values = np.full(p_values.shape, np.nan)
+    valid = np.flatnonzero(~np.isnan(p_values))
+    if len(valid) == 0:
+        return q_values
+
+    order = valid[np.argsort(p_values[valid], kind='stable')]
+    ranks = np.arange(1, len(order) + 1)
+    scaled = p_values[order] * len(order) / ranks
+    # Enforce monotonicity from the largest p-value down
+    q_values[order] = np.minimum(np.minimum.accumulate(scaled[::-1])[::-1], 1.0)
+    return q_values
+
+
+def compare_proportions_batch(x1, n1, x2, n2, fisher_below=30):
+    """Tests every cell at once: Fisher's exact test where n1 < fisher_below, the z-test elsewhere.
+
+    Returns a dict of arrays: z_stat (NaN for Fisher cells), p_value, test_used and
+    q_value (Benjamini-Hochberg across all cells).
+    """
+    x1, n1, x2, n2 = _as_arrays(x1, n1, x2, n2)
+    use_fisher = n1 < fisher_below
+
+    z_stat, p_value = ztest_greater(x1, n1, x2, n2)
+    z_stat[use_fisher] = np.nan
+    p_value[use_fisher] = fisher_greater(x1[use_fisher], n1[use_fisher], x2[use_fisher], n2[use_fisher])
+
+    return {
+        'z_stat': z_stat,
+        'p_value': p_value,
+        'test_used': np.where(use_fisher, 'fisher', 'z'),
+        'q_value': benjamini_hochberg(p_value),
+    }
@@ -0,0 +1,142 @@
+"""
+Uncertainty intervals for Starlink/baseline rate ratios, for every cell at once.
+
+The insecure ratio (starlink_insecure_rate / all_insecure_rate) is a point estimate,
+and many Starlink cells are tiny (Niger has 4 services). Both methods here draw all
+resamples for a block of cells as one (cells x draws) NumPy array:
+
+* `bootstrap_intervals`: percentile bootstrap. Resampling n services of which x are
+  insecure is a Binomial(n, x / n) draw, so no per-row loop is needed. Cells with no
+  services on either side (common in per-ASN or per-/24 grids) get NaN bounds, like
+  their point ratio.
+* `beta_binomial_intervals`: each rate gets a Beta posterior (Jeffreys prior by
+  default) and the interval is the equal-tailed quantile range of the ratio of
+  posterior draws, with P(ratio > 1) alongside.
+
+Cells are processed in fixed-size chunks, each with its own child seed, so results are
+reproducible for a given seed whether the chunks run serially or on a process pool.
+
+Run from `scripts/` for the per-country intervals of insecure_hosts.csv:
+
+    python ratio_intervals.py --method beta --draws 20000
+"""
+import argparse
+from functools import partial
+from multiprocessing import Pool
+
+import numpy as np
+import pandas as pd
+
+# Cells x draws per chunk, so a chunk's draws stay around 32 MB of float64
+CHUNK_ELEMENTS = 1 << 22
+
+
+def _as_arrays(*arrays):
+    return [np.asarray(a, dtype=np.int64) for a in arrays]
+
+
+def _ratio_quantiles(ratios, level):
+    """Per-row (lower, median, upper) of ratio draws; inf where the baseline draw was 0."""
+    alpha = (1 - level) / 2
+    # inverted_cdf picks actual draws, so infinite ratios never get interpolated into NaN
+    lower, median, upper = np.quantile(ratios, [alpha, 0.5, 1 - alpha], axis=1, method='inverted_cdf')
+    return lower, median, upper
+
+
+def _bootstrap_chunk(cells, draws, level, seed):
+    x1, n1, x2, n2 = cells
+    rng = np.random.default_rng(seed)
+    # An empty cell (n == 0) has no rate to resample: draw it with p = 0 and report NaN bounds
+    empty = (n1 == 0) | (n2 == 0)
+    with np.errstate(divide='ignore', invalid='ignore'):
+        p1 = rng.binomial(n1[:, None], np.where(n1 > 0, x1 / n1, 0)[:, None], size=(len(x1), draws)) / n1[:, None]
+        p2 = rng.binomial(n2[:, None], np.where(n2 > 0, x2 / n2, 0)[:, None], size=(len(x2), draws)) / n2[:, None]
+        ratios = p1 / p2
+    ratios[np.isnan(ratios)] = 1.0  # 0/0: both resampled rates are zero, so neither side is higher
+    lower, _, upper = _ratio_quantiles(ratios, level)
+    lower[empty] = upper[empty] = np.nan
+    return {'lower': lower, 'upper': upper}
+
+
+def _beta_chunk(cells, draws, level, seed, prior):
+    x1, n1, x2, n2 = cells
+    a, b = prior
+    rng = np.random.default_rng(seed)
+    p1 = rng.beta((x1 + a)[:, None], (n1 - x1 + b)[:, None], size=(len(x1), draws))
+    p2 = rng.beta((x2 + a)[:, None], (n2 - x2 + b)[:, None], size=(len(x2), draws))
+    with np.errstate(divide='ignore'):
+        ratios = p1 / p2
+    lower, median, upper = _ratio_quantiles(ratios, level)
+    return {'lower': lower, 'median': median, 'upper': upper, 'prob_greater': (ratios > 1).mean(axis=1)}
+
+
+def _run_chunked(chunk_fn, x1, n1, x2, n2, draws, seed, processes):
+    """Splits the cells into chunks with spawned seeds, runs them (optionally on a pool), concatenates."""
+    x1, n1, x2, n2 = _as_arrays(x1, n1, x2, n2)
+    cells_per_chunk = max(1, CHUNK_ELEMENTS // draws)
+    starts = range(0, len(x1), cells_per_chunk)
+    chunks = [tuple(a[i:i + cells_per_chunk] for a in (x1, n1, x2, n2)) for i in starts]
+    seeds = np.random.SeedSequence(seed).spawn(len(chunks))
+
+    if processes == 1 or len(chunks) <= 1:
+        results = [chunk_fn(chunk, seed=child) for chunk, child in zip(chunks, seeds)]
+    else:
+        with Pool(processes) as pool:
+            results = pool.starmap(_call_chunk, [(chunk_fn, chunk, child) for chunk, child in zip(chunks, seeds)])
+    if not results:
+        return dict()
+    return {key: np.concatenate([result[key] for result in results]) for key in results[0]}
+
+
+def _call_chunk(chunk_fn, chunk, seed):
+    return chunk_fn(chunk, seed=seed)
+
+
+def point_ratio(x1, n1, x2, n2):
+    """(x1 / n1) / (x2 / n2), NaN where either rate is undefined and inf where only the baseline rate is 0."""
+    x1, n1, x2, n2 = _as_arrays(x1, n1, x2, n2)
+    with np.errstate(divide='ignore', invalid='ignore'):
+        return (x1 / n1) / (x2 / n2)
+
+
+def bootstrap_intervals(x1, n1, x2, n2, draws=10000, level=0.95, seed=0, processes=1):
+    """Percentile-bootstrap intervals of the rate ratio: a DataFrame of ratio, lower, upper per cell."""
+    chunk_fn = partial(_bootstrap_chunk, draws=draws, level=level)
+    result = _run_chunked(chunk_fn, x1, n1, x2, n2, draws, seed, processes)
+    return pd.DataFrame({'ratio': point_ratio(x1, n1, x2, n2), **result})
+
+
+def beta_binomial_intervals(x1, n1, x2, n2, draws=10000, level=0.95, seed=0, prior=(0.5, 0.5), processes=1):
+    """Beta-posterior intervals of the rate ratio: ratio, lower, median, upper and prob_greater per cell."""
+    chunk_fn = partial(_beta_chunk, draws=draws, level=level, prior=prior)
+    result = _run_chunked(chunk_fn, x1, n1, x2, n2, draws, seed, processes)
+    return pd.DataFrame({'ratio': point_ratio(x1, n1, x2, n2), **result})
+
+
+def insecure_ratio_intervals(data, method='beta', **kwargs):
+    """Intervals for the insecure_ratio of an insecure_hosts-style frame, aligned to its rows."""
+    counts = (data['starlink_insecure'], data['starlink_total'], data['all_insecure'], data['all_total'])
+    intervals = beta_binomial_intervals(*counts, **kwargs) if method == 'beta' else bootstrap_intervals(*counts, **kwargs)
+    intervals.index = data.index
+    return intervals
+
+
+if __name__ == '__main__':
+    from profiling import mark
+    from snapshot_store import load_frame
+
+    parser = argparse.ArgumentParser(description='Intervals for the per-country Starlink/baseline insecure ratio.')
+    parser.add_argument('--method', choices=['beta', 'bootstrap'], default='beta')
+    parser.add_argument('--draws', type=int, default=10000, help='Resamples / posterior draws per country')
+    parser.add_argument('--level', type=float, default=0.95)
+    parser.add_argument('--seed', type=int, default=0)
+    parser.add_argument('--processes', type=int, default=1)
+    args = parser.parse_args()
+
+    hosts = load_frame('insecure_hosts').dropna(subset=['starlink_total', 'all_total'])
+    mark('stats')
+    table = insecure_ratio_intervals(hosts, args.method, draws=args.draws, level=args.level, seed=args.seed,
+                                     processes=args.processes)
+    table.insert(0, 'country_name', hosts['country_name'])
+    table.insert(1, 'starlink_total', hosts['starlink_total'].astype(int))
+    print(table.sort_values('ratio', ascending=False).to_string(index=False, float_format='{:.3f}'.format))
@@ -0,0 +1,143 @@
+"""
+Ordinary least squares with closed-form influence diagnostics and vectorized bootstraps.
+
+Everything leave-one-out comes from the diagonal of the hat matrix H = X (X'X)^-1 X',
+read off a single QR decomposition, instead of refitting once per country:
+
+* leave-one-out (PRESS) residuals   e_i / (1 - h_i)
+* internally studentized residuals  e_i / (s sqrt(1 - h_i))
+* externally studentized residuals  e_i / (s_(i) sqrt(1 - h_i)), with s_(i) from the
+  leave-one-out variance identity
+* Cook's distance                   e_i^2 h_i / (p s^2 (1 - h_i)^2)
+
+`bootstrap_coefficients` resamples countries (pairs) or residuals for all draws at once:
+pairs resamples become per-draw observation weights, so every draw's normal equations
+are one einsum and one batched solve.
+
+Run from `scripts/` to fit the insecure ratio on wealth, inequality and rurality:
+
+    python regression_diagnostics.py
+"""
+import numpy as np
+import pandas as pd
+
+
+def design_matrix(df, columns, intercept=True):
+    """The model matrix for the given covariate columns, with a leading column of ones."""
+    X = df[list(columns)].to_numpy(dtype=float)
+    if intercept:
+        X = np.column_stack([np.ones(len(X)), X])
+    return X
+
+
+class OLSFit:
+    """A least-squares fit of y on X with its influence diagnostics."""
+
+    def __init__(self, X, y, names=None):
+        self.X = np.asarray(X, dtype=float)
+        self.y = np.asarray(y, dtype=float)
+        n, p = self.X.shape
+        self.names = list(names) if names is not None else [f'x{i}' for i in range(p)]
+
+        Q, R = np.linalg.qr(self.X)
+        self.coef = np.linalg.solve(R, Q.T @ self.y)
+        self.fitted = self.X @ self.coef
+        self.residuals = self.y - self.fitted
+        self.leverage = np.einsum('ij,ij->i', Q, Q)   # diag(H) = row norms of Q
+        self.dof = n - p
+        self.sigma2 = self.residuals @ self.residuals / self.dof
+
+    def predict(self, X):
+        return np.asarray(X, dtype=float) @ self.coef
+
+    def r_squared(self):
+        total = self.y - self.y.mean()
+        return 1 - (self.residuals @ self.residuals) / (total @ total)
+
+    def loo_residuals(self):
+        """Residual of each observation under the fit that leaves it out."""
+        return self.residuals / (1 - self.leverage)
+
+    def studentized_residuals(self, external=True):
+        """Studentized residuals; external ones use the leave-one-out error variance."""
+        h, e = self.leverage, self.residuals
+        if external:
+            sigma2 = (self.dof * self.sigma2 - e ** 2 / (1 - h)) / (self.dof - 1)
+        else:
+            sigma2 = self.sigma2
+        return e / np.sqrt(sigma2 * (1 - h))
+
+    def cooks_distance(self):
+        h, e = self.leverage, self.residuals
+        return e ** 2 * h / (self.X.shape[1] * self.sigma2 * (1 - h) ** 2)
+
+    def diagnostics(self, index=None):
+        """Every per-observation diagnostic as a DataFrame."""
+        return pd.DataFrame({
+            'fitted': self.fitted,
+            'residual': self.residuals,
+            'leverage': self.leverage,
+            'loo_residual': self.loo_residuals(),
+            'studentized_residual': self.studentized_residuals(),
+            'cooks_distance': self.cooks_distance(),
+        }, index=index)
+
+
+def fit_ols(df, y_column, covariates, intercept=True):
+    """Fits y_column on the covariate columns of df (rows with missing values must be dropped first)."""
+    names = (['intercept'] if intercept else []) + list(covariates)
+    return OLSFit(design_matrix(df, covariates, intercept), df[y_column], names)
+
+
+def bootstrap_coefficients(fit, draws=10000, kind='pairs', seed=0):
+    """A (draws x coefficients) array of bootstrap coefficient estimates, computed in one batch.
+
+    kind='pairs' resamples observations (robust to heteroscedasticity); kind='residual'
+    keeps X fixed and resamples residuals onto the fitted values.
+    """
+    rng = np.random.default_rng(seed)
+    X, n = fit.X, len(fit.y)
+    if kind == 'residual':
+        y_star = fit.fitted + fit.residuals[rng.integers(0, n, size=(draws, n))]
+        return np.linalg.lstsq(X, y_star.T, rcond=None)[0].T
+    if kind != 'pairs':
+        raise ValueError(f"Unknown bootstrap kind '{kind}', expected 'pairs' or 'residual'")
+
+    # How often each observation is drawn in each resample, as regression weights
+    weights = rng.multinomial(n, np.full(n, 1.0 / n), size=draws).astype(float)
+    xtx = np.einsum('bn,np,nq->bpq', weights, X, X)
+    xty = np.einsum('bn,np,n->bp', weights, X, fit.y)
+    # pinv tolerates the rare resample whose X'X is singular (e.g. one distinct country)
+    return np.einsum('bpq,bq->bp', np.linalg.pinv(xtx), xty)
+
+
+def coefficient_intervals(fit, samples, level=0.95):
+    """Point estimates with percentile intervals from bootstrap_coefficients output."""
+    alpha = (1 - level) / 2
+    lower, upper = np.quantile(samples, [alpha, 1 - alpha], axis=0)
+    return pd.DataFrame({'coef': fit.coef, 'lower': lower, 'upper': upper, 'std_error': samples.std(axis=0, ddof=1)},
+                        index=fit.names)
+
+
+if __name__ == '__main__':
+    from comparison_frame import ComparisonFrame
+    from covariates import load_covariates
+    from snapshot_store import load_frame
+
+    hosts = load_frame('insecure_hosts_plus')
+    hosts['insecure_ratio'] = ComparisonFrame.from_paired_columns(hosts).ratio('insecure_rate')
+    hosts = hosts.dropna().reset_index(drop=True)
+    covariate_frame = load_covariates().frame_for(hosts['country'])
+    hosts['log_median_wealth'] = np.log10(covariate_frame['Median'])
+    hosts['gini'] = pd.to_numeric(covariate_frame['Gini %'], errors='coerce')
+    hosts['rurality'] = covariate_frame['rurality']
+
+    model_columns = ['log_median_wealth', 'gini', 'rurality']
+    complete = hosts.dropna(subset=model_columns + ['insecure_ratio']).reset_index(drop=True)
+    ols = fit_ols(complete, 'insecure_ratio', model_columns)
+    print(f"n = {len(complete)}, R² = {ols.r_squared():.3f}")
+    print(coefficient_intervals(ols, bootstrap_coefficients(ols)).to_string(float_format='{:.3f}'.format))
+
+    influence = ols.diagnostics(index=complete['country_name'])
+    print("\nMost influential countries (Cook's distance):")
+    print(influence.nlargest(5, 'cooks_distance').to_string(float_format='{:.3f}'.format))
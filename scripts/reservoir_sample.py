@@ -0,0 +1,136 @@
+"""
+One-pass, sharded replacement for `data/sql/sample_all_hosts/sample-all-hosts.sql`.
+
+The SQL draws k hosts per country with `ROW_NUMBER() OVER (PARTITION BY location.country
+ORDER BY RAND())`, which sorts the whole host table. Here every host gets a pseudo-random
+key from a seeded hash of its IPv4, and each stratum keeps the k hosts with the smallest
+keys in a bounded heap while the records stream past. That is the same uniform
+without-replacement sample, in memory proportional to strata x k. Because the keys
+depend only on (seed, IPv4), shard reservoirs merge by keeping the k smallest keys, the
+result does not depend on how the input was split, and rerunning with the same seed on
+a later snapshot keeps every host that is still present and still ranks in the top k.
+
+Usage (from `scripts/`):
+
+    python reservoir_sample.py --hosts snapshot-*.json.gz --out sample.json.gz --k 10000 --seed 20250407
+    python reservoir_sample.py --hosts snapshot-*.json.gz --out by_asn.json.gz --strata autonomous_system.asn
+"""
+import argparse
+import heapq
+import json
+from functools import partial
+from multiprocessing import Pool
+
+from hll import hash64
+from local_aggregate import get_field, iter_host_records, open_records
+
+DEFAULT_STRATA = 'location.country'
+
+
+def sample_key(seed, ip):
+    """The host's position in the seeded random order, in [0, 1)."""
+    return hash64(f'{seed}:{ip}') / 2.0 ** 64
+
+
+class StratifiedReservoir:
+    """The k smallest-keyed records of every stratum seen so far."""
+
+    def __init__(self, k, seed=0, strata=DEFAULT_STRATA):
+        self.k = k
+        self.seed = seed
+        self.strata = strata
+        self.path = strata.split('.')
+        self.reservoirs = dict()  # stratum -> heap of (-key, ip, record): the largest kept key on top
+        self.kept_ips = dict()    # stratum -> IPs in its heap, so a host seen twice is kept once
+        self.seen = 0
+
+    def offer(self, key, ip, record):
+        """Keeps the record if its key is among the k smallest of its stratum."""
+        stratum = get_field(record, *self.path)
+        heap = self.reservoirs.setdefault(stratum, list())
+        kept = self.kept_ips.setdefault(stratum, set())
+        if ip in kept:
+            return
+        if len(heap) < self.k:
+            heapq.heappush(heap, (-key, ip, record))
+        elif key < -heap[0][0]:
+            kept.discard(heapq.heapreplace(heap, (-key, ip, record))[1])
+        else:
+            return
+        kept.add(ip)
+
+    def add(self, record):
+        self.seen += 1
+        ip = get_field(record, 'host_identifier', 'ipv4')
+        self.offer(sample_key(self.seed, ip), ip, record)
+
+    def merge(self, other):
+        """Folds in another reservoir built with the same k, seed and strata (e.g. from another shard)."""
+        if (other.k, other.seed, other.strata) != (self.k, self.seed, self.strata):
+            raise ValueError("Reservoirs must share k, seed and strata to be merged")
+        self.seen += other.seen
+        for heap in other.reservoirs.values():
+            for neg_key, ip, record in heap:
+                self.offer(-neg_key, ip, record)
+        return self
+
+    def rows(self):
+        """Sampled records per stratum in key order, with the SQL's row_num (1..k) added."""
+        for stratum in sorted(self.reservoirs, key=lambda s: (s is None, str(s))):
+            ranked = sorted(self.reservoirs[stratum], key=lambda item: (-item[0], item[1]))
+            for row_num, (_, _, record) in enumerate(ranked, start=1):
+                yield dict(record, row_num=row_num)
+
+    def sizes(self):
+        return {stratum: len(heap) for stratum, heap in self.reservoirs.items()}
+
+
+# --- Sharded driver ---
+
+def sample_file(path, k, seed=0, strata=DEFAULT_STRATA):
+    """Samples a single shard file."""
+    reservoir = StratifiedReservoir(k, seed, strata)
+    for record in iter_host_records(path):
+        reservoir.add(record)
+    return reservoir
+
+
+def sample_files(paths, k, seed=0, strata=DEFAULT_STRATA, processes=None):
+    """Samples shard files on a process pool and merges the shard reservoirs."""
+    paths = list(paths)
+    worker = partial(sample_file, k=k, seed=seed, strata=strata)
+    if processes == 1 or len(paths) <= 1:
+        partials = map(worker, paths)
+    else:
+        with Pool(processes) as pool:
+            partials = pool.map(worker, paths)
+    result = StratifiedReservoir(k, seed, strata)
+    for shard in partials:
+        result.merge(shard)
+    return result
+
+
+def write_sample(reservoir, out_path):
+    """Writes the sample as newline-delimited JSON (gzipped if out_path ends in .gz); returns the row count."""
+    count = 0
+    with open_records(out_path, 'w') as file:
+        for row in reservoir.rows():
+            file.write(json.dumps(row) + '\n')
+            count += 1
+    return count
+
+
+if __name__ == '__main__':
+    parser = argparse.ArgumentParser(description='Draw k hosts per stratum from Censys host exports in one pass.')
+    parser.add_argument('--hosts', nargs='+', required=True, help='Host export shards (NDJSON[.gz])')
+    parser.add_argument('--out', required=True, help='Output NDJSON[.gz] with the sampled records and row_num')
+    parser.add_argument('--k', type=int, default=10000, help='Hosts per stratum (default: 10000, as in the SQL)')
+    parser.add_argument('--seed', type=int, default=0, help='Seed of the random order')
+    parser.add_argument('--strata', default=DEFAULT_STRATA,
+                        help='Dotted record field to stratify by, e.g. location.continent or autonomous_system.asn')
+    parser.add_argument('--processes', type=int, default=None, help='Worker processes (default: all cores)')
+    args = parser.parse_args()
+
+    sample = sample_files(args.hosts, args.k, args.seed, args.strata, args.processes)
+    n_rows = write_sample(sample, args.out)
+    print(f"Sampled {n_rows} of {sample.seen} hosts across {len(sample.reservoirs)} strata of {args.strata}")
@@ -0,0 +1,152 @@
+"""
+Binned smoothers for scatter plots with many points (per-region or per-/24 views of fig3).
+
+`sns.kdeplot` evaluates a Gaussian KDE at every grid point from every data point, and
+`lowess` fits one weighted regression per point over its neighbours, so both grow with
+the number of points squared. Here the points are first binned:
+
+* `binned_kde_2d` linearly bins the points onto a grid and convolves the bin counts with
+  the Gaussian kernel by FFT, so the cost depends on the grid size only.
+* `binned_lowess` reduces the points to per-bin weighted sums along x and runs the
+  local-linear fits (with the usual bisquare robustness iterations) at the bin centres,
+  so each pass costs O(bins^2 + points).
+
+`plot_kde` and `plot_lowess` draw the results like the seaborn/statsmodels calls they
+replace; fig3 switches to them above `BINNED_THRESHOLD` points.
+"""
+import numpy as np
+from scipy.signal import fftconvolve
+
+BINNED_THRESHOLD = 5000
+
+
+# --- 2-D KDE ---
+
+def _linear_bin(x, y, x_edges, y_edges):
+    """Spreads each point over the 4 surrounding grid nodes, weighted by proximity."""
+    nx, ny = len(x_edges), len(y_edges)
+    fx = (x - x_edges[0]) / (x_edges[1] - x_edges[0])
+    fy = (y - y_edges[0]) / (y_edges[1] - y_edges[0])
+    ix = np.clip(np.floor(fx).astype(np.intp), 0, nx - 2)
+    iy = np.clip(np.floor(fy).astype(np.intp), 0, ny - 2)
+    wx = np.clip(fx - ix, 0, 1)
+    wy = np.clip(fy - iy, 0, 1)
+    grid = np.zeros((nx, ny))
+    for dx, weight_x in ((0, 1 - wx), (1, wx)):
+        for dy, weight_y in ((0, 1 - wy), (1, wy)):
+            np.add.at(grid, (ix + dx, iy + dy), weight_x * weight_y)
+    return grid
+
+
+def binned_kde_2d(x, y, gridsize=128, bw_adjust=1.0, cut=3):
+    """Gaussian KDE of (x, y) on a regular grid; returns (x_grid, y_grid, density[x, y]).
+
+    Bandwidths follow Scott's rule per axis (seaborn's default, without the
+    cross-covariance term); the grid extends `cut` bandwidths past the data like seaborn.
+    """
+    x = np.asarray(x, dtype=float)
+    y = np.asarray(y, dtype=float)
+    n = len(x)
+    scott = n ** (-1 / 6) * bw_adjust
+    bw = np.array([x.std(ddof=1), y.std(ddof=1)]) * scott
+
+    x_grid = np.linspace(x.min() - cut * bw[0], x.max() + cut * bw[0], gridsize)
+    y_grid = np.linspace(y.min() - cut * bw[1], y.max() + cut * bw[1], gridsize)
+    counts = _linear_bin(x, y, x_grid, y_grid)
+
+    # Kernel sampled on the same grid spacing, out to 4 bandwidths
+    step = np.array([x_grid[1] - x_grid[0], y_grid[1] - y_grid[0]])
+    half = np.minimum(np.ceil(4 * bw / step).astype(int), gridsize - 1)
+    kx = np.exp(-0.5 * (np.arange(-half[0], half[0] + 1) * step[0] / bw[0]) ** 2)
+    ky = np.exp(-0.5 * (np.arange(-half[1], half[1] + 1) * step[1] / bw[1]) ** 2)
+    kernel = np.outer(kx, ky) / (2 * np.pi * bw[0] * bw[1])
+
+    density = np.maximum(fftconvolve(counts, kernel, mode='same'), 0) / n
+    return x_grid, y_grid, density
+
+
+def iso_proportion_levels(density, levels=5, thresh=0.05):
+    """Density values enclosing 1 - q of the mass for evenly spaced q in [thresh, 1], as seaborn draws them."""
+    values = np.sort(density.ravel())
+    mass = np.cumsum(values)
+    mass /= mass[-1]
+    quantiles = np.linspace(thresh, 1, levels)
+    return values[np.minimum(np.searchsorted(mass, quantiles), len(values) - 1)]
+
+
+def plot_kde(ax, x, y, log_y=False, levels=5, fill=True, gridsize=128, **kwargs):
+    """Filled/line contours of binned_kde_2d, estimated in log10(y) space when log_y is set."""
+    y = np.log10(y) if log_y else np.asarray(y, dtype=float)
+    x_grid, y_grid, density = binned_kde_2d(x, y, gridsize)
+    contour_levels = iso_proportion_levels(density, levels)
+    y_plot = 10 ** y_grid if log_y else y_grid
+    draw = ax.contourf if fill else ax.contour
+    return draw(x_grid, y_plot, density.T, levels=contour_levels, **kwargs)
+
+
+# --- LOWESS ---
+
+def _tricube(u):
+    return np.clip(1 - np.abs(u) ** 3, 0, None) ** 3
+
+
+def binned_lowess(x, y, frac=2 / 3, it=3, bins=200):
+    """LOWESS on x-binned sufficient statistics; returns (x_centres, smoothed y) sorted by x.
+
+    Each non-empty bin is one evaluation point at its mean x. Neighbourhoods hold the
+    nearest `frac` of the points (counted through the bins), and the robustness weights
+    are recomputed per point from residuals against the interpolated fit, as in lowess.
+    """
+    x = np.asarray(x, dtype=float)
+    y = np.asarray(y, dtype=float)
+    n = len(x)
+    edges = np.linspace(x.min(), x.max(), bins + 1)
+    bin_of = np.clip(np.searchsorted(edges, x, side='right') - 1, 0, bins - 1)
+    occupied, bin_of = np.unique(bin_of, return_inverse=True)
+    n_bins = len(occupied)
+
+    counts = np.bincount(bin_of, minlength=n_bins).astype(float)
+    centres = np.bincount(bin_of, weights=x, minlength=n_bins) / counts
+
+    # Neighbourhood radius per centre: distance to the k-th nearest point, k = frac * n
+    k = int(np.ceil(frac * n))
+    distance = np.abs(centres[:, None] - centres[None, :])
+    order = np.argsort(distance, axis=1)
+    reach = np.cumsum(counts[order], axis=1)
+    kth = np.argmax(reach >= k, axis=1)
+    radius = np.maximum(distance[np.arange(n_bins), order[np.arange(n_bins), kth]], 1e-12)
+    kernel = _tricube(distance / radius[:, None])
+
+    robustness = np.ones(n)
+    for iteration in range(it + 1):
+        w = robustness
+        s0 = np.bincount(bin_of, weights=w, minlength=n_bins)
+        s1 = np.bincount(bin_of, weights=w * x, minlength=n_bins)
+        s2 = np.bincount(bin_of, weights=w * x * x, minlength=n_bins)
+        t0 = np.bincount(bin_of, weights=w * y, minlength=n_bins)
+        t1 = np.bincount(bin_of, weights=w * x * y, minlength=n_bins)
+
+        # Weighted local-linear fit at every centre, centred on it for stability
+        a0, a1, a2 = kernel @ s0, kernel @ s1, kernel @ s2
+        b0, b1 = kernel @ t0, kernel @ t1
+        mean_x = a1 / a0
+        sxx = a2 / a0 - mean_x ** 2
+        sxy = b1 / a0 - mean_x * b0 / a0
+        slope = np.where(sxx > 1e-12 * np.maximum(mean_x ** 2, 1), sxy / np.where(sxx > 0, sxx, 1), 0.0)
+        smoothed = b0 / a0 + slope * (centres - mean_x)
+
+        if iteration == it:
+            break
+        residuals = y - np.interp(x, centres, smoothed)
+        scale = 6 * np.median(np.abs(residuals))
+        if scale == 0:
+            break
+        robustness = np.clip(1 - (residuals / scale) ** 2, 0, None) ** 2
+    return centres, smoothed
+
+
+def plot_lowess(ax, x, y, log_y=False, frac=2 / 3, it=3, bins=200, **kwargs):
+    """Draws binned_lowess of (x, y), smoothing log10(y) when log_y is set."""
+    y = np.log10(y) if log_y else np.asarray(y, dtype=float)
+    x_smooth, y_smooth = binned_lowess(x, y, frac, it, bins)
+    return ax.plot(x_smooth, 10 ** y_smooth if log_y else y_smooth, **kwargs)
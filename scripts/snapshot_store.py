@@ -0,0 +1,224 @@
+"""
+Typed, columnar snapshots of every raw input under `data/raw/`.
+
+Each input is parsed once (JSON exports converted to numbers, `affluent.csv` cleaned
+of its thousands separators and "(est.)" markers, a categorical `country_id` added from
+`country_keys`) and written as an uncompressed Arrow
+IPC file under `data/columnar/`, alongside a `manifest.json` with the SHA-256 of the
+source it was built from. Loading memory-maps the Arrow file, so reopening an input
+costs almost nothing however large the export is.
+
+The scripts call `load_frame(name)`; stale or missing snapshots are rebuilt on the fly.
+To (re)build everything up front, run from `scripts/`:
+
+    python snapshot_store.py
+"""
+import hashlib
+import json
+import os
+
+import pandas as pd
+import pyarrow as pa
+
+DATA_DIR = os.path.join(os.path.dirname(os.path.abspath(__file__)), '..', 'data')
+RAW_DIR = os.path.join(DATA_DIR, 'raw')
+STORE_DIR = os.path.join(DATA_DIR, 'columnar')
+MANIFEST_PATH = os.path.join(STORE_DIR, 'manifest.json')
+# Bump whenever a parser changes so existing snapshots are rebuilt
+STORE_VERSION = 3
+
+
+# --- Parsers (raw file -> typed DataFrame) ---
+
+def parse_csv(path):
+    """Reads a plain CSV export."""
+    return pd.read_csv(path)
+
+
+def parse_csv_with_codes(*code_columns):
+    """Returns a CSV parser that keeps country-code columns as text, so Namibia's 'NA' is not read as missing."""
+    def parse(path):
+        df = pd.read_csv(path)
+        codes = pd.read_csv(path, usecols=list(code_columns), dtype=str, keep_default_na=False)
+        for column in code_columns:
+            df[column] = codes[column].replace('', None)
+        return df
+    return parse
+
+
+def parse_bq_json(numeric_columns):
+    """Returns a parser for a BigQuery JSON export, whose values all come back as strings."""
+    def parse(path):
+        with open(path, 'r') as file:
+            df = pd.DataFrame(json.load(file))
+        for column, dtype in numeric_columns.items():
+            df[column] = df[column].astype(dtype)
+        return df
+    return parse
+
+
+def parse_affluent(path):
+    """Reads affluent.csv and converts its quoted, comma-separated figures to numbers."""
+    df = pd.read_csv(path)
+    df.columns = df.columns.str.replace('\xa0', ' ')  # header reads 'Gini\xa0%'
+    for column in ('Adults', 'Median', 'Mean'):
+        # Remove quotes, thousands separators and estimate markers, e.g. '"17,280 (est.)"'
+        cleaned = (df[column].astype(str)
+                   .str.replace('"', '')
+                   .str.replace(',', '')
+                   .str.replace(r'\s*\(est\.\)', '', regex=True))
+        df[column] = pd.to_numeric(cleaned, errors='coerce')
+    return df
+
+
+OS_CVE_COLUMNS = {'hosts_with_cve': 'int64', 'host_count': 'int64', 'percentage_with_cve': 'float64'}
+OS_SHARE_COLUMNS = {'percentage_share': 'float64', 'count': 'int64'}
+
+# name -> (path relative to data/raw, parser, columns identifying the country in priority order)
+INPUTS = {
+    'insecure_hosts': ('insecure_hosts/insecure_hosts.csv', parse_csv_with_codes('country'),
+                       ('country', 'country_name')),
+    'insecure_hosts_plus': ('insecure_hosts/insecure_hosts_plus.csv', parse_csv_with_codes('country'),
+                            ('country', 'country_name')),
+    'nonstandard_ports_starlink': ('non_IANA_ports/nonstandard_ports_starlink.csv', parse_csv, ('country',)),
+    'nonstandard_ports_baseline': ('non_IANA_ports/nonstandard_ports_baseline.csv', parse_csv, ('country',)),
+    'cdf_open_ports_starlink': ('cdf_open_ports/csv_starlink.csv', parse_csv, ()),
+    'cdf_open_ports_baseline': ('cdf_open_ports/csv_baseline.csv', parse_csv, ()),
+    'os_cve_starlink': ('os_cve_locations/bquxjob_3c73f9c5_1965065a6b9.json', parse_bq_json(OS_CVE_COLUMNS),
+                        ('country_code', 'country')),
+    'os_cve_baseline': ('os_cve_locations/bquxjob_5e7c6743_19650747b04.json', parse_bq_json(OS_CVE_COLUMNS),
+                        ('country_code', 'country')),
+    'os_share_starlink': ('os_share_by_continent/bquxjob_4255453e_19630859374.json',
+                          parse_bq_json(OS_SHARE_COLUMNS), ()),
+    'os_share_baseline': ('os_share_by_continent/bquxjob_7e2fc6cf_196f5df2a7c.json',
+                          parse_bq_json(OS_SHARE_COLUMNS), ()),
+    'affluent': ('affluent/affluent.csv', parse_affluent, ('Location',)),
+}
+
+
+# --- Manifest ---
+
+def file_sha256(path):
+    """Hashes a file in 1 MiB chunks."""
+    digest = hashlib.sha256()
+    with open(path, 'rb') as file:
+        for chunk in iter(lambda: file.read(1 << 20), b''):
+            digest.update(chunk)
+    return digest.hexdigest()
+
+
+def read_manifest():
+    """Returns the manifest dict (empty if nothing has been converted yet)."""
+    if not os.path.exists(MANIFEST_PATH):
+        return dict()
+    with open(MANIFEST_PATH, 'r') as file:
+        return json.load(file)
+
+
+def write_manifest(manifest):
+    os.makedirs(STORE_DIR, exist_ok=True)
+    with open(MANIFEST_PATH, 'w') as file:
+        json.dump(manifest, file, indent=2, sort_keys=True)
+
+
+def use_raw_dir(raw_dir, store_dir=None):
+    """Reads the inputs from another tree laid out like data/raw (e.g. the benchmarks' synthetic inputs).
+
+    Snapshots go to store_dir, by default a `columnar` directory beside raw_dir, so they
+    never replace the ones built from data/raw.
+    """
+    global RAW_DIR, STORE_DIR, MANIFEST_PATH
+    RAW_DIR = os.path.abspath(raw_dir)
+    STORE_DIR = store_dir or os.path.join(os.path.dirname(RAW_DIR), 'columnar')
+    MANIFEST_PATH = os.path.join(STORE_DIR, 'manifest.json')
+    _tables.clear()
+
+
+def source_path(name):
+    return os.path.join(RAW_DIR, INPUTS[name][0])
+
+
+def snapshot_path(name):
+    return os.path.join(STORE_DIR, f'{name}.arrow')
+
+
+def is_fresh(name, entry):
+    """True if the snapshot exists and was built from the current source file by the current parsers.
+
+    Size and mtime are checked first so unchanged sources are never rehashed.
+    """
+    if entry is None or entry.get('version') != STORE_VERSION or not os.path.exists(snapshot_path(name)):
+        return False
+    stat = os.stat(source_path(name))
+    if entry['size'] == stat.st_size and entry['mtime'] == stat.st_mtime:
+        return True
+    return entry['sha256'] == file_sha256(source_path(name))
+
+
+# --- Conversion and loading ---
+
+def convert(name, manifest=None):
+    """Parses one raw input and writes its Arrow snapshot, updating the manifest."""
+    path = source_path(name)
+    _, parser, country_columns = INPUTS[name]
+    df = parser(path)
+    if country_columns:
+        # Imported here since country_keys itself loads inputs through this module
+        from country_keys import add_country_id
+        add_country_id(df, *country_columns)
+    table = pa.Table.from_pandas(df, preserve_index=False)
+
+    os.makedirs(STORE_DIR, exist_ok=True)
+    with pa.OSFile(snapshot_path(name), 'wb') as sink:
+        with pa.ipc.new_file(sink, table.schema) as writer:
+            writer.write_table(table)
+
+    stat = os.stat(path)
+    manifest = read_manifest() if manifest is None else manifest
+    manifest[name] = {
+        'source': INPUTS[name][0],
+        'version': STORE_VERSION,
+        'sha256': file_sha256(path),
+        'size': stat.st_size,
+        'mtime': stat.st_mtime,
+        'rows': table.num_rows,
+        'schema': {field.name: str(field.type) for field in table.schema},
+    }
+    write_manifest(manifest)
+    return table
+
+
+def convert_all():
+    """(Re)builds every stale snapshot."""
+    manifest = read_manifest()
+    for name in INPUTS:
+        if not is_fresh(name, manifest.get(name)):
+            convert(name, manifest)
+    return manifest
+
+
+# name -> Arrow table already opened by this process (tables are immutable, so they are
+# shared freely, including with processes forked by make_figures.py)
+_tables = dict()
+
+
+def load_table(name):
+    """Memory-maps an input's Arrow snapshot (zero-copy), converting it first if stale."""
+    if name not in INPUTS:
+        raise KeyError(f"Unknown input '{name}', expected one of: {', '.join(INPUTS)}")
+    if name not in _tables:
+        if is_fresh(name, read_manifest().get(name)):
+            _tables[name] = pa.ipc.open_file(pa.memory_map(snapshot_path(name), 'r')).read_all()
+        else:
+            _tables[name] = convert(name)
+    return _tables[name]
+
+
+def load_frame(name):
+    """Loads an input as a typed pandas DataFrame (a fresh copy on every call, so callers may modify it)."""
+    return load_table(name).to_pandas()
+
+
+if __name__ == '__main__':
+    for input_name, info in sorted(convert_all().items()):
+        print(f"{input_name}: {info['rows']} rows from {info['source']} ({info['sha256'][:12]})")